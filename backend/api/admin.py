@@ -0,0 +1,24 @@
+import logging
+from fastapi import APIRouter, HTTPException
+
+from api.schemas import AdmissionLimitsUpdate
+from services.admission_service import admission_controllers
+
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+@router.get("/limits", summary="Current admission limits and load")
+async def get_limits():
+    return {name: controller.limits() for name, controller in admission_controllers.items()}
+
+
+@router.put("/limits/{name}", summary="Update admission limits at runtime")
+async def update_limits(name: str, update: AdmissionLimitsUpdate):
+    controller = admission_controllers.get(name)
+    if controller is None:
+        raise HTTPException(status_code=404, detail=f"Unknown admission controller: {name}")
+
+    controller.update_limits(**update.model_dump())
+    return controller.limits()
@@ -1,33 +1,100 @@
+import asyncio
 import logging
-from fastapi import APIRouter, WebSocket, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
+from contextlib import aclosing
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
-from db.database import get_db
+from db.database import AsyncSessionLocal
+from services.admission_service import chat_admission, AdmissionRejected
 from services.chat_orchestrator import chat_orchestrator
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
+#Control message from the client: cancel the answer being generated
+STOP_MESSAGE = "[STOP]"
+
+
+async def _generate(websocket: WebSocket, session_id: str, msg: str):
+
+    #Telling a waiting client where it is in the queue
+    async def report_position(position: int):
+        await websocket.send_text(f"[QUEUED] {position}")
+
+    async with chat_admission.admit(session_id, on_queued=report_position):
+        #Short-lived DB session per message, instead of one held for the whole connection
+        async with AsyncSessionLocal() as db:
+            async with aclosing(chat_orchestrator.process_message(session_id, msg, db)) as tokens:
+                async for token in tokens:
+                    await websocket.send_text(token) #sending to client
+
+
 @router.websocket("/ws/{session_id}")
-async def chat_ws(websocket: WebSocket, session_id: str, db: AsyncSession = Depends(get_db)):
+async def chat_ws(websocket: WebSocket, session_id: str):
     await websocket.accept()
     logger.info(f"WebSocket connected for session id:{session_id}")
 
+    messages = asyncio.Queue()
+    generation = None
+
+    #Reading the socket concurrently with generation, so stop messages and disconnects are seen mid-answer
+    async def read_client():
+        while True:
+            msg = await websocket.receive_text()
+            if msg == STOP_MESSAGE:
+                logger.info(f"Stop requested for session id:{session_id}")
+                if generation is not None:
+                    generation.cancel()
+            else:
+                await messages.put(msg)
+
+    reader = asyncio.create_task(read_client())
+
     try:
         while True:
             #Wait for message from client
-            msg = await websocket.receive_text()
+            next_msg = asyncio.create_task(messages.get())
+            await asyncio.wait({next_msg, reader}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_msg.done():
+                next_msg.cancel()
+                break
+            msg = next_msg.result()
             logger.info(f"Received message: {msg}")
 
             #Streaming response token by token
-            async for token in chat_orchestrator.process_message(session_id, msg, db):
-                await websocket.send_text(token) #sending to client
-            
+            generation = asyncio.create_task(_generate(websocket, session_id, msg))
+            await asyncio.wait({generation, reader}, return_when=asyncio.FIRST_COMPLETED)
+            if not generation.done():
+                #Client went away mid-answer
+                break
+
+            if generation.cancelled():
+                logger.info(f"Generation stopped by client for session id:{session_id}")
+            else:
+                try:
+                    generation.result()
+                except AdmissionRejected as e:
+                    #Overloaded: tell the client when to retry, the connection stays usable
+                    generation = None
+                    await websocket.send_text(f"[BUSY] {e.retry_after}")
+                    continue
+            generation = None
+
             #Send end-of-message marker
             await websocket.send_text("[DONE]")
 
+        #Surfacing why the reader stopped (normally a disconnect)
+        if reader.done() and not reader.cancelled():
+            reader.result()
+
+    except WebSocketDisconnect:
+        logger.info(f"Client disconnected from session id:{session_id}")
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
     finally:
+        if generation is not None and not generation.done():
+            logger.info(f"Cancelling in-flight generation for session id:{session_id}")
+            generation.cancel()
+            await asyncio.gather(generation, return_exceptions=True)
+        reader.cancel()
         logger.info("WebSocket closed")
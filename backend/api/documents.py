@@ -1,4 +1,4 @@
-from fastapi import APIRouter, UploadFile, Depends
+from fastapi import APIRouter, UploadFile, Depends, HTTPException
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 import logging
@@ -6,6 +6,7 @@ import logging
 from db.database import get_db
 from db.db_models import Session
 from api.schemas import DocumentUploadResponse
+from services.admission_service import upload_admission, AdmissionRejected
 from services.ingestion_service import ingestion_service
 from services.session_service import session_service
 
@@ -17,6 +18,15 @@ router = APIRouter()
 
 @router.post("/upload",  response_model=DocumentUploadResponse)
 async def upload_document(file: UploadFile, db: AsyncSession = Depends(get_db)):
+    try:
+        async with upload_admission.admit():
+            return await _ingest_upload(file, db)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=f"Server busy: {e.reason}",
+                            headers={"Retry-After": str(e.retry_after)})
+
+
+async def _ingest_upload(file: UploadFile, db: AsyncSession):
 
     logger.info("Document upload received. Creating session")
 
@@ -33,5 +43,6 @@ async def upload_document(file: UploadFile, db: AsyncSession = Depends(get_db)):
     return DocumentUploadResponse(
         session_id=session_id,
         session_name=session_row.session_name,
+        title_pending=bool(session_row.title_pending),
         status="ingested"
     )
\ No newline at end of file
@@ -0,0 +1,65 @@
+import gzip
+import hashlib
+import os
+
+import orjson
+from fastapi import Request, Response
+
+from utils.metrics import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None #optional, gzip is used when it isn't installed
+
+
+#Bodies smaller than this are sent uncompressed
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "5"))
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+
+
+def _accepts(request: Request, encoding: str) -> bool:
+    accepted = request.headers.get("accept-encoding", "")
+    for part in accepted.split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip() == encoding:
+            return params.replace(" ", "") != "q=0"
+    return False
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    #Weak comparison, the same body is sent with different encodings
+    return any(tag.strip().removeprefix("W/") == etag.removeprefix("W/") for tag in if_none_match.split(","))
+
+
+def json_response(request: Request, content) -> Response:
+    """
+    Serialise `content` with orjson (no response-model validation) and send it
+    with an ETag, answering 304 when the client already has this body, and
+    compressed with brotli or gzip when it is large enough and the client accepts it.
+    """
+    body = orjson.dumps(content)
+    etag = f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+
+    if _etag_matches(request, etag):
+        metrics.incr("http_not_modified")
+        return Response(status_code=304, headers=headers)
+
+    metrics.incr("http_response_raw_bytes", len(body))
+    if len(body) >= RESPONSE_COMPRESS_MIN_BYTES:
+        if brotli is not None and _accepts(request, "br"):
+            body = brotli.compress(body, quality=RESPONSE_BROTLI_QUALITY)
+            headers["Content-Encoding"] = "br"
+        elif _accepts(request, "gzip"):
+            body = gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL, mtime=0)
+            headers["Content-Encoding"] = "gzip"
+
+    metrics.incr("http_response_sent_bytes", len(body))
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 
 
@@ -6,12 +6,14 @@ from typing import List, Optional, Dict, Any
 class DocumentUploadResponse(BaseModel):
     session_id: str
     session_name: Optional[str]
+    title_pending: bool = False #session_name is provisional, the final title shows up in the session list
     status: str
 
 
 #Schemas for session endpoints
 class ListSessionsResponse(BaseModel):
-    sessions: List[Dict[str, str]]
+    sessions: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
 
 
 class DeleteSessionResponse(BaseModel):
@@ -20,3 +22,28 @@ class DeleteSessionResponse(BaseModel):
 
 class ChatHistoryResponse(BaseModel):
     history: List[Dict[str, Any]]
+    next_cursor: Optional[int] = None
+
+
+class WarmupResponse(BaseModel):
+    session_id: str
+    stm_restored: bool
+    ltm_summaries: int
+    total_ms: float
+    models_ms: float
+    vectors_ms: float
+    stm_ms: float
+    ltm_ms: float
+
+
+class SessionImportResponse(BaseModel):
+    session_id: str
+    status: str
+
+
+#Schemas for admin endpoints
+class AdmissionLimitsUpdate(BaseModel):
+    max_concurrent: Optional[int] = Field(None, ge=1)
+    max_per_session: Optional[int] = Field(None, ge=1)
+    max_queue: Optional[int] = Field(None, ge=0)
+    max_wait_seconds: Optional[float] = Field(None, gt=0)
@@ -1,10 +1,19 @@
 import logging
-from fastapi import APIRouter, Depends, HTTPException
+import tempfile
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from db.database import get_db
-from api.schemas import ListSessionsResponse, DeleteSessionResponse, ChatHistoryResponse
+from api.responses import json_response
+from api.schemas import (ListSessionsResponse, DeleteSessionResponse, ChatHistoryResponse, WarmupResponse,
+                         SessionImportResponse)
+from services.admission_service import upload_admission, AdmissionRejected
 from services.session_service import session_service
+from services.snapshot_service import snapshot_service, SnapshotError, SNAPSHOT_MAX_BYTES
+from services.warmup_service import session_warmup
 
 
 logger = logging.getLogger(__name__)
@@ -12,10 +21,20 @@ router = APIRouter()
 
 
 @router.get("/", summary='Fetch all sessions', response_model=ListSessionsResponse)
-async def list_sessions(db: AsyncSession = Depends(get_db)):
+async def list_sessions(request: Request,
+                        limit: int = Query(50, ge=1, le=200),
+                        cursor: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor"),
+                        q: Optional[str] = Query(None, description="Search sessions by name"),
+                        db: AsyncSession = Depends(get_db)):
     try:
-        sessions = await session_service.list_sessions(db)
-        return ListSessionsResponse(sessions=[{"id": s.id, "name": s.session_name or s.id[:8]} for s in sessions])
+        sessions, next_cursor = await session_service.list_sessions(db, limit=limit, cursor=cursor, search=q)
+        return json_response(request, {"sessions": [{"id": s.id,
+                                                      "name": s.session_name or s.id[:8],
+                                                      "updated_at": s.updated_at.isoformat(),
+                                                      "title_pending": bool(s.title_pending)} for s in sessions],
+                                        "next_cursor": next_cursor})
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except Exception as e:
         logger.error(f"Failed to list sessions: {e}")
         raise HTTPException(status_code=500, detail="Could not list sessions")
@@ -32,10 +51,78 @@ async def delete_session(session_id: str, db: AsyncSession = Depends(get_db)):
     
 
 @router.get("/{session_id}/history", summary="Fetch session chat history", response_model=ChatHistoryResponse)
-async def get_chat_history(session_id: str, db: AsyncSession = Depends(get_db)):
+async def get_chat_history(session_id: str, request: Request,
+                           limit: int = Query(200, ge=1, le=1000),
+                           before: Optional[int] = Query(None, description="Cursor from a previous page's next_cursor"),
+                           db: AsyncSession = Depends(get_db)):
+    #Opening a session: preloading its memory and vectors while the user reads the history
+    if before is None:
+        session_warmup.schedule(session_id)
+
     try:
-        history = await session_service.get_chat_history(session_id, db)
-        return ChatHistoryResponse(history=history)
+        history, next_cursor = await session_service.get_chat_history(session_id, db, limit=limit, before=before)
+        return json_response(request, {"history": history, "next_cursor": next_cursor})
     except Exception as e:
         logger.error(f"Failed to get chat history for {session_id}: {e}")
         raise HTTPException(status_code=500, detail="Could not fetch history")
+
+
+
+@router.post("/{session_id}/warmup", summary="Preload session memory and vectors", response_model=WarmupResponse)
+async def warmup_session(session_id: str):
+    try:
+        stats = await session_warmup.warm_up(session_id)
+        return WarmupResponse(session_id=session_id, **stats)
+    except Exception as e:
+        logger.error(f"Failed to warm up session {session_id}: {e}")
+        raise HTTPException(status_code=500, detail="Could not warm up session")
+
+
+
+#Snapshots below this stay in memory while being built, larger ones spill to a temp file
+SNAPSHOT_SPOOL_BYTES = 16 * 1024 * 1024
+SNAPSHOT_READ_BYTES = 1024 * 1024
+
+
+def _iter_file(f):
+    while chunk := f.read(SNAPSHOT_READ_BYTES):
+        yield chunk
+
+
+@router.get("/{session_id}/snapshot", summary="Export session as a snapshot file", response_class=Response)
+async def export_session(session_id: str, db: AsyncSession = Depends(get_db)):
+    out = tempfile.SpooledTemporaryFile(max_size=SNAPSHOT_SPOOL_BYTES)
+    try:
+        await snapshot_service.export_session(session_id, db, out)
+    except LookupError:
+        out.close()
+        raise HTTPException(status_code=404, detail="Session not found")
+    except Exception as e:
+        out.close()
+        logger.error(f"Failed to export session {session_id}: {e}")
+        raise HTTPException(status_code=500, detail="Could not export session")
+    out.seek(0)
+    #Sync iterator: Starlette reads it in its threadpool, the temp file is closed once sent
+    return StreamingResponse(_iter_file(out), media_type="application/zip", background=BackgroundTask(out.close),
+                             headers={"Content-Disposition": f'attachment; filename="session-{session_id}.zip"'})
+
+
+@router.post("/import", summary="Import a session snapshot", response_model=SessionImportResponse)
+async def import_session(file: UploadFile,
+                         keep_id: bool = Query(False, description="Keep the snapshot's session id instead of a new one"),
+                         db: AsyncSession = Depends(get_db)):
+    #The upload is already spooled to disk; it is read from there, never whole into memory
+    if file.size is not None and file.size > SNAPSHOT_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Snapshot larger than {SNAPSHOT_MAX_BYTES // (1024 * 1024)} MB")
+    try:
+        async with upload_admission.admit():
+            session_id = await snapshot_service.import_session(file.file, db, keep_id=keep_id)
+        return SessionImportResponse(session_id=session_id, status="imported")
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=f"Server busy: {e.reason}",
+                            headers={"Retry-After": str(e.retry_after)})
+    except SnapshotError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to import session snapshot: {e}")
+        raise HTTPException(status_code=500, detail="Could not import session")
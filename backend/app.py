@@ -1,11 +1,16 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
+from api.admin import router as admin_router
 from api.chat import router as chat_router
 from api.documents import router as documents_router
 from api.sessions import router as sessions_router
 from db.database import init_db
+from services.deletion_service import session_deletion
+from services.persistence_service import chat_persistence
+from services.title_service import session_title
 from utils.logger import setup_logging
+from utils.metrics import metrics
 
 
 
@@ -14,15 +19,27 @@ async def lifespan(app: FastAPI):
     #Startup
     setup_logging()
     await init_db()
+    chat_persistence.start()
+    session_deletion.start()
+    session_title.start()
     yield
-    pass
+    #Shutdown
+    await session_title.stop()
+    await session_deletion.stop()
+    await chat_persistence.stop()
 
 app = FastAPI(lifespan=lifespan)
 
 app.include_router(sessions_router, prefix="/sessions")
 app.include_router(documents_router)
 app.include_router(chat_router, prefix="/chat")
+app.include_router(admin_router, prefix="/admin")
 
 @app.get("/")
 def root():
-    return {"status": "running"}
\ No newline at end of file
+    return {"status": "running"}
+
+
+@app.get("/metrics")
+def get_metrics():
+    return metrics.snapshot()
\ No newline at end of file
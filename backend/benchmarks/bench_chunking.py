@@ -0,0 +1,94 @@
+"""
+Token-aware chunking against the previous character splitter
+(RecursiveCharacterTextSplitter, 1000 chars / 150 overlap).
+
+Reports chunking throughput, chunk count, tokens sent to the embedding model
+(the cost of embedding the document) and tokens silently dropped by the model's
+384-token truncation. With --embed the chunks are also encoded to time the
+embedding itself.
+
+Usage (from backend/):
+    python -m benchmarks.bench_chunking --file some.pdf
+    python -m benchmarks.bench_chunking --words 200000 --embed
+"""
+import argparse
+import random
+import time
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from services.chunker import CHUNK_MAX_TOKENS, token_chunker
+from services.extraction import iter_pages
+
+
+def _synthetic_pages(words: int, pages: int, seed: int = 0):
+    rng = random.Random(seed)
+    vocab = [f"{a}{b}" for a in ("re", "con", "pro", "de", "in", "ex") for b in ("tain", "duct", "cess", "sign", "form", "tract", "ment")]
+    per_page = max(words // pages, 1)
+
+    for number in range(1, pages + 1):
+        paragraphs, remaining = [], per_page
+        while remaining > 0:
+            sentences = []
+            for _ in range(rng.randint(2, 8)):
+                length = min(rng.randint(6, 40), remaining) or 1
+                remaining -= length
+                sentences.append(" ".join(rng.choice(vocab) for _ in range(length)).capitalize() + ".")
+            paragraphs.append(" ".join(sentences))
+        yield number, "\n\n".join(paragraphs)
+
+
+def _token_lengths(texts):
+    encoded = token_chunker.tokenizer(texts, add_special_tokens=True, verbose=False)
+    return [len(ids) for ids in encoded["input_ids"]]
+
+
+def _report(name: str, texts, seconds: float, embed: bool):
+    lengths = _token_lengths(texts)
+    embedded = sum(min(n, CHUNK_MAX_TOKENS) for n in lengths)
+    dropped = sum(max(n - CHUNK_MAX_TOKENS, 0) for n in lengths)
+    truncated = sum(1 for n in lengths if n > CHUNK_MAX_TOKENS)
+
+    line = (f"{name:<24} {len(texts):>8} {len(texts) / seconds:>10.0f} {embedded:>12} "
+            f"{dropped:>10} {truncated:>10} {embedded / max(len(texts), 1):>8.0f}")
+
+    if embed:
+        from services.llm_service import llm_service
+        start = time.perf_counter()
+        llm_service.embedding_model.encode(texts, batch_size=64, show_progress_bar=False)
+        line += f" {time.perf_counter() - start:>9.1f}"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", help="document to chunk (.pdf, .txt, .md, .docx); synthetic text otherwise")
+    parser.add_argument("--words", type=int, default=100000, help="size of the synthetic document")
+    parser.add_argument("--pages", type=int, default=100, help="pages of the synthetic document")
+    parser.add_argument("--embed", action="store_true", help="also time embedding the chunks")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "rb") as f:
+            pages = list(iter_pages(f.read(), args.file))
+    else:
+        pages = list(_synthetic_pages(args.words, args.pages))
+
+    token_chunker.tokenizer #loading outside the timed region
+
+    print(f"{'chunker':<24} {'chunks':>8} {'chunks/s':>10} {'tok embedded':>12} {'tok lost':>10} {'truncated':>10} {'avg tok':>8}"
+          + (f" {'embed s':>9}" if args.embed else ""))
+
+    #Previous splitter, over the whole text as before
+    start = time.perf_counter()
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150, length_function=len)
+    old = splitter.split_text("\n".join(text for _, text in pages))
+    _report("recursive 1000/150 char", old, time.perf_counter() - start, args.embed)
+
+    start = time.perf_counter()
+    new = [chunk["text"] for chunk in token_chunker.iter_chunks(pages)]
+    _report(f"token {token_chunker.max_tokens}/{token_chunker.overlap_tokens}", new, time.perf_counter() - start, args.embed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Recall@k and latency of compact (float16 / int8 + exact rescoring) vector storage
+against float32, including the float32 Chroma HNSW path.
+
+Ground truth is exact float32 cosine search. Vectors are drawn from a Gaussian
+mixture so neighbours are clustered like real embeddings.
+
+Usage (from backend/):
+    python -m benchmarks.bench_quantization --vectors 10000 --k 3 --queries 200
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from db.local_vectordb import LocalVectorDB
+
+
+def _dataset(n: int, dim: int, queries: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(n // 50, 1), dim)).astype("float32")
+    data = centers[rng.integers(0, len(centers), n)] + 0.5 * rng.standard_normal((n, dim)).astype("float32")
+    qs = centers[rng.integers(0, len(centers), queries)] + 0.5 * rng.standard_normal((queries, dim)).astype("float32")
+    return data, qs
+
+
+def _ground_truth(data: np.ndarray, qs: np.ndarray, k: int):
+    normed = data / np.linalg.norm(data, axis=1, keepdims=True)
+    sims = (qs / np.linalg.norm(qs, axis=1, keepdims=True)) @ normed.T
+    return [set(np.argsort(-row)[:k].tolist()) for row in sims]
+
+
+def _measure(db, qs, truth, k: int):
+    hits, latencies = 0, []
+    for q, expected in zip(qs, truth):
+        start = time.perf_counter()
+        res = db.search("chunks", q, session_id="bench", n=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len({int(i) for i in res["ids"][0]} & expected)
+    return hits / (k * len(qs)), float(np.percentile(latencies, 50)), float(np.percentile(latencies, 95))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=10000, help="vectors in the benchmarked session")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument("--skip-chroma", action="store_true")
+    args = parser.parse_args()
+
+    data, qs = _dataset(args.vectors, args.dim, args.queries)
+    truth = _ground_truth(data, qs, args.k)
+    ids = [str(i) for i in range(args.vectors)]
+    metas = [{"session_id": "bench"} for _ in ids]
+
+    print(f"{'store':<28} {'recall@' + str(args.k):>9} {'p50 ms':>8} {'p95 ms':>8} {'RAM B/vec':>10}")
+
+    with tempfile.TemporaryDirectory() as path:
+        for precision, ram_bytes in (("float32", 4 * args.dim), ("float16", 2 * args.dim), ("int8", args.dim + 4)):
+            db = LocalVectorDB(path=f"{path}/{precision}", precision=precision)
+            db.add_vectors("chunks", data, metas, ids)
+            db._partition("chunks", "bench").rescore_factor = args.rescore_factor
+
+            recall, p50, p95 = _measure(db, qs, truth, args.k)
+            print(f"{'local ' + precision:<28} {recall:>9.3f} {p50:>8.3f} {p95:>8.3f} {ram_bytes:>10}")
+
+        if not args.skip_chroma:
+            from db import chroma_vectordb
+
+            #Forcing the HNSW path (small partitions would otherwise be searched exactly)
+            chroma_vectordb.CHROMA_EXACT_SEARCH_MAX = 0
+            db = chroma_vectordb.ChromaVectorDB(path=f"{path}/chroma")
+            for start in range(0, args.vectors, 5000):
+                db.add_vectors("chunks", data[start:start + 5000], metas[start:start + 5000], ids[start:start + 5000])
+
+            recall, p50, p95 = _measure(db, qs, truth, args.k)
+            print(f"{'chroma float32 (HNSW)':<28} {recall:>9.3f} {p50:>8.3f} {p95:>8.3f} {4 * args.dim:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Adaptive retrieval (wide search, cross-encoder rerank, relevance cutoffs, token
+budget) against the fixed top-k baseline, on a real session's documents.
+
+For every question both modes retrieve chunks and build the answer prompt (without
+chat memory, so only the document context differs). Reports chunks kept, prompt
+tokens and retrieval latency per mode; with --generate the prompts are also sent to
+the LLM to time the first token and the full answer end to end.
+
+Modes alternate which goes first per question and start from an empty text cache,
+after one untimed warm-up round, so neither profits from the other's warm caches.
+
+Usage (from backend/, Ollama running for --generate):
+    python -m benchmarks.bench_retrieval --session <session_id> --questions questions.txt
+    python -m benchmarks.bench_retrieval --session <session_id> -q "What is the refund policy?" --generate
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from db.database import AsyncSessionLocal, engine
+from services.chat_orchestrator import chat_orchestrator
+from services.llm_service import llm_service
+from services.reranker import chunk_reranker
+from services.text_store import text_store
+from utils.tokenizer import estimate_tokens
+
+
+MODES = ("fixed", "adaptive")
+
+
+async def _generate(prompt: str):
+    start = time.perf_counter()
+    first = None
+    async for _ in llm_service.chat_stream(prompt):
+        if first is None:
+            first = time.perf_counter() - start
+    return (first or 0.0) * 1000, (time.perf_counter() - start) * 1000
+
+
+async def run(session_id: str, questions: list, generate: bool) -> dict:
+    results = {mode: {"chunks": [], "tokens": [], "retrieval_ms": [], "first_token_ms": [], "total_ms": []}
+               for mode in MODES}
+
+    async with AsyncSessionLocal() as db:
+        #Warm-up round (SQLite pages, vector store, models), not recorded
+        query_emb = await llm_service.embed(questions[0])
+        for mode in MODES:
+            await chat_orchestrator.retrieve_chunks(session_id, questions[0], query_emb, db, mode=mode)
+
+        for i, question in enumerate(questions):
+            query_emb = await llm_service.embed(question)
+            for mode in (MODES if i % 2 == 0 else MODES[::-1]):
+                text_store.clear()
+                start = time.perf_counter()
+                chunks = await chat_orchestrator.retrieve_chunks(session_id, question, query_emb, db, mode=mode)
+                retrieval_ms = (time.perf_counter() - start) * 1000
+                prompt = chat_orchestrator._build_prompt(question, [], [], chunks)
+
+                r = results[mode]
+                r["chunks"].append(len(chunks))
+                r["tokens"].append(estimate_tokens(prompt))
+                r["retrieval_ms"].append(retrieval_ms)
+                if generate:
+                    first_token_ms, generation_ms = await _generate(prompt)
+                    r["first_token_ms"].append(retrieval_ms + first_token_ms)
+                    r["total_ms"].append(retrieval_ms + generation_ms)
+    return results
+
+
+def _mean(values: list) -> float:
+    return statistics.fmean(values) if values else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--session", required=True, help="session whose documents are searched")
+    parser.add_argument("--questions", help="file with one question per line")
+    parser.add_argument("-q", "--question", action="append", default=[], help="question (repeatable)")
+    parser.add_argument("--generate", action="store_true", help="also time LLM answers end to end")
+    args = parser.parse_args()
+
+    questions = list(args.question)
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            questions += [line.strip() for line in f if line.strip()]
+    if not questions:
+        parser.error("no questions given (--questions or -q)")
+
+    #Loading models outside the timed region
+    llm_service.embedding_model
+    if chunk_reranker.enabled:
+        chunk_reranker.model
+
+    async def _main():
+        try:
+            return await run(args.session, questions, args.generate)
+        finally:
+            await engine.dispose()
+    results = asyncio.run(_main())
+
+    print(f"{len(questions)} questions, fixed k={chat_orchestrator.k}, reranker "
+          f"{chunk_reranker.model_name if chunk_reranker.enabled else 'disabled'}")
+    print(f"{'mode':<10} {'chunks':>7} {'prompt tok':>11} {'p95 tok':>8} {'retrieval ms':>13}"
+          + (f" {'first token ms':>15} {'total ms':>10}" if args.generate else ""))
+    for mode in MODES:
+        r = results[mode]
+        tokens = sorted(r["tokens"])
+        line = (f"{mode:<10} {_mean(r['chunks']):>7.1f} {_mean(tokens):>11.0f} "
+                f"{tokens[min(int(len(tokens) * 0.95), len(tokens) - 1)]:>8} {_mean(r['retrieval_ms']):>13.1f}")
+        if args.generate:
+            line += f" {_mean(r['first_token_ms']):>15.0f} {_mean(r['total_ms']):>10.0f}"
+        print(line)
+
+    fixed, adaptive = _mean(results["fixed"]["tokens"]), _mean(results["adaptive"]["tokens"])
+    print(f"Adaptive retrieval: {(1 - adaptive / fixed) * 100:.0f}% fewer prompt tokens than fixed top-k")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Compare vector backends on insert throughput, per-session query latency and RSS.
+
+Each (backend, session count) pair runs in a fresh subprocess against a temporary
+directory so RSS numbers are not polluted by earlier runs.
+
+Usage (from backend/):
+    python -m benchmarks.bench_vectordb --sessions 1000 10000 100000 --chunks 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _make_db(backend: str, path: str):
+    if backend == "chroma":
+        from db.chroma_vectordb import ChromaVectorDB
+        return ChromaVectorDB(path=path)
+    from db.local_vectordb import LocalVectorDB
+    return LocalVectorDB(path=path)
+
+
+def run_one(backend: str, sessions: int, chunks: int, dim: int, queries: int, batch: int) -> dict:
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as path:
+        db = _make_db(backend, path)
+        session_ids = [f"bench-{i:07d}" for i in range(sessions)]
+
+        #Insert: `batch` sessions' chunks per bulk call
+        start = time.perf_counter()
+        for s in range(0, sessions, batch):
+            group = session_ids[s:s + batch]
+            embs = rng.standard_normal((len(group) * chunks, dim), dtype="float32")
+            metas = [{"session_id": sid, "chunk_index": c} for sid in group for c in range(chunks)]
+            ids = [f"{sid}_{c}" for sid in group for c in range(chunks)]
+            db.add_vectors("chunks", embs, metas, ids)
+        insert_s = time.perf_counter() - start
+
+        #Query: random sessions, one query each
+        latencies = []
+        for sid in rng.choice(session_ids, size=queries):
+            q = rng.standard_normal(dim, dtype="float32")
+            t = time.perf_counter()
+            db.search("chunks", q, session_id=str(sid), n=3)
+            latencies.append((time.perf_counter() - t) * 1000)
+
+        return {"backend": backend,
+                "sessions": sessions,
+                "vectors": sessions * chunks,
+                "insert_vectors_per_s": round(sessions * chunks / insert_s, 1),
+                "query_p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                "query_p95_ms": round(float(np.percentile(latencies, 95)), 3),
+                "rss_mb": round(_rss_mb(), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["chroma", "local"])
+    parser.add_argument("--sessions", nargs="+", type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--chunks", type=int, default=10, help="vectors per session")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=100, help="sessions per bulk insert")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_one(args.backends[0], args.sessions[0], args.chunks, args.dim, args.queries, args.batch)
+        print(json.dumps(result))
+        return
+
+    print(f"{'backend':<8} {'sessions':>9} {'vectors':>10} {'insert/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'RSS MB':>8}")
+    for backend in args.backends:
+        for sessions in args.sessions:
+            cmd = [sys.executable, "-m", "benchmarks.bench_vectordb", "--worker",
+                   "--backends", backend, "--sessions", str(sessions), "--chunks", str(args.chunks),
+                   "--dim", str(args.dim), "--queries", str(args.queries), "--batch", str(args.batch)]
+            out = subprocess.run(cmd, capture_output=True, text=True, cwd=os.getcwd())
+            if out.returncode != 0:
+                print(f"{backend:<8} {sessions:>9} failed: {out.stderr.strip().splitlines()[-1:]}")
+                continue
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{r['backend']:<8} {r['sessions']:>9} {r['vectors']:>10} {r['insert_vectors_per_s']:>10} "
+                  f"{r['query_p50_ms']:>8} {r['query_p95_ms']:>8} {r['rss_mb']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+import chromadb
+import numpy as np
+from chromadb.errors import NotFoundError
+
+from db.vector_base import VectorDB
+from utils.metrics import metrics
+
+
+#Partitions with at most this many vectors are searched exactly in numpy instead of HNSW
+CHROMA_EXACT_SEARCH_MAX = int(os.getenv("CHROMA_EXACT_SEARCH_MAX", "512"))
+#How many partition (collection) handles are cached
+CHROMA_MAX_OPEN_PARTITIONS = int(os.getenv("CHROMA_MAX_OPEN_PARTITIONS", "512"))
+#Memory for the in-memory matrices of small partitions, least recently searched evicted first
+CHROMA_EXACT_CACHE_MB = float(os.getenv("CHROMA_EXACT_CACHE_MB", "64"))
+
+logger = logging.getLogger(__name__)
+
+
+class _ChromaPartition:
+    def __init__(self, collection):
+        self.collection = collection
+
+
+class ChromaVectorDB(VectorDB):
+    """
+    Chroma backend with one collection per (collection, session), eg- `chunks_<session_id>`,
+    so search cost depends on the session's own size rather than the whole corpus.
+    """
+
+    #Pre-partitioning global collections, migrated into per-session collections on startup
+    LEGACY_COLLECTIONS = {"chunks": "chunks", "ltm": "ltm_summaries"}
+
+    def __init__(self, path: str = "./db_files/chroma_db"):
+        self.client = chromadb.PersistentClient(path=path)
+        self._partitions = OrderedDict()
+        #name -> (vector count, ids, metadatas, normalised matrix) of small partitions, bounded by bytes
+        self._exact = OrderedDict()
+        self._exact_bytes = 0
+        self._exact_max_bytes = int(CHROMA_EXACT_CACHE_MB * 1024 * 1024)
+        self._lock = threading.RLock()
+
+        self._migrate_legacy_collections()
+
+
+    def _name(self, collection_name: str, session_id: str) -> str:
+        return f"{collection_name}_{session_id}"
+
+
+    #Cached collection handle of a session, optionally creating it
+    def _partition(self, collection_name: str, session_id: str, create: bool = False):
+        name = self._name(collection_name, session_id)
+
+        with self._lock:
+            part = self._partitions.get(name)
+            if part is not None:
+                self._partitions.move_to_end(name)
+                return part
+
+            try:
+                if create:
+                    col = self.client.get_or_create_collection(name=name, metadata={"hnsw:space": "cosine"})
+                else:
+                    col = self.client.get_collection(name=name)
+            except (NotFoundError, ValueError):
+                return None
+
+            part = _ChromaPartition(col)
+            self._partitions[name] = part
+            if len(self._partitions) > CHROMA_MAX_OPEN_PARTITIONS:
+                self._partitions.popitem(last=False)
+            return part
+
+
+    def add_vector(self, collection_name, embedding, metadata, vector_id):
+        self.add_vectors(collection_name, [embedding], [metadata], [vector_id])
+
+
+    def add_vectors(self, collection_name, embeddings, metadatas, vector_ids):
+        if not len(embeddings):
+            return
+
+        embeddings = np.asarray(embeddings, dtype="float32").reshape(len(metadatas), -1)
+        vector_ids = [vid or str(uuid.uuid4()) for vid in vector_ids]
+
+        #Grouping rows by session so each partition gets one write
+        by_session = OrderedDict()
+        for i, metadata in enumerate(metadatas):
+            by_session.setdefault(metadata["session_id"], []).append(i)
+
+        for session_id, rows in by_session.items():
+            part = self._partition(collection_name, session_id, create=True)
+            part.collection.upsert(embeddings=embeddings[rows].tolist(),
+                                   metadatas=[metadatas[i] for i in rows],
+                                   ids=[vector_ids[i] for i in rows])
+            self._drop_exact(self._name(collection_name, session_id))
+
+
+    #Live vector count, 0 if the collection was deleted (eg- by another process) since it was cached
+    def _count(self, name: str, part: _ChromaPartition) -> int:
+        try:
+            return part.collection.count()
+        except (NotFoundError, ValueError):
+            with self._lock:
+                self._partitions.pop(name, None)
+            self._drop_exact(name)
+            return 0
+
+
+    def search(self, collection_name, embedding, session_id, n=3):
+        query = np.asarray(embedding, dtype="float32").reshape(-1)
+
+        name = self._name(collection_name, session_id)
+        part = self._partition(collection_name, session_id)
+        count = self._count(name, part) if part is not None else 0
+        if count == 0:
+            return {"ids": [[]], "metadatas": [[]], "distances": [[]]}
+
+        if count <= CHROMA_EXACT_SEARCH_MAX:
+            return self._exact_search(self._load_exact(name, part, count), query, n)
+
+        return part.collection.query(query_embeddings=[query.tolist()], n_results=min(n, count))
+
+
+    def _drop_exact(self, name: str):
+        with self._lock:
+            entry = self._exact.pop(name, None)
+            if entry is not None:
+                self._exact_bytes -= entry[3].nbytes
+                metrics.set_gauge("chroma_exact_cache_bytes", self._exact_bytes)
+
+
+    def _load_exact(self, name: str, part: _ChromaPartition, count: int):
+        """
+        Small partition as (ids, metadatas, normalised matrix) for exact search. The cached
+        copy is used only while the collection still holds as many vectors as when it was
+        loaded, so vectors added or deleted by other processes (retrieval worker, offline
+        scripts) are seen; a vector another process replaced under the same id is not,
+        until the entry is evicted or this process writes to the partition.
+        """
+        with self._lock:
+            entry = self._exact.get(name)
+            if entry is not None and entry[0] == count:
+                self._exact.move_to_end(name)
+                return entry[1:]
+
+        data = part.collection.get(include=["embeddings", "metadatas"])
+        matrix = np.asarray(data["embeddings"], dtype="float32").reshape(len(data["ids"]), -1)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        entry = (len(data["ids"]), data["ids"], data["metadatas"], matrix)
+
+        self._drop_exact(name)
+        with self._lock:
+            if matrix.nbytes <= self._exact_max_bytes:
+                self._exact[name] = entry
+                self._exact_bytes += matrix.nbytes
+                while self._exact_bytes > self._exact_max_bytes:
+                    _, evicted = self._exact.popitem(last=False)
+                    self._exact_bytes -= evicted[3].nbytes
+            metrics.set_gauge("chroma_exact_cache_bytes", self._exact_bytes)
+        return entry[1:]
+
+
+    #Brute-force cosine search over a small partition held in memory
+    def _exact_search(self, exact, query: np.ndarray, n: int):
+        ids, metadatas, matrix = exact
+        if not ids:
+            return {"ids": [[]], "metadatas": [[]], "distances": [[]]}
+        sims = matrix @ (query / max(float(np.linalg.norm(query)), 1e-12))
+
+        n = min(n, sims.shape[0])
+        top = np.argpartition(-sims, n - 1)[:n]
+        top = top[np.argsort(-sims[top])]
+
+        return {"ids": [[ids[i] for i in top]],
+                "metadatas": [[metadatas[i] for i in top]],
+                "distances": [[float(1.0 - sims[i]) for i in top]]}
+
+
+    def get_partition(self, collection_name, session_id: str):
+        part = self._partition(collection_name, session_id)
+        if part is None or self._count(self._name(collection_name, session_id), part) == 0:
+            return [], np.zeros((0, 0), dtype="float32"), []
+
+        data = part.collection.get(include=["embeddings", "metadatas"])
+        return list(data["ids"]), np.asarray(data["embeddings"], dtype="float32"), list(data["metadatas"])
+
+
+    def prefetch(self, collection_name, session_id: str):
+        name = self._name(collection_name, session_id)
+        part = self._partition(collection_name, session_id)
+        count = self._count(name, part) if part is not None else 0
+        if count == 0:
+            return
+
+        if count <= CHROMA_EXACT_SEARCH_MAX:
+            self._load_exact(name, part, count)
+        else:
+            #A throwaway query makes Chroma load the HNSW segment into memory
+            dim = len(part.collection.peek(limit=1)["embeddings"][0])
+            part.collection.query(query_embeddings=[[0.0] * dim], n_results=1)
+
+
+    def delete_session_embeddings(self, collection_name, session_id: str):
+        name = self._name(collection_name, session_id)
+        with self._lock:
+            self._partitions.pop(name, None)
+        self._drop_exact(name)
+        try:
+            self.client.delete_collection(name=name)
+        except (NotFoundError, ValueError):
+            pass
+
+
+    #Moving vectors of the old shared collections into per-session collections, page by page
+    def _migrate_legacy_collections(self, page_size: int = 1000):
+        existing = {c if isinstance(c, str) else c.name for c in self.client.list_collections()}
+
+        for collection_name, legacy_name in self.LEGACY_COLLECTIONS.items():
+            if legacy_name not in existing:
+                continue
+
+            legacy = self.client.get_collection(name=legacy_name)
+            total = legacy.count()
+            logger.info(f"Migrating {total} vectors from shared '{legacy_name}' collection into per-session collections")
+
+            moved = 0
+            while True:
+                page = legacy.get(limit=page_size, include=["embeddings", "metadatas"])
+                if not page["ids"]:
+                    break
+
+                #Upsert keeps this idempotent if a previous run stopped between add and delete
+                self.add_vectors(collection_name, page["embeddings"], page["metadatas"], page["ids"])
+                legacy.delete(ids=page["ids"])
+                moved += len(page["ids"])
+                logger.info(f"Migrated {moved}/{total} vectors from '{legacy_name}'")
+
+            self.client.delete_collection(name=legacy_name)
+            logger.info(f"Finished migrating '{legacy_name}'")
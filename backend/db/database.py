@@ -1,8 +1,11 @@
 import logging
+import os
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
 from db.db_models import Base
+from db.migrations import run_migrations
 
 
 logger = logging.getLogger(__name__)
@@ -10,8 +13,25 @@ logger = logging.getLogger(__name__)
 
 DATABASE_URL = "sqlite+aiosqlite:///./db_files/chat.db"
 
+#Connection-level SQLite tuning, applied to every new connection
+SQLITE_PRAGMAS = {"journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+                  "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+                  "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+                  "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+                  "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")), #negative = KiB
+                  "temp_store": "MEMORY",}
+
 engine = create_async_engine(DATABASE_URL, echo=False)
 
+
+@event.listens_for(engine.sync_engine, "connect")
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
 AsyncSessionLocal = sessionmaker(bind=engine,
                                  class_=AsyncSession,
                                  expire_on_commit=False)
@@ -26,4 +46,5 @@ async def get_db():
 async def init_db():
     logger.info('Initialising SQLite database')
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+        await conn.run_sync(Base.metadata.create_all)
+        await run_migrations(conn)
\ No newline at end of file
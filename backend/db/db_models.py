@@ -1,43 +1,83 @@
-from sqlalchemy import Column, String, Integer, Text, ForeignKey, DateTime
+from sqlalchemy import Column, String, Integer, Text, ForeignKey, DateTime, Index, Boolean, text
 from sqlalchemy.orm import declarative_base
 from datetime import datetime, timezone
 
 Base = declarative_base()
 
+
+#Evaluated per row (passing datetime.now(...) directly would freeze it at import time)
+def utcnow():
+    return datetime.now(timezone.utc)
+
+
 class Document(Base):
     __tablename__ = "documents"
+    #One live library document per file content
+    __table_args__ = (Index("ux_documents_content_hash", "content_hash", unique=True,
+                            sqlite_where=text("content_hash IS NOT NULL AND deleted_at IS NULL")),)
+
     id = Column(Integer, primary_key=True, autoincrement=True)
-    session_id = Column(String, index=True)
+    session_id = Column(String, index=True) #session that first uploaded it (owner of legacy, pre-library documents)
     filename = Column(String)
     content_type = Column(String)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    content_hash = Column(String, nullable=True) #sha256 of the file, None for legacy documents
+    created_at = Column(DateTime, default=utcnow)
+    deleted_at = Column(DateTime, nullable=True) #tombstone, set once no session references it
+
+
+#Library documents referenced by a session (the references are the document's refcount)
+class SessionDocument(Base):
+    __tablename__ = "session_documents"
+
+    session_id = Column(String, primary_key=True)
+    document_id = Column(Integer, primary_key=True, index=True)
+    filename = Column(String) #name it was uploaded under in this session
+    created_at = Column(DateTime, default=utcnow)
 
 
 class DocumentChunk(Base):
     __tablename__ = "document_chunks"
     id = Column(Integer, primary_key=True, autoincrement=True)
     document_id = Column(String, index=True)
-    session_id = Column(String, index=True)
+    session_id = Column(String, index=True) #set on legacy chunks only, library chunks belong to their document
     chunk_index = Column(Integer)
     text = Column(Text)
+    page = Column(Integer, nullable=True) #1-based PDF page, None for formats without pages
+    char_start = Column(Integer, nullable=True) #character span of the chunk within its page (or document)
+    char_end = Column(Integer, nullable=True)
+    token_count = Column(Integer, nullable=True) #embedding-model tokens, special tokens excluded
 
 
 class Session(Base):
     __tablename__ = "sessions"
+    __table_args__ = (Index("ix_sessions_updated_at_id", "updated_at", "id"),)
     id = Column(String, primary_key=True)
     session_name = Column(String, nullable=True)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
-    updated_at = Column(DateTime, default=datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utcnow)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow) #last activity, bumped on every message
+    deleted_at = Column(DateTime, nullable=True) #tombstone, set when deletion is requested
+    title_pending = Column(Boolean, default=False) #session_name is provisional, LLM title not generated yet
+
+
+class SessionDeletionJob(Base):
+    __tablename__ = "session_deletion_jobs"
+
+    session_id = Column(String, primary_key=True)
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text, nullable=True)
+    next_attempt_at = Column(DateTime, default=utcnow, index=True)
+    created_at = Column(DateTime, default=utcnow)
 
 
 class SessionShortTermMemory(Base):
     __tablename__ = "session_short_term_memory"
+    __table_args__ = (Index("ix_session_short_term_memory_session_id_id", "session_id", "id"),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     session_id = Column(String, index=True)
     role = Column(String) #"user" or "assistant"
     content = Column(Text)
-    timestamp = Column(DateTime, default=datetime.now(timezone.utc))
+    timestamp = Column(DateTime, default=utcnow)
 
 
 class SessionLongTermMemory(Base):
@@ -51,9 +91,10 @@ class SessionLongTermMemory(Base):
 
 class SessionChatHistory(Base):
     __tablename__ = "session_chat_history"
+    __table_args__ = (Index("ix_session_chat_history_session_id_id", "session_id", "id"),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     session_id = Column(String)
     role = Column(String)
     content = Column(Text)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
\ No newline at end of file
+    created_at = Column(DateTime, default=utcnow)
\ No newline at end of file
@@ -0,0 +1,309 @@
+import json
+import os
+import re
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from db.vector_base import VectorDB
+
+
+#How many session partitions are kept open (memory-mapped) at once
+LOCAL_VECTORDB_MAX_OPEN = int(os.getenv("LOCAL_VECTORDB_MAX_OPEN", "256"))
+#Precision of the in-memory search copy: "float32" (exact), "float16" or "int8" (scalar-quantised)
+LOCAL_VECTOR_PRECISION = os.getenv("LOCAL_VECTOR_PRECISION", "float32")
+#With compact vectors, n * factor candidates are rescored exactly against the float32 file
+LOCAL_RESCORE_FACTOR = int(os.getenv("LOCAL_RESCORE_FACTOR", "4"))
+
+_SAFE_NAME = re.compile(r"^[A-Za-z0-9._-]+$")
+#Rows widened to float32 at a time when scoring compact vectors (keeps the temporary cache-sized)
+_SCORE_BLOCK = 1024
+
+
+def _top_n(scores: np.ndarray, n: int) -> np.ndarray:
+    n = min(n, scores.shape[0])
+    top = np.argpartition(-scores, n - 1)[:n]
+    return top[np.argsort(-scores[top])]
+
+
+def _quantize(vectors: np.ndarray, precision: str):
+    """Compact copy of L2-normalised rows: (values, per-row scales or None)."""
+    if precision == "float16":
+        return vectors.astype("float16"), None
+
+    #Symmetric per-row int8: row ~= values * scale
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+    values = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype("int8")
+    return values, scales.astype("float32")
+
+
+class _Partition:
+    """
+    Flat index of one session in one collection.
+
+    On disk: `vectors.f32` (L2-normalised float32 rows, appended; rewritten when an
+    existing id is added again, which replaces its row) and `meta.jsonl`
+    (one {"id", "metadata"} line per row). Vectors are memory-mapped on first use.
+
+    With a compact precision, a float16 (`vectors.f16`) or int8 (`vectors.i8` +
+    `scales.f32`) copy is held in RAM for candidate search, and only the candidates'
+    rows of the memory-mapped float32 file are read to rescore them exactly.
+    """
+
+    def __init__(self, path: Path, precision: str = LOCAL_VECTOR_PRECISION, rescore_factor: int = LOCAL_RESCORE_FACTOR):
+        self.path = path
+        self.precision = precision
+        self.rescore_factor = rescore_factor
+        self.vectors_path = path / "vectors.f32"
+        self.meta_path = path / "meta.jsonl"
+        self.compact_path = path / ("vectors.f16" if precision == "float16" else "vectors.i8")
+        self.scales_path = path / "scales.f32"
+        self.ids = []
+        self._id_set = set()
+        self.metadatas = []
+        self._vectors = None
+        self._compact = None #(values, scales)
+        self._loaded = False
+
+
+    def _load(self):
+        if self._loaded:
+            return
+
+        if self.meta_path.exists():
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        row = json.loads(line)
+                        self.ids.append(row["id"])
+                        self.metadatas.append(row["metadata"])
+        self._id_set = set(self.ids)
+        self._loaded = True
+
+
+    @property
+    def vectors(self):
+        self._load()
+        if self._vectors is None and self.ids and self.vectors_path.exists():
+            flat = np.memmap(self.vectors_path, dtype="float32", mode="r")
+            dim = flat.shape[0] // len(self.ids)
+            self._vectors = flat[: len(self.ids) * dim].reshape(len(self.ids), dim)
+        return self._vectors
+
+
+    @property
+    def compact(self):
+        if self._compact is None and self.vectors is not None:
+            n, dim = self.vectors.shape
+            dtype = "float16" if self.precision == "float16" else "int8"
+            on_disk = self.compact_path.exists() and self.compact_path.stat().st_size == n * dim * np.dtype(dtype).itemsize
+
+            if on_disk:
+                values = np.fromfile(self.compact_path, dtype=dtype).reshape(n, dim)
+                scales = np.fromfile(self.scales_path, dtype="float32") if dtype == "int8" else None
+            else:
+                #Partition written before (or with another) compact precision: build the copy once
+                values, scales = _quantize(np.asarray(self.vectors), self.precision)
+                values.tofile(self.compact_path)
+                if scales is not None:
+                    scales.tofile(self.scales_path)
+            self._compact = (values, scales)
+        return self._compact
+
+
+    def add(self, embeddings: np.ndarray, metadatas, vector_ids):
+        self._load()
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = np.ascontiguousarray(embeddings / np.maximum(norms, 1e-12), dtype="float32")
+
+        #Re-added ids replace their rows (like Chroma's upsert), which needs a rewrite instead of an append
+        if len(set(vector_ids)) < len(vector_ids) or not self._id_set.isdisjoint(vector_ids):
+            self._replace(embeddings, metadatas, vector_ids)
+            return
+
+        #Bringing an existing partition's compact copy up to date before appending to it
+        if self.precision != "float32" and self.ids:
+            self.compact
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.vectors_path, "ab") as f:
+            f.write(embeddings.tobytes())
+        if self.precision != "float32":
+            values, scales = _quantize(embeddings, self.precision)
+            with open(self.compact_path, "ab") as f:
+                f.write(values.tobytes())
+            if scales is not None:
+                with open(self.scales_path, "ab") as f:
+                    f.write(scales.tobytes())
+        with open(self.meta_path, "a", encoding="utf-8") as f:
+            for vector_id, metadata in zip(vector_ids, metadatas):
+                f.write(json.dumps({"id": vector_id, "metadata": metadata}) + "\n")
+
+        self.ids.extend(vector_ids)
+        self._id_set.update(vector_ids)
+        self.metadatas.extend(metadatas)
+        self._vectors = None #re-mapped on next search
+        self._compact = None
+
+
+    #Rewriting the partition without the rows being replaced, then with the new rows at the end
+    def _replace(self, embeddings: np.ndarray, metadatas, vector_ids):
+        latest = {vector_id: i for i, vector_id in enumerate(vector_ids)} #last one wins within a batch
+        new_rows = sorted(latest.values())
+        keep = [i for i, vector_id in enumerate(self.ids) if vector_id not in latest]
+
+        old = self.vectors
+        parts = ([np.asarray(old[keep], dtype="float32")] if keep else []) + [embeddings[new_rows]]
+        vectors = np.concatenate(parts)
+        ids = [self.ids[i] for i in keep] + [vector_ids[i] for i in new_rows]
+        rows = [self.metadatas[i] for i in keep] + [metadatas[i] for i in new_rows]
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp_vectors, tmp_meta = self.vectors_path.with_suffix(".tmp"), self.meta_path.with_suffix(".tmp")
+        vectors.tofile(tmp_vectors)
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            for vector_id, metadata in zip(ids, rows):
+                f.write(json.dumps({"id": vector_id, "metadata": metadata}) + "\n")
+        self._vectors = None
+        os.replace(tmp_vectors, self.vectors_path)
+        os.replace(tmp_meta, self.meta_path)
+        #Compact copy is rebuilt from the float32 file on next use
+        self.compact_path.unlink(missing_ok=True)
+        self.scales_path.unlink(missing_ok=True)
+
+        self.ids, self.metadatas, self._id_set = ids, rows, set(ids)
+        self._compact = None
+
+
+    #Reading the partition into memory ahead of the first search
+    def prefetch(self):
+        vectors = self.vectors
+        if vectors is None:
+            return
+        if self.precision == "float32":
+            #Touching every page so the first search doesn't fault them in one by one
+            for start in range(0, vectors.shape[0], _SCORE_BLOCK):
+                np.asarray(vectors[start:start + _SCORE_BLOCK]).sum()
+        else:
+            self.compact
+
+
+    def search(self, query: np.ndarray, n: int):
+        vectors = self.vectors
+        if vectors is None or n <= 0:
+            return [], [], []
+
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        if self.precision == "float32":
+            sims = vectors @ query
+            top = _top_n(sims, n)
+        else:
+            #Candidate search on the compact copy, then exact rescoring of the candidates
+            values, scales = self.compact
+            approx = np.empty(values.shape[0], dtype="float32")
+            for start in range(0, values.shape[0], _SCORE_BLOCK):
+                approx[start:start + _SCORE_BLOCK] = values[start:start + _SCORE_BLOCK].astype("float32") @ query
+            if scales is not None:
+                approx *= scales
+            candidates = np.sort(_top_n(approx, n * self.rescore_factor))
+
+            exact = np.asarray(vectors[candidates]) @ query
+            order = _top_n(exact, n)
+            top = candidates[order]
+            sims = np.zeros(vectors.shape[0], dtype="float32")
+            sims[top] = exact[order]
+
+        return ([self.ids[i] for i in top],
+                [self.metadatas[i] for i in top],
+                [float(1.0 - sims[i]) for i in top])
+
+
+class LocalVectorDB(VectorDB):
+    """
+    Embedded vector store: one flat index per (collection, session), persisted as
+    memory-mapped files under `path` and opened lazily, with an LRU of open partitions.
+    """
+
+    def __init__(self, path: str = "./db_files/local_vectors", max_open: int = LOCAL_VECTORDB_MAX_OPEN,
+                 precision: str = LOCAL_VECTOR_PRECISION):
+        if precision not in ("float32", "float16", "int8"):
+            raise ValueError(f"Unknown vector precision: {precision}")
+
+        self.root = Path(path)
+        self.max_open = max_open
+        self.precision = precision
+        self._partitions = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def _partition(self, collection_name: str, session_id: str) -> _Partition:
+        if not (_SAFE_NAME.match(collection_name) and _SAFE_NAME.match(session_id)):
+            raise ValueError(f"Invalid partition name: {collection_name}/{session_id}")
+
+        key = (collection_name, session_id)
+        part = self._partitions.get(key)
+        if part is None:
+            part = _Partition(self.root / collection_name / session_id, precision=self.precision)
+            self._partitions[key] = part
+            if len(self._partitions) > self.max_open:
+                self._partitions.popitem(last=False)
+        else:
+            self._partitions.move_to_end(key)
+        return part
+
+
+    def add_vector(self, collection_name, embedding, metadata, vector_id):
+        self.add_vectors(collection_name, [embedding], [metadata], [vector_id])
+
+
+    def add_vectors(self, collection_name, embeddings, metadatas, vector_ids):
+        if not len(embeddings):
+            return
+
+        embeddings = np.asarray(embeddings, dtype="float32").reshape(len(metadatas), -1)
+        vector_ids = [vid or str(uuid.uuid4()) for vid in vector_ids]
+
+        #Grouping rows by session so each partition is appended once
+        by_session = OrderedDict()
+        for i, metadata in enumerate(metadatas):
+            by_session.setdefault(metadata["session_id"], []).append(i)
+
+        with self._lock:
+            for session_id, rows in by_session.items():
+                self._partition(collection_name, session_id).add(embeddings[rows],
+                                                                 [metadatas[i] for i in rows],
+                                                                 [vector_ids[i] for i in rows])
+
+
+    def search(self, collection_name, embedding, session_id, n=3):
+        query = np.asarray(embedding, dtype="float32").reshape(-1)
+
+        with self._lock:
+            ids, metadatas, distances = self._partition(collection_name, session_id).search(query, n)
+        return {"ids": [ids], "metadatas": [metadatas], "distances": [distances]}
+
+
+    def get_partition(self, collection_name, session_id: str):
+        with self._lock:
+            part = self._partition(collection_name, session_id)
+            vectors = part.vectors
+            if vectors is None:
+                return [], np.zeros((0, 0), dtype="float32"), []
+            return list(part.ids), np.array(vectors, dtype="float32"), list(part.metadatas)
+
+
+    def prefetch(self, collection_name, session_id: str):
+        with self._lock:
+            self._partition(collection_name, session_id).prefetch()
+
+
+    def delete_session_embeddings(self, collection_name, session_id: str):
+        with self._lock:
+            part = self._partition(collection_name, session_id)
+            self._partitions.pop((collection_name, session_id), None)
+            shutil.rmtree(part.path, ignore_errors=True)
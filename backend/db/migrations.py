@@ -0,0 +1,61 @@
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+#Idempotent ALTER TABLE ... ADD COLUMN (SQLite has no IF NOT EXISTS for columns)
+def add_column(table: str, column: str, ddl: str):
+    async def migrate(conn):
+        columns = (await conn.exec_driver_sql(f"PRAGMA table_info({table})")).all()
+        if column not in {c[1] for c in columns}:
+            await conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+    return migrate
+
+
+#Schema migrations applied on top of Base.metadata.create_all, in order.
+#The number of applied migrations is tracked in SQLite's PRAGMA user_version.
+#Steps (SQL strings or async callables taking the connection) must be idempotent,
+#since fresh databases already get the latest models.
+MIGRATIONS = [
+    #1. Composite indexes for per-session, ordered reads
+    ["CREATE INDEX IF NOT EXISTS ix_session_chat_history_session_id_id ON session_chat_history (session_id, id)",
+     "CREATE INDEX IF NOT EXISTS ix_session_short_term_memory_session_id_id ON session_short_term_memory (session_id, id)"],
+
+    #2. Session listing ordered by last activity
+    ["CREATE INDEX IF NOT EXISTS ix_sessions_updated_at_id ON sessions (updated_at, id)"],
+
+    #3. Tombstones for the durable session deletion queue
+    [add_column("sessions", "deleted_at", "DATETIME")],
+
+    #4. Source location and size of token-aware chunks
+    [add_column("document_chunks", "page", "INTEGER"),
+     add_column("document_chunks", "char_start", "INTEGER"),
+     add_column("document_chunks", "char_end", "INTEGER"),
+     add_column("document_chunks", "token_count", "INTEGER")],
+
+    #5. Content-addressed document library: existing documents become legacy documents
+    #referenced by the session that uploaded them
+    [add_column("documents", "content_hash", "VARCHAR"),
+     add_column("documents", "deleted_at", "DATETIME"),
+     "CREATE UNIQUE INDEX IF NOT EXISTS ux_documents_content_hash ON documents (content_hash) "
+     "WHERE content_hash IS NOT NULL AND deleted_at IS NULL",
+     "INSERT OR IGNORE INTO session_documents (session_id, document_id, filename, created_at) "
+     "SELECT session_id, id, filename, created_at FROM documents WHERE session_id IS NOT NULL AND content_hash IS NULL"],
+
+    #6. Provisional session titles awaiting background LLM naming
+    [add_column("sessions", "title_pending", "BOOLEAN DEFAULT 0")],
+]
+
+
+async def run_migrations(conn):
+    version = (await conn.exec_driver_sql("PRAGMA user_version")).scalar() or 0
+
+    for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        logger.info(f"Applying SQLite migration {number}")
+        for statement in statements:
+            if callable(statement):
+                await statement(conn)
+            else:
+                await conn.exec_driver_sql(statement)
+        await conn.exec_driver_sql(f"PRAGMA user_version = {number}")
@@ -0,0 +1,52 @@
+import numpy as np
+
+from db.vector_base import VectorDB
+from services.retrieval_client import retrieval_client
+
+
+class RemoteVectorDB(VectorDB):
+    """
+    Proxy to the vector store owned by the retrieval worker process, so several API
+    workers share one store instead of each opening the same files.
+
+    Every method is a blocking socket round-trip: async code calls them through
+    asyncio.to_thread (as it does for the in-process backends, whose calls block too).
+    """
+
+    def add_vector(self, collection_name, embedding, metadata, vector_id):
+        self.add_vectors(collection_name, [embedding], [metadata], [vector_id])
+
+
+    def add_vectors(self, collection_name, embeddings, metadatas, vector_ids):
+        if not len(embeddings):
+            return
+        retrieval_client.call("add_vectors", collection_name=collection_name,
+                              embeddings=np.asarray(embeddings, dtype="float32"),
+                              metadatas=list(metadatas), vector_ids=list(vector_ids))
+
+
+    def search(self, collection_name, embedding, session_id, n=3):
+        return retrieval_client.call("search", collection_name=collection_name,
+                                     embedding=np.asarray(embedding, dtype="float32").reshape(-1),
+                                     session_id=session_id, n=n)
+
+
+    def search_partitions(self, collection_name, embedding, partition_ids, n=3):
+        return retrieval_client.call("search_partitions", collection_name=collection_name,
+                                     embedding=np.asarray(embedding, dtype="float32").reshape(-1),
+                                     partition_ids=list(partition_ids), n=n)
+
+
+    def get_partition(self, collection_name, session_id: str):
+        res = retrieval_client.call("get_partition", collection_name=collection_name, session_id=session_id)
+        if not res["ids"]:
+            return [], np.zeros((0, 0), dtype="float32"), []
+        return res["ids"], np.asarray(res["embeddings"], dtype="float32"), res["metadatas"]
+
+
+    def prefetch(self, collection_name, session_id: str):
+        retrieval_client.call("prefetch", collection_name=collection_name, session_id=session_id)
+
+
+    def delete_session_embeddings(self, collection_name, session_id: str):
+        retrieval_client.call("delete_session_embeddings", collection_name=collection_name, session_id=session_id)
@@ -0,0 +1,63 @@
+from abc import ABC, abstractmethod
+
+
+#Partition of a library document's chunk vectors
+def document_partition(document_id: int) -> str:
+    return f"doc-{document_id}"
+
+
+class VectorDB(ABC):
+    """
+    Vector store interface used by ingestion, memory and retrieval.
+
+    Vectors live in named collections ("chunks", "ltm") and are partitioned by the id
+    passed as `session_id` (and carried in metadata["session_id"]): the session for
+    "ltm", the library document (document_partition) for "chunks".
+    search() returns Chroma-style results for a single query:
+    {"ids": [[...]], "metadatas": [[...]], "distances": [[...]]} with cosine distances.
+    Adding a vector under an id that already exists in its partition replaces it.
+    """
+
+    @abstractmethod
+    def add_vector(self, collection_name, embedding, metadata, vector_id):
+        ...
+
+
+    #Bulk insert, backends override this when they can write in one go
+    def add_vectors(self, collection_name, embeddings, metadatas, vector_ids):
+        for embedding, metadata, vector_id in zip(embeddings, metadatas, vector_ids):
+            self.add_vector(collection_name, embedding, metadata, vector_id)
+
+
+    @abstractmethod
+    def search(self, collection_name, embedding, session_id, n=3):
+        ...
+
+
+    #Top-n over several partitions (eg- all documents a session references), merged by distance
+    def search_partitions(self, collection_name, embedding, partition_ids, n=3):
+        hits = []
+        for partition_id in partition_ids:
+            res = self.search(collection_name, embedding, partition_id, n=n)
+            hits.extend(zip(res["distances"][0], res["ids"][0], res["metadatas"][0]))
+        hits.sort(key=lambda hit: hit[0])
+        hits = hits[:n]
+
+        return {"ids": [[h[1] for h in hits]],
+                "metadatas": [[h[2] for h in hits]],
+                "distances": [[h[0] for h in hits]]}
+
+
+    @abstractmethod
+    def delete_session_embeddings(self, collection_name, session_id: str):
+        ...
+
+
+    #All vectors of one partition as (ids, float32 matrix of shape (n, dim), metadatas), for snapshots
+    def get_partition(self, collection_name, session_id: str):
+        raise NotImplementedError(f"{type(self).__name__} can't export partitions")
+
+
+    #Load a session's partition ahead of its first search (no-op for backends without per-session state)
+    def prefetch(self, collection_name, session_id: str):
+        pass
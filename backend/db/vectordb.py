@@ -1,50 +1,29 @@
-import chromadb
-import uuid
-import numpy as np
+import os
 
+from db.vector_base import VectorDB
+from services.retrieval_client import RETRIEVAL_WORKER_SOCKET
 
-class VectorDB:
-    def __init__(self):
-        self.client = chromadb.PersistentClient(path="./db_files/chroma_db")
 
-        #RAG Chunks Collection
-        self.chunk_collection = self.client.get_or_create_collection(name="chunks",
-                                                                metadata={"hnsw:space": "cosine"})
-        
-        #LTM Summaries Collection
-        self.ltm_collection = self.client.get_or_create_collection(name="ltm_summaries",
-                                                              metadata={"hnsw:space": "cosine"})
-        
-        self.collections = {"chunks": self.chunk_collection,
-                            "ltm": self.ltm_collection,}
+#Which vector store backs the app: "chroma" (default) or "local" (embedded per-session flat index).
+#With RETRIEVAL_WORKER_SOCKET set, the store lives in the retrieval worker and this process proxies to it.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
 
 
-    def add_vector(self, collection_name, embedding, metadata, vector_id):
-        if vector_id is None:
-            vector_id = str(uuid.uuid4())
+def create_vectordb(backend: str = VECTOR_BACKEND) -> VectorDB:
+    #Backends are imported lazily so only the selected one's dependencies are needed
+    if backend == "chroma":
+        from db.chroma_vectordb import ChromaVectorDB
+        return ChromaVectorDB()
 
-        if isinstance(embedding, np.ndarray):
-            embedding = embedding.tolist()
+    if backend == "local":
+        from db.local_vectordb import LocalVectorDB
+        return LocalVectorDB()
 
-        col = self.collections[collection_name]
-        col.add(embeddings=[embedding],
-                            metadatas=[metadata],
-                            ids=[vector_id])
+    if backend == "remote":
+        from db.remote_vectordb import RemoteVectorDB
+        return RemoteVectorDB()
 
+    raise ValueError(f"Unknown vector backend: {backend}")
 
-    def search(self, collection_name, embedding, session_id, n=3):
-        if isinstance(embedding, np.ndarray):
-            embedding = embedding.tolist()
-            
-        col = self.collections[collection_name]
-        return col.query(query_embeddings=[embedding],
-                                     where={"session_id": session_id},
-                                     n_results=n)
-    
 
-    def delete_session_embeddings(self, collection_name, session_id: str):
-        col = self.collections[collection_name]
-        col.delete(where={"session_id": session_id})
-
-
-vectordb = VectorDB()
\ No newline at end of file
+vectordb = create_vectordb("remote" if RETRIEVAL_WORKER_SOCKET else VECTOR_BACKEND)
@@ -0,0 +1,270 @@
+"""
+Offline bulk import of a directory of documents (.pdf, .txt, .md, .docx).
+
+Files are read, extracted and chunked in a process pool, chunks are embedded in
+large batches, and documents, chunks, sessions and vectors are written in bulk
+transactions of many documents. Like uploads, every file gets its own session
+(named with its provisional title), or all files are added to one existing session
+with --session. Files whose content is already in the library are only referenced.
+
+Committed files are appended to a manifest (default: <directory>/.bulk_import.jsonl),
+so an interrupted import picks up where it stopped when run again.
+
+Stop the backend first, then run from backend/:
+    python -m scripts.bulk_import /data/corpus
+    python -m scripts.bulk_import /data/corpus --workers 8 --embed-batch 1024 --llm-titles
+"""
+import argparse
+import asyncio
+import json
+import logging
+import mimetypes
+import multiprocessing
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+#Spawned pool processes re-import this module: the databases, vector store and models
+#are imported inside the functions below, so only this (parent) process opens them
+from scripts.bulk_prepare import init_worker, prepare
+from utils.logger import setup_logging
+
+
+SUPPORTED_SUFFIXES = {".pdf", ".txt", ".md", ".docx"}
+MANIFEST_NAME = ".bulk_import.jsonl"
+
+logger = logging.getLogger(__name__)
+
+
+class BulkImporter:
+
+    def __init__(self, root: Path, manifest_path: Path, session_id: str = None, llm_titles: bool = False,
+                 embed_batch: int = 512, group_chunks: int = 4096, group_docs: int = 256):
+        self.root = root
+        self.manifest_path = manifest_path
+        self.session_id = session_id
+        self.llm_titles = llm_titles
+        self.embed_batch = embed_batch
+        self.group_chunks = group_chunks
+        self.group_docs = group_docs
+        self._documents = {} #content hash -> document id, for duplicates within this run
+        self.stats = {"files": 0, "ingested": 0, "deduplicated": 0, "failed": 0, "chunks": 0,
+                      "prepare_wait_s": 0.0, "embed_s": 0.0, "write_s": 0.0}
+
+
+    def pending_paths(self) -> list:
+        done = set()
+        if self.manifest_path.exists():
+            with open(self.manifest_path, encoding="utf-8") as f:
+                done = {json.loads(line)["path"] for line in f if line.strip()}
+
+        paths = sorted(str(p) for p in self.root.rglob("*")
+                       if p.is_file() and p.suffix.lower() in SUPPORTED_SUFFIXES)
+        pending = [p for p in paths if str(Path(p).relative_to(self.root)) not in done]
+        if done:
+            logger.info(f"Resuming: {len(paths) - len(pending)} of {len(paths)} files already imported")
+        return pending
+
+
+    async def known_hashes(self) -> frozenset:
+        from sqlalchemy import select
+        from db.database import AsyncSessionLocal
+        from db.db_models import Document
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(Document.content_hash)
+                                      .where(Document.content_hash.is_not(None))
+                                      .where(Document.deleted_at.is_(None)))
+            return frozenset(result.scalars().all())
+
+
+    async def write_group(self, group: list):
+        """
+        Write one group of prepared files in a single transaction: sessions, documents
+        and chunk rows in bulk, chunk vectors embedded in large batches, then references.
+        The manifest is appended only once the transaction is committed.
+        """
+        from db.database import AsyncSessionLocal
+        from db.db_models import Document, Session
+        from db.vectordb import vectordb
+        from services.chunker import token_chunker
+        from services.document_library import document_library
+        from services.extraction import iter_pages
+        from services.ingestion_service import ingestion_service
+        from services.title_service import provisional_title
+
+        start = time.perf_counter()
+        entries, new_rows = [], [] #new_rows: (chunk row, document id, partition)
+
+        async with AsyncSessionLocal() as db:
+            for path, content_hash, chunks in group:
+                filename = Path(path).name
+                session_id = self.session_id or str(uuid.uuid4())
+
+                doc_id = self._documents.get(content_hash)
+                if doc_id is None and chunks is None:
+                    doc = await document_library.find(content_hash, db)
+                    doc_id = doc.id if doc else None
+                if doc_id is None and chunks is None:
+                    #Library copy purged since the import started, chunking it here after all
+                    chunks = list(token_chunker.iter_chunks(iter_pages(Path(path).read_bytes(), path)))
+
+                if doc_id is None:
+                    doc = Document(filename=filename, content_type=mimetypes.guess_type(filename)[0],
+                                   content_hash=content_hash, session_id=session_id)
+                    db.add(doc)
+                    await db.flush()
+                    doc_id = self._documents[content_hash] = doc.id
+                    partition = document_library.partition_of(doc_id, content_hash, session_id)
+                    #Vectors left behind by an interrupted import that got the same (uncommitted) id
+                    vectordb.delete_session_embeddings("chunks", partition)
+                    rows = ingestion_service._chunk_rows(chunks, doc_id, 0)
+                    db.add_all(rows)
+                    new_rows += [(row, doc_id, partition) for row in rows]
+                    self.stats["ingested"] += 1
+                    self.stats["chunks"] += len(rows)
+                else:
+                    self.stats["deduplicated"] += 1
+
+                #One session per file, named like an upload's, unless importing into one session
+                if self.session_id is None:
+                    first_text = chunks[0]["text"] if chunks else await document_library.first_chunk_text(doc_id, db)
+                    db.add(Session(id=session_id, session_name=provisional_title(filename, first_text),
+                                   title_pending=self.llm_titles))
+                entries.append({"path": str(Path(path).relative_to(self.root)), "content_hash": content_hash,
+                                "document_id": doc_id, "session_id": session_id, "filename": filename})
+            await db.flush() #chunk ids for the vector entries
+
+            embed_start = time.perf_counter()
+            await self._embed_and_store(new_rows)
+            embed_seconds = time.perf_counter() - embed_start
+
+            for entry in entries:
+                if not await document_library.add_reference(entry["session_id"], entry["document_id"], entry["filename"], db):
+                    raise RuntimeError(f"Library document {entry['document_id']} was deleted during the import")
+            await db.commit()
+
+        with open(self.manifest_path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.stats["embed_s"] += embed_seconds
+        self.stats["write_s"] += time.perf_counter() - start - embed_seconds
+
+
+    #Embedding chunk rows in batches of embed_batch across documents, then adding their vectors
+    async def _embed_and_store(self, items: list):
+        from db.vectordb import vectordb
+        from services.ingestion_service import ingestion_service
+        from services.llm_service import llm_service
+        for i in range(0, len(items), self.embed_batch):
+            batch = items[i:i + self.embed_batch]
+            embeddings = await llm_service.embed_batch([row.text for row, _, _ in batch], batch_size=64)
+
+            metadatas, vector_ids = [], []
+            for row, doc_id, partition in batch:
+                md, ids = ingestion_service._vector_entries([row], doc_id, partition)
+                metadatas += md
+                vector_ids += ids
+            vectordb.add_vectors(collection_name="chunks", embeddings=embeddings, metadatas=metadatas, vector_ids=vector_ids)
+
+
+    async def run(self, workers: int):
+        from db.database import AsyncSessionLocal
+        from db.db_models import Session
+        if self.session_id is not None:
+            async with AsyncSessionLocal() as db:
+                session_row = await db.get(Session, self.session_id)
+                if session_row is None or session_row.deleted_at is not None:
+                    raise SystemExit(f"Session {self.session_id} not found")
+
+        paths = self.pending_paths()
+        known = await self.known_hashes()
+        logger.info(f"Importing {len(paths)} files with {workers} workers ({len(known)} documents already in library)")
+
+        start = time.perf_counter()
+        group, group_chunks = [], 0
+        #spawn: pool processes don't inherit the parent's model or torch threads
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=init_worker, initargs=(known,)) as pool:
+            #A bounded window of files in flight, topped up as results are consumed: prepared
+            #chunks wait in memory only up to the group being written, not for the whole corpus
+            pending, in_flight = iter(paths), deque()
+
+            def top_up():
+                while len(in_flight) < 2 * workers and (path := next(pending, None)) is not None:
+                    in_flight.append(pool.submit(prepare, path))
+
+            top_up()
+            while in_flight:
+                future = in_flight.popleft()
+                top_up()
+                wait_start = time.perf_counter()
+                path, content_hash, chunks, error = await asyncio.wrap_future(future)
+                self.stats["prepare_wait_s"] += time.perf_counter() - wait_start
+
+                self.stats["files"] += 1
+                if error is not None:
+                    self.stats["failed"] += 1
+                    logger.error(f"Skipping {path}: {error}")
+                    continue
+
+                group.append((path, content_hash, chunks))
+                group_chunks += len(chunks or ())
+                if group_chunks >= self.group_chunks or len(group) >= self.group_docs:
+                    await self.write_group(group)
+                    group, group_chunks = [], 0
+                    self._log_progress(len(paths), time.perf_counter() - start)
+
+            if group:
+                await self.write_group(group)
+        return time.perf_counter() - start
+
+
+    def _log_progress(self, total: int, elapsed: float):
+        s = self.stats
+        logger.info(f"{s['files']}/{total} files, {s['chunks']} chunks, "
+                    f"{s['files'] / elapsed:.1f} docs/s, {s['chunks'] / elapsed:.0f} chunks/s")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="directory to import, walked recursively")
+    parser.add_argument("--manifest", help=f"resume manifest (default: <directory>/{MANIFEST_NAME})")
+    parser.add_argument("--session", help="add every document to this existing session instead of one session per file")
+    parser.add_argument("--workers", type=int, default=max((os.cpu_count() or 2) - 1, 1),
+                        help="extraction/chunking processes")
+    parser.add_argument("--embed-batch", type=int, default=512, help="chunks per embedding call")
+    parser.add_argument("--group-chunks", type=int, default=4096, help="chunks per write transaction")
+    parser.add_argument("--group-docs", type=int, default=256, help="max files per write transaction")
+    parser.add_argument("--llm-titles", action="store_true",
+                        help="leave titles pending so the backend replaces them with LLM titles when idle")
+    args = parser.parse_args()
+
+    from db.database import engine, init_db
+
+    setup_logging()
+    root = Path(args.directory).resolve()
+    importer = BulkImporter(root, Path(args.manifest) if args.manifest else root / MANIFEST_NAME,
+                            session_id=args.session, llm_titles=args.llm_titles, embed_batch=args.embed_batch,
+                            group_chunks=args.group_chunks, group_docs=args.group_docs)
+    await init_db()
+    try:
+        elapsed = await importer.run(args.workers)
+    finally:
+        await engine.dispose()
+
+    s = importer.stats
+    print(f"Files: {s['files']} ({s['ingested']} ingested, {s['deduplicated']} already in library, {s['failed']} failed)")
+    print(f"Chunks embedded: {s['chunks']}")
+    print(f"Elapsed: {elapsed:.1f}s, {s['files'] / max(elapsed, 1e-9):.1f} docs/s, {s['chunks'] / max(elapsed, 1e-9):.0f} chunks/s")
+    print(f"Waiting on extraction/chunking: {s['prepare_wait_s']:.1f}s, embedding: {s['embed_s']:.1f}s, "
+          f"SQLite/vector writes: {s['write_s']:.1f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,39 @@
+"""
+Pool task of scripts.bulk_import: read, hash, extract and chunk one file.
+
+Spawned pool processes import this module (and re-import bulk_import as their main
+module), so neither may import the databases or the vector store at module level.
+"""
+import hashlib
+import os
+from pathlib import Path
+
+from services.chunker import token_chunker
+from services.extraction import iter_pages
+
+
+#Content hashes already in the library when the import started, set in each pool process
+_known_hashes = frozenset()
+
+
+def init_worker(known_hashes):
+    global _known_hashes
+    _known_hashes = known_hashes
+    #One process per core already, tokenizer threads would only oversubscribe
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+
+def prepare(path: str):
+    """
+    Returns (path, content hash, chunks, error); chunks is None for content the
+    library already has. The hash is document_library.content_hash's (sha256).
+    """
+    try:
+        content = Path(path).read_bytes()
+        content_hash = hashlib.sha256(content).hexdigest()
+        if content_hash in _known_hashes:
+            return path, content_hash, None, None
+        chunks = list(token_chunker.iter_chunks(iter_pages(content, path)))
+        return path, content_hash, chunks, None
+    except Exception as e:
+        return path, None, None, f"{type(e).__name__}: {e}"
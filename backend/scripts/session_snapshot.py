@@ -0,0 +1,68 @@
+"""
+Export a session to a snapshot file, or import one as a new session.
+
+A snapshot holds the session's documents, chunks, memories, chat history and raw
+vectors, so importing it never re-embeds anything. Documents already in the
+library (same content) are referenced instead of loaded again.
+
+Stop the backend first (or use GET /sessions/{id}/snapshot and POST /sessions/import),
+then run from backend/:
+    python -m scripts.session_snapshot export <session_id> -o session.zip
+    python -m scripts.session_snapshot import session.zip [--keep-id]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from db.database import AsyncSessionLocal, engine
+from services.snapshot_service import snapshot_service
+from utils.logger import setup_logging
+
+
+async def export_session(session_id: str, output: str):
+    start = time.perf_counter()
+    #Written next to the output and renamed, so a failed export leaves no partial file
+    tmp_path = f"{output}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            async with AsyncSessionLocal() as db:
+                await snapshot_service.export_session(session_id, db, f)
+        os.replace(tmp_path, output)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    size = os.path.getsize(output)
+    print(f"Exported session {session_id} to {output} ({size / 1e6:.1f} MB, {time.perf_counter() - start:.2f}s)")
+
+
+async def import_session(path: str, keep_id: bool):
+    start = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        session_id = await snapshot_service.import_session(path, db, keep_id=keep_id)
+    print(f"Imported {path} as session {session_id} ({time.perf_counter() - start:.2f}s)")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="write a session snapshot")
+    export_parser.add_argument("session_id")
+    export_parser.add_argument("-o", "--output", help="snapshot file (default: session-<id>.zip)")
+    import_parser = commands.add_parser("import", help="load a snapshot as a new session")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--keep-id", action="store_true", help="keep the snapshot's session id")
+    args = parser.parse_args()
+
+    setup_logging()
+    try:
+        if args.command == "export":
+            await export_session(args.session_id, args.output or f"session-{args.session_id}.zip")
+        else:
+            await import_session(args.path, args.keep_id)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
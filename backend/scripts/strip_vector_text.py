@@ -0,0 +1,156 @@
+"""
+Offline migration: drop chunk texts / LTM summaries duplicated in vector metadata.
+
+Chunk vectors keep `chunk_id`, LTM vectors get `ltm_id` (looked up in SQLite by
+session and summary), and the inline `text` / `summary` keys are removed. Prints disk
+usage and average metadata bytes per vector before and after.
+
+Stop the backend first, then run from backend/:
+    python -m scripts.strip_vector_text
+
+With a retrieval worker, stop it too and run this where its store lives, with
+RETRIEVAL_WORKER_SOCKET unset (the script refuses to run through the worker).
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from pathlib import Path
+from sqlalchemy import select
+
+from db.database import AsyncSessionLocal, engine
+from db.db_models import SessionLongTermMemory
+from db.vectordb import VECTOR_BACKEND, vectordb
+from services.retrieval_client import RETRIEVAL_WORKER_SOCKET
+from utils.logger import setup_logging
+
+
+CHROMA_PATH = "./db_files/chroma_db"
+LOCAL_PATH = "./db_files/local_vectors"
+PAGE_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def _dir_size(path: str) -> int:
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file())
+
+
+class MetadataStripper:
+    def __init__(self):
+        self._ltm_ids = {} #session_id -> {summary: ltm_id}
+        self.vectors = 0
+        self.changed = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+
+
+    async def _ltm_id(self, session_id: str, summary: str):
+        if session_id not in self._ltm_ids:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(select(SessionLongTermMemory.id, SessionLongTermMemory.summary)
+                                          .where(SessionLongTermMemory.session_id == session_id))
+                self._ltm_ids[session_id] = {summary: row_id for row_id, summary in result.all()}
+        return self._ltm_ids[session_id].get(summary)
+
+
+    #Returns the stripped metadata, or None if nothing changes
+    async def strip(self, metadata: dict):
+        self.vectors += 1
+        self.bytes_before += len(json.dumps(metadata))
+
+        new = dict(metadata)
+        new.pop("text", None)
+        if "summary" in new:
+            ltm_id = await self._ltm_id(new.get("session_id"), new["summary"])
+            if ltm_id is None:
+                #No SQLite row to point to, keep the inline summary
+                logger.warning(f"No LTM row for summary in session {new.get('session_id')}, keeping it inline")
+            else:
+                new.pop("summary")
+                new["ltm_id"] = ltm_id
+
+        self.bytes_after += len(json.dumps(new))
+        if new == metadata:
+            return None
+        self.changed += 1
+        return new
+
+
+async def strip_chroma(stripper: MetadataStripper):
+    client = vectordb.client
+    for col in client.list_collections():
+        col = client.get_collection(name=col if isinstance(col, str) else col.name)
+
+        offset = 0
+        while True:
+            page = col.get(limit=PAGE_SIZE, offset=offset, include=["metadatas"])
+            if not page["ids"]:
+                break
+
+            ids, updates = [], []
+            for vector_id, metadata in zip(page["ids"], page["metadatas"]):
+                new = await stripper.strip(metadata)
+                if new is not None:
+                    #Chroma removes keys that are set to None on update
+                    ids.append(vector_id)
+                    updates.append({**new, **{k: None for k in metadata if k not in new}})
+            if ids:
+                col.update(ids=ids, metadatas=updates)
+            offset += len(page["ids"])
+
+        logger.info(f"Processed collection {col.name}")
+
+    #Reclaiming the freed pages of Chroma's SQLite store (safe, the backend is offline)
+    sqlite_path = Path(CHROMA_PATH) / "chroma.sqlite3"
+    if sqlite_path.exists():
+        conn = sqlite3.connect(sqlite_path)
+        conn.execute("VACUUM")
+        conn.close()
+
+
+async def strip_local(stripper: MetadataStripper):
+    for meta_path in vectordb.root.glob("*/*/meta.jsonl"):
+        rows = [json.loads(line) for line in meta_path.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+        changed = False
+        for row in rows:
+            new = await stripper.strip(row["metadata"])
+            if new is not None:
+                row["metadata"] = new
+                changed = True
+
+        if changed:
+            tmp_path = meta_path.with_suffix(".tmp")
+            tmp_path.write_text("".join(json.dumps(row) + "\n" for row in rows), encoding="utf-8")
+            os.replace(tmp_path, meta_path)
+
+
+async def main():
+    setup_logging()
+    if RETRIEVAL_WORKER_SOCKET:
+        #The store is behind the retrieval worker here, this script rewrites its files directly
+        raise SystemExit("RETRIEVAL_WORKER_SOCKET is set: the vector store is owned by the retrieval worker. "
+                         "Stop the worker and run this script where the store lives, with RETRIEVAL_WORKER_SOCKET unset.")
+    path = CHROMA_PATH if VECTOR_BACKEND == "chroma" else LOCAL_PATH
+    disk_before = _dir_size(path)
+
+    stripper = MetadataStripper()
+    if VECTOR_BACKEND == "chroma":
+        await strip_chroma(stripper)
+    else:
+        await strip_local(stripper)
+    await engine.dispose()
+
+    disk_after = _dir_size(path)
+    per_before = stripper.bytes_before / max(stripper.vectors, 1)
+    per_after = stripper.bytes_after / max(stripper.vectors, 1)
+
+    print(f"Vectors scanned: {stripper.vectors}, metadata rewritten: {stripper.changed}")
+    print(f"Metadata per vector: {per_before:.0f} B -> {per_after:.0f} B")
+    print(f"Vector store on disk: {disk_before / 1e6:.1f} MB -> {disk_after / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
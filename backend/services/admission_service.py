@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from utils.metrics import metrics
+
+
+#How often a queued client is told its position while it waits
+QUEUE_POSITION_INTERVAL_SECONDS = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    def __init__(self, session_id, future):
+        self.session_id = session_id
+        self.future = future
+
+
+class AdmissionController:
+    """
+    Global and per-session concurrency limits with a bounded FIFO wait queue.
+
+    Work that can't start right away waits in the queue until a slot frees up or its
+    deadline passes; when the queue is full or the deadline passes it is rejected with
+    a Retry-After estimate, so overload turns into fast "busy" answers for some clients
+    instead of slow answers for everyone. Limits can be changed at runtime.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_per_session: int, max_queue: int, max_wait_seconds: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_per_session = max_per_session
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+
+        self._active = 0
+        self._active_by_session = {}
+        self._waiters = deque()
+        self._avg_hold_seconds = 5.0 #moving average of how long admitted work runs
+
+
+    def _can_run(self, session_id) -> bool:
+        if self._active >= self.max_concurrent:
+            return False
+        return session_id is None or self._active_by_session.get(session_id, 0) < self.max_per_session
+
+
+    def _grant(self, session_id):
+        self._active += 1
+        if session_id is not None:
+            self._active_by_session[session_id] = self._active_by_session.get(session_id, 0) + 1
+        self._report()
+
+
+    def _release(self, session_id, held_seconds: float):
+        self._active -= 1
+        if session_id is not None:
+            remaining = self._active_by_session.get(session_id, 1) - 1
+            if remaining:
+                self._active_by_session[session_id] = remaining
+            else:
+                self._active_by_session.pop(session_id, None)
+
+        self._avg_hold_seconds = 0.8 * self._avg_hold_seconds + 0.2 * held_seconds
+        self._dispatch()
+
+
+    #Admitting queued work in FIFO order, skipping waiters whose session is at its own limit
+    def _dispatch(self):
+        for waiter in list(self._waiters):
+            if self._active >= self.max_concurrent:
+                break
+            if not waiter.future.done() and self._can_run(waiter.session_id):
+                self._waiters.remove(waiter)
+                self._grant(waiter.session_id)
+                waiter.future.set_result(True)
+        self._report()
+
+
+    def _retry_after(self) -> int:
+        backlog = len(self._waiters) + 1
+        return max(1, math.ceil(self._avg_hold_seconds * backlog / max(self.max_concurrent, 1)))
+
+
+    def _position(self, waiter: _Waiter) -> int:
+        try:
+            return self._waiters.index(waiter) + 1
+        except ValueError:
+            return 0
+
+
+    def _report(self):
+        metrics.set_gauge(f"admission_{self.name}_active", self._active)
+        metrics.set_gauge(f"admission_{self.name}_queued", len(self._waiters))
+
+
+    def _reject(self, reason: str):
+        retry_after = self._retry_after()
+        metrics.incr(f"admission_{self.name}_rejected")
+        logger.warning(f"Admission ({self.name}) rejected: {reason}, retry after {retry_after}s")
+        raise AdmissionRejected(reason, retry_after)
+
+
+    async def _acquire(self, session_id, on_queued):
+        if not self._waiters and self._can_run(session_id):
+            self._grant(session_id)
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self._reject("queue full")
+
+        waiter = _Waiter(session_id, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        #Waiters ahead may only be blocked by their own session's limit
+        self._dispatch()
+        if waiter.future.done():
+            return
+        deadline = time.monotonic() + self.max_wait_seconds
+        last_position = None
+
+        try:
+            while True:
+                position = self._position(waiter)
+                if on_queued is not None and position != last_position:
+                    await on_queued(position)
+                    last_position = position
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._reject("queue wait deadline exceeded")
+
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter.future),
+                                           timeout=min(remaining, QUEUE_POSITION_INTERVAL_SECONDS))
+                    return
+                except asyncio.TimeoutError:
+                    continue
+
+        except BaseException:
+            if waiter.future.done() and not waiter.future.cancelled():
+                #Granted at the last moment, hand the slot back
+                self._release(session_id, 0.0)
+            else:
+                waiter.future.cancel()
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                self._dispatch()
+            raise
+
+
+    @asynccontextmanager
+    async def admit(self, session_id: str = None, on_queued=None):
+        """
+        Hold a slot for the duration of the block. `on_queued(position)` is awaited
+        whenever the caller's queue position changes. Raises AdmissionRejected.
+        """
+        start = time.monotonic()
+        await self._acquire(session_id, on_queued)
+        metrics.observe(f"admission_{self.name}_wait", (time.monotonic() - start) * 1000)
+        metrics.incr(f"admission_{self.name}_admitted")
+
+        granted = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(session_id, time.monotonic() - granted)
+
+
+    #No admitted or queued work (lets background work yield to user traffic)
+    def idle(self) -> bool:
+        return self._active == 0 and not self._waiters
+
+
+    def limits(self) -> dict:
+        return {"max_concurrent": self.max_concurrent,
+                "max_per_session": self.max_per_session,
+                "max_queue": self.max_queue,
+                "max_wait_seconds": self.max_wait_seconds,
+                "active": self._active,
+                "queued": len(self._waiters)}
+
+
+    def update_limits(self, **limits):
+        for name, value in limits.items():
+            if value is not None:
+                setattr(self, name, value)
+        logger.info(f"Admission ({self.name}) limits updated: {self.limits()}")
+
+        #Raised limits may let queued work start right away
+        self._dispatch()
+
+
+chat_admission = AdmissionController(name="chat",
+                                     max_concurrent=int(os.getenv("CHAT_MAX_CONCURRENT", "4")),
+                                     max_per_session=int(os.getenv("CHAT_MAX_PER_SESSION", "1")),
+                                     max_queue=int(os.getenv("CHAT_MAX_QUEUE", "32")),
+                                     max_wait_seconds=float(os.getenv("CHAT_MAX_WAIT_SECONDS", "30")))
+
+upload_admission = AdmissionController(name="upload",
+                                       max_concurrent=int(os.getenv("UPLOAD_MAX_CONCURRENT", "2")),
+                                       max_per_session=1,
+                                       max_queue=int(os.getenv("UPLOAD_MAX_QUEUE", "8")),
+                                       max_wait_seconds=float(os.getenv("UPLOAD_MAX_WAIT_SECONDS", "20")))
+
+admission_controllers = {"chat": chat_admission, "upload": upload_admission}
@@ -1,15 +1,35 @@
+import asyncio
 import logging
+import os
 import numpy as np
+from contextlib import aclosing
 from typing import List
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from db.vectordb import vectordb
+from services.document_library import document_library
 from services.memory_service import memory_service
 from services.llm_service import llm_service
+from services.reranker import chunk_reranker
+from services.text_store import text_store
+from utils.metrics import metrics
 from utils.prompt_utils import load_prompt
 from utils.tokenizer import estimate_tokens
 
 
+#"adaptive": wide vector search, cross-encoder rerank, relevance cutoffs and a token budget;
+#"fixed": the top k_retrieval chunks by vector similarity, whatever their relevance
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "adaptive")
+#Candidates fetched by vector search before reranking
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "12"))
+#Candidates further than this cosine distance are dropped before reranking
+RETRIEVAL_MAX_DISTANCE = float(os.getenv("RETRIEVAL_MAX_DISTANCE", "0.75"))
+#Chunks scored below this by the cross-encoder are dropped
+RERANK_MIN_SCORE = float(os.getenv("RERANK_MIN_SCORE", "0"))
+#Document context kept in the prompt, in estimated tokens and in chunks
+RETRIEVAL_CONTEXT_TOKENS = int(os.getenv("RETRIEVAL_CONTEXT_TOKENS", "1000"))
+RETRIEVAL_MAX_CHUNKS = int(os.getenv("RETRIEVAL_MAX_CHUNKS", "5"))
+
 logger = logging.getLogger(__name__)
 
 
@@ -23,7 +43,7 @@ class ChatOrchestrator:
 
         short_term_token_limit: When to summarize short-term memory
         response_token_limit: Max tokens to send to LLM for final prompt
-        k_retrieval: Top-k chunks retrieved
+        k_retrieval: Top-k chunks retrieved in "fixed" retrieval mode
         """
 
         self.short_term_token_limit = short_term_token_limit
@@ -47,31 +67,31 @@ class ChatOrchestrator:
         #3. Fetching short term and long term memories
         short_memory = await memory_service.get_short_term(session_id, db)
         
-        #Selective LTM recall
-        ltm_embeddings = await llm_service.embed(user_message)
-        res = vectordb.search(collection_name="ltm", embedding=ltm_embeddings, session_id=session_id, n=1)
+        #Selective LTM recall (the query embedding is reused for chunk retrieval below)
+        query_emb = await llm_service.embed(user_message)
+        if isinstance(query_emb, list):
+            query_emb = np.array(query_emb, dtype="float32")
+        #Vector store calls run off the event loop (they can be socket round-trips to the retrieval worker)
+        res = await asyncio.to_thread(vectordb.search, collection_name="ltm", embedding=query_emb,
+                                      session_id=session_id, n=1)
         metas = res.get("metadatas", [[]])[0]
         if metas:
-            long_memory = [metas[0]["summary"]]
+            long_memory = await self._resolve_texts(session_id, metas[:1], "ltm_id", "summary",
+                                                     text_store.get_ltm_summaries, db)
         else:
             long_memory = []
         logger.info(f"[{session_id}] Loaded short term ({len(short_memory)} turns) and long term ({len(long_memory)}) memories")
 
-        #4. Embedding user message (query) and retrieving top-k chunks
-        query_emb = await llm_service.embed(user_message)
-        if isinstance(query_emb, list):
-            query_emb = np.array(query_emb, dtype="float32")
-        logger.info(f"Obtained query embedding (dim={query_emb.shape}) for session id: {session_id}")
-
-        #5. Running similarity search to retrieve similar embeddings
-        results = vectordb.search(collection_name='chunks', embedding=query_emb, session_id=session_id, n=3)
-        metadatas = results.get("metadatas", [[]])[0]
-        doc_contexts = [md.get("text", "") for md in metadatas]
-        logger.info(f"[{session_id}] Ran similarity search and retrieved {len(doc_contexts)} document chunks from ChromaDB")
+        #4-5. Retrieving the relevant chunks of the library documents this session references
+        with metrics.timer("retrieval"):
+            doc_contexts = await self.retrieve_chunks(session_id, user_message, query_emb, db)
+        logger.info(f"[{session_id}] Retrieved {len(doc_contexts)} document chunks")
 
         #6. Building final prompt
         prompt = self._build_prompt(user_message, short_memory, long_memory, doc_contexts)
         used_tokens = estimate_tokens(prompt)
+        metrics.incr("prompts_built")
+        metrics.incr("prompt_tokens", used_tokens)
         logger.info(f"[{session_id}] Built prompt (approx tokens={used_tokens})")
 
         if used_tokens > self.response_token_limit:
@@ -84,21 +104,97 @@ class ChatOrchestrator:
         #7. Streaming LLM response
         logger.info(f"[{session_id}] Streaming prompt to LLM (streaming)")
         full_response = ""
+        completed = False
+
+        try:
+            #aclosing makes an abandoned stream (client stop/disconnect) close the Ollama response right away
+            async with aclosing(llm_service.chat_stream(prompt)) as stream:
+                async for token in stream:
+                    full_response += token
+                    yield token  #stream to client
+            completed = True
+            logger.info(f"[{session_id}] LLM completed (len={len(full_response)} chars)")
+
+        finally:
+            if not completed:
+                logger.info(f"[{session_id}] LLM generation stopped early (len={len(full_response)} chars)")
+
+            #8. Append assistant response to short-term memory (the partial one if generation was
+            #stopped, so STM and chat history match what the user saw)
+            if completed or full_response:
+                await memory_service.add_short_term(session_id=session_id,
+                                                    role="assistant",
+                                                    content=full_response,
+                                                    db=db)
+                logger.info(f"Appended assistant response to short-term memory for session id: {session_id}")
+
         
-        async for token in llm_service.chat_stream(prompt):
-            full_response += token
-            yield token  #stream to client
-        
-        logger.info(f"[{session_id}] LLM completed (len={len(full_response)} chars)")
 
-        #8. Append complete assistant response to short-term memory
-        await memory_service.add_short_term(session_id=session_id,
-                                            role="assistant",
-                                            content=full_response,
-                                            db=db)
-        logger.info(f"Appended assistant response to short-term memory for session id: {session_id}")
+    async def retrieve_chunks(self, session_id: str, user_message: str, query_emb: np.ndarray,
+                              db: AsyncSession, mode: str = None) -> List[str]:
+        """
+        Document chunks for the prompt, most relevant first. In adaptive mode only as
+        many chunks as are relevant are kept: RETRIEVAL_CANDIDATES are fetched, those
+        beyond RETRIEVAL_MAX_DISTANCE dropped, the rest reranked by the cross-encoder in
+        one batch and cut at RERANK_MIN_SCORE, then packed into RETRIEVAL_CONTEXT_TOKENS.
+        A question the documents don't answer gets no chunks at all.
+        """
+        mode = mode or RETRIEVAL_MODE
+        partitions = await document_library.session_partitions(session_id, db)
+
+        if mode == "fixed":
+            results = await asyncio.to_thread(vectordb.search_partitions, collection_name='chunks', embedding=query_emb,
+                                              partition_ids=partitions, n=self.k)
+            return await self._resolve_texts(session_id, results.get("metadatas", [[]])[0], "chunk_id", "text",
+                                             text_store.get_chunk_texts, db)
+
+        #1. Wide vector search, dropping clearly unrelated candidates before paying for reranking
+        results = await asyncio.to_thread(vectordb.search_partitions, collection_name='chunks', embedding=query_emb,
+                                          partition_ids=partitions, n=RETRIEVAL_CANDIDATES)
+        hits = [md for md, distance in zip(results.get("metadatas", [[]])[0], results.get("distances", [[]])[0])
+                if distance <= RETRIEVAL_MAX_DISTANCE]
+        texts = await self._resolve_texts(session_id, hits, "chunk_id", "text", text_store.get_chunk_texts, db)
+
+        #2. Cross-encoder rerank with a relevance cutoff (vector order if the reranker is off or fails)
+        order = list(range(len(texts)))
+        if chunk_reranker.enabled and texts:
+            try:
+                with metrics.timer("rerank"):
+                    scores = await chunk_reranker.score(user_message, texts)
+                order = [int(i) for i in np.argsort(-scores, kind="stable") if scores[i] >= RERANK_MIN_SCORE]
+            except Exception as e:
+                metrics.incr("rerank_failed")
+                logger.warning(f"[{session_id}] Reranking failed, keeping vector order: {e}")
+
+        #3. Packing the best chunks into the context budget (the top chunk is always kept)
+        kept, used = [], 0
+        for i in order:
+            tokens = estimate_tokens(texts[i])
+            if not texts[i] or (kept and used + tokens > RETRIEVAL_CONTEXT_TOKENS):
+                continue
+            kept.append(texts[i])
+            used += tokens
+            if len(kept) >= RETRIEVAL_MAX_CHUNKS:
+                break
+
+        metrics.incr("retrieval_candidates", len(results.get("metadatas", [[]])[0]))
+        metrics.incr("retrieval_chunks_used", len(kept))
+        metrics.incr("retrieval_context_tokens", used)
+        logger.info(f"[{session_id}] Adaptive retrieval: {len(hits)} candidates within distance, "
+                    f"{len(order)} relevant, {len(kept)} kept (~{used} tokens)")
+        return kept
+
+
+    #Texts of vector hits via one bulk SQLite lookup (vectors written before the text was
+    #dropped from metadata still carry it inline under `legacy_key`)
+    async def _resolve_texts(self, session_id: str, metadatas: List[dict], id_key: str, legacy_key: str,
+                             resolver, db: AsyncSession) -> List[str]:
+        ids = [md[id_key] for md in metadatas if legacy_key not in md and id_key in md]
+        resolved = await resolver(session_id, ids, db)
+        by_id = dict(zip(ids, resolved))
+
+        return [md[legacy_key] if legacy_key in md else by_id.get(md.get(id_key), "") for md in metadatas]
 
-        
 
     def _build_prompt(self, user_message: str, short_memory: List[dict], long_memory: List[str], doc_contexts: List[str]) -> str:
         
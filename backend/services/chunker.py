@@ -0,0 +1,132 @@
+import logging
+import os
+import re
+
+from services.llm_service import LLMService
+
+
+#Max tokens per chunk, including the model's special tokens (all-mpnet-base-v2 truncates input at 384)
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "384"))
+#Trailing sentences of a chunk repeated at the start of the next one, up to this many tokens
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+
+#Sentence ends followed by whitespace, and blank lines (paragraphs, headings, list blocks)
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+logger = logging.getLogger(__name__)
+
+
+class TokenChunker:
+    """
+    Splits text into chunks measured in the embedding model's own tokens, so no
+    chunk is longer than what the model actually embeds.
+
+    Chunks are packed from whole sentences and never cross a page boundary; only a
+    sentence longer than the budget is cut, at token boundaries. Each chunk is a dict
+    {"text", "page", "char_start", "char_end", "token_count"} with character offsets
+    into its page's text (or into the whole text for formats without pages).
+    """
+
+    def __init__(self, tokenizer_name: str = LLMService.EMBEDDING_MODEL_NAME,
+                 max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS):
+        self.tokenizer_name = tokenizer_name
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self._tokenizer = None
+
+
+    #Only the (fast, Rust) tokenizer is loaded, not the model
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+            self._tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name)
+        return self._tokenizer
+
+
+    #Token budget for chunk text, leaving room for the special tokens the model adds
+    @property
+    def budget(self) -> int:
+        return self.max_tokens - self.tokenizer.num_special_tokens_to_add()
+
+
+    def iter_chunks(self, pages):
+        """Chunk an iterable of (page number or None, text), yielding chunks as each page is done."""
+        for page, text in pages:
+            yield from self._chunk_page(page, text)
+
+
+    #Chunks in lists of up to `size`, for batched embedding
+    def iter_batches(self, pages, size: int):
+        batch = []
+        for chunk in self.iter_chunks(pages):
+            batch.append(chunk)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+    def _chunk_page(self, page, text: str):
+        pieces = self._pieces(text)
+        budget = self.budget
+
+        current, tokens = [], 0
+        for piece in pieces:
+            if current and tokens + piece[2] > budget:
+                yield self._chunk(page, text, current, tokens)
+
+                #Carrying whole trailing sentences over as overlap, if they fit
+                overlap, overlap_tokens = [], 0
+                for prev in reversed(current):
+                    if overlap_tokens + prev[2] > self.overlap_tokens:
+                        break
+                    overlap.insert(0, prev)
+                    overlap_tokens += prev[2]
+                if overlap_tokens + piece[2] > budget:
+                    overlap, overlap_tokens = [], 0
+                current, tokens = overlap, overlap_tokens
+
+            current.append(piece)
+            tokens += piece[2]
+
+        if current:
+            yield self._chunk(page, text, current, tokens)
+
+
+    #Sentences of a page as (char_start, char_end, token_count), with over-long ones cut to the budget
+    def _pieces(self, text: str):
+        spans, start = [], 0
+        for match in _SENTENCE_BOUNDARY.finditer(text):
+            spans.append((start, match.start()))
+            start = match.end()
+        spans.append((start, len(text)))
+
+        #Trimming surrounding whitespace and dropping empty spans
+        spans = [(s + len(text[s:e]) - len(text[s:e].lstrip()), e - len(text[s:e]) + len(text[s:e].rstrip()))
+                 for s, e in spans if text[s:e].strip()]
+        if not spans:
+            return []
+
+        #One tokenizer call for the whole page
+        encoded = self.tokenizer([text[s:e] for s, e in spans], add_special_tokens=False,
+                                 return_offsets_mapping=True, verbose=False)
+        budget = self.budget
+
+        pieces = []
+        for (s, _), offsets in zip(spans, encoded["offset_mapping"]):
+            if not offsets:
+                continue
+            for i in range(0, len(offsets), budget):
+                window = offsets[i:i + budget]
+                pieces.append((s + window[0][0], s + window[-1][1], len(window)))
+        return pieces
+
+
+    def _chunk(self, page, text: str, pieces, tokens: int) -> dict:
+        start, end = pieces[0][0], pieces[-1][1]
+        return {"text": text[start:end], "page": page, "char_start": start, "char_end": end, "token_count": tokens}
+
+
+token_chunker = TokenChunker()
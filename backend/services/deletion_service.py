@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, delete, func, update
+
+from db.database import AsyncSessionLocal, engine
+from db.db_models import (Document, DocumentChunk, Session, SessionChatHistory, SessionDeletionJob)
+from db.vectordb import vectordb
+from services.document_library import document_library
+from services.memory_service import memory_service
+from services.text_store import text_store
+from utils.metrics import metrics
+
+
+#Sessions purged per transaction
+DELETION_BATCH_SIZE = int(os.getenv("DELETION_BATCH_SIZE", "100"))
+#How often the queue is polled when nothing wakes the worker up
+DELETION_POLL_INTERVAL_SECONDS = float(os.getenv("DELETION_POLL_INTERVAL_SECONDS", "5"))
+#Retry backoff for failed jobs (doubles per attempt, capped)
+DELETION_RETRY_BASE_SECONDS = float(os.getenv("DELETION_RETRY_BASE_SECONDS", "10"))
+DELETION_RETRY_MAX_SECONDS = float(os.getenv("DELETION_RETRY_MAX_SECONDS", "3600"))
+#Run SQLite VACUUM after this many purged sessions (0 disables)
+DELETION_VACUUM_EVERY = int(os.getenv("DELETION_VACUUM_EVERY", "1000"))
+
+logger = logging.getLogger(__name__)
+
+
+class SessionDeletionService:
+    """
+    Durable session deletion queue.
+
+    Deleting a session tombstones its row (Session.deleted_at) and records a
+    SessionDeletionJob in the same transaction, so the session is hidden at once and
+    the job survives restarts. A background worker then purges vectors and rows of
+    many sessions per transaction, retrying failed sessions with backoff. Purging a
+    session drops its document references; library documents left without any are
+    purged next.
+    """
+
+    def __init__(self):
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._stopping = False
+        self._purged_since_vacuum = 0
+
+
+    #Tombstone a session and queue its purge (caller's transaction is committed here)
+    async def enqueue(self, session_id: str, db):
+        now = datetime.now(timezone.utc)
+
+        session_row = await db.get(Session, session_id)
+        if session_row is not None:
+            session_row.deleted_at = now
+        await db.merge(SessionDeletionJob(session_id=session_id, attempts=0, next_attempt_at=now, created_at=now))
+        await db.commit()
+
+        metrics.incr("deletion_enqueued")
+        self._wakeup.set()
+
+
+    #Purge one batch of due jobs, returns how many jobs were picked up
+    async def process_batch(self) -> int:
+        now = datetime.now(timezone.utc)
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(SessionDeletionJob.session_id, SessionDeletionJob.attempts)
+                                      .where(SessionDeletionJob.next_attempt_at <= now)
+                                      .order_by(SessionDeletionJob.created_at)
+                                      .limit(DELETION_BATCH_SIZE))
+            #Plain values, not ORM objects: those would be expired by the rollback of a failed batch
+            jobs = [(session_id, attempts or 0) for session_id, attempts in result.all()]
+            if not jobs:
+                return 0
+
+            #Vectors first, per session, so a failing session doesn't block the rest of the batch
+            done, failed = [], []
+            for session_id, attempts in jobs:
+                try:
+                    await asyncio.to_thread(vectordb.delete_session_embeddings, "chunks", session_id)
+                    await asyncio.to_thread(vectordb.delete_session_embeddings, "ltm", session_id)
+                    done.append(session_id)
+                except Exception as e:
+                    failed.append((session_id, attempts, e))
+
+            try:
+                with metrics.timer("deletion_batch"):
+                    if done:
+                        await memory_service.delete_all_session_memory(done, db)
+                        await db.execute(delete(SessionChatHistory).where(SessionChatHistory.session_id.in_(done)))
+                        #Documents are shared: only references go, unreferenced documents are tombstoned
+                        await document_library.release_sessions(done, db)
+                        await db.execute(delete(Session).where(Session.id.in_(done)))
+                        await db.execute(delete(SessionDeletionJob).where(SessionDeletionJob.session_id.in_(done)))
+
+                    for session_id, attempts, error in failed:
+                        await self._schedule_retry(session_id, attempts, error, now, db)
+
+                    await db.commit()
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"Session deletion batch failed, retrying later: {e}")
+                for session_id, attempts in jobs:
+                    await self._schedule_retry(session_id, attempts, e, now, db)
+                await db.commit()
+                done = []
+
+        metrics.incr("deletion_purged_sessions", len(done))
+        if done:
+            logger.info(f"Purged {len(done)} deleted sessions ({len(failed)} failed, will retry)")
+
+        self._purged_since_vacuum += len(done)
+        if DELETION_VACUUM_EVERY and self._purged_since_vacuum >= DELETION_VACUUM_EVERY:
+            await self._vacuum()
+
+        return len(jobs)
+
+
+    #Purge vectors and rows of library documents no session references any more, returns how many were purged
+    async def purge_documents(self) -> int:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(Document.id, Document.content_hash, Document.session_id)
+                                      .where(Document.deleted_at.is_not(None))
+                                      .limit(DELETION_BATCH_SIZE))
+            rows = result.all()
+            if not rows:
+                return 0
+
+            done = []
+            for document_id, content_hash, owner_session_id in rows:
+                try:
+                    partition = document_library.partition_of(document_id, content_hash, owner_session_id)
+                    await asyncio.to_thread(vectordb.delete_session_embeddings, "chunks", partition)
+                    done.append(document_id)
+                except Exception as e:
+                    #Tombstone stays, retried on the next cycle
+                    metrics.incr("deletion_failures")
+                    logger.error(f"Deleting vectors of document {document_id} failed, will retry: {e}")
+
+            if done:
+                chunk_ids = (await db.scalars(select(DocumentChunk.id).where(DocumentChunk.document_id.in_(done)))).all()
+                await db.execute(delete(DocumentChunk).where(DocumentChunk.document_id.in_(done)))
+                await db.execute(delete(Document).where(Document.id.in_(done)))
+                await db.commit()
+                #Cached chunk texts are keyed by chunk id alone, and SQLite may hand these ids out again
+                text_store.forget_chunks(chunk_ids)
+
+        metrics.incr("deletion_purged_documents", len(done))
+        if done:
+            logger.info(f"Purged {len(done)} unreferenced library documents ({len(rows) - len(done)} failed, will retry)")
+        return len(done)
+
+
+    #Record a failed attempt of a job (caller commits)
+    async def _schedule_retry(self, session_id: str, attempts: int, error: Exception, now: datetime, db):
+        attempts += 1
+        delay = min(DELETION_RETRY_BASE_SECONDS * 2 ** (attempts - 1), DELETION_RETRY_MAX_SECONDS)
+        await db.execute(update(SessionDeletionJob)
+                         .where(SessionDeletionJob.session_id == session_id)
+                         .values(attempts=attempts, last_error=str(error)[:1000],
+                                 next_attempt_at=now + timedelta(seconds=delay)))
+        metrics.incr("deletion_failures")
+        logger.error(f"Deletion of session id:{session_id} failed (attempt {attempts}), retry in {delay:.0f}s: {error}")
+
+
+    #Reclaim space freed by purged rows (VACUUM can't run inside a transaction)
+    async def _vacuum(self):
+        logger.info("Vacuuming SQLite database after session purges")
+        with metrics.timer("deletion_vacuum"):
+            async with engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                await conn.exec_driver_sql("VACUUM")
+                await conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._purged_since_vacuum = 0
+
+
+    async def _update_backlog(self):
+        async with AsyncSessionLocal() as db:
+            backlog = await db.scalar(select(func.count()).select_from(SessionDeletionJob))
+            documents = await db.scalar(select(func.count()).select_from(Document).where(Document.deleted_at.is_not(None)))
+        metrics.set_gauge("deletion_backlog", backlog)
+        metrics.set_gauge("deletion_documents_backlog", documents)
+
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                #Draining everything that's due before sleeping again
+                while not self._stopping and await self.process_batch() == DELETION_BATCH_SIZE:
+                    pass
+                while not self._stopping and await self.purge_documents() == DELETION_BATCH_SIZE:
+                    pass
+                await self._update_backlog()
+            except Exception as e:
+                logger.error(f"Session deletion worker error: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=DELETION_POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+    def start(self):
+        if self._task is None:
+            logger.info("Starting session deletion worker")
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+
+    async def stop(self):
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        logger.info("Session deletion worker stopped")
+
+
+session_deletion = SessionDeletionService()
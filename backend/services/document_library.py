@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import logging
+import weakref
+from datetime import datetime, timezone
+from sqlalchemy import select, update, insert, delete, exists, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.db_models import Document, DocumentChunk, SessionDocument
+from db.vector_base import document_partition
+from utils.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentLibrary:
+    """
+    Content-addressed document library shared by all sessions.
+
+    A document is identified by the sha256 of its file, ingested (chunked and embedded)
+    once, and referenced by every session it was uploaded to (SessionDocument). Once no
+    session references it any more it is tombstoned and purged by the deletion worker.
+
+    Documents from before the library (content_hash None) keep their chunk vectors in
+    the partition of the session that uploaded them.
+    """
+
+    def __init__(self):
+        #content hash -> lock, so concurrent uploads of one file ingest it once (dropped once unused)
+        self._locks = weakref.WeakValueDictionary()
+
+
+    @staticmethod
+    def content_hash(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()
+
+
+    #Serialises ingestion of one file content within this process
+    def lock(self, content_hash: str) -> asyncio.Lock:
+        lock = self._locks.get(content_hash)
+        if lock is None:
+            lock = self._locks[content_hash] = asyncio.Lock()
+        return lock
+
+
+    @staticmethod
+    def partition_of(document_id: int, content_hash, owner_session_id) -> str:
+        return document_partition(document_id) if content_hash else owner_session_id
+
+
+    #Live library document with this content, if any
+    async def find(self, content_hash: str, db: AsyncSession):
+        result = await db.execute(select(Document)
+                                  .where(Document.content_hash == content_hash)
+                                  .where(Document.deleted_at.is_(None)))
+        return result.scalars().first()
+
+
+    async def add_reference(self, session_id: str, document_id: int, filename: str, db: AsyncSession) -> bool:
+        """
+        Reference a document from a session (caller commits). Inserted only while the
+        document is live, in one statement, so it can't race with the orphan tombstoning
+        of the deletion worker. Returns False if the document was tombstoned meanwhile.
+        """
+        live = (select(literal(session_id), Document.id, literal(filename), literal(datetime.now(timezone.utc)))
+                .where(Document.id == document_id)
+                .where(Document.deleted_at.is_(None)))
+        result = await db.execute(insert(SessionDocument)
+                                  .prefix_with("OR IGNORE")
+                                  .from_select(["session_id", "document_id", "filename", "created_at"], live))
+        if result.rowcount:
+            return True
+
+        #Already referenced (OR IGNORE) counts as success as long as the document is live
+        return await db.scalar(select(exists().where(Document.id == document_id)
+                                      .where(Document.deleted_at.is_(None)))) or False
+
+
+    #Chunk partitions of all documents a session references
+    async def session_partitions(self, session_id: str, db: AsyncSession) -> list:
+        result = await db.execute(select(Document.id, Document.content_hash, Document.session_id)
+                                  .join(SessionDocument, SessionDocument.document_id == Document.id)
+                                  .where(SessionDocument.session_id == session_id)
+                                  .where(Document.deleted_at.is_(None))
+                                  .order_by(Document.id))
+        partitions = [self.partition_of(*row) for row in result.all()]
+        return list(dict.fromkeys(partitions)) #legacy documents of one session share a partition
+
+
+    async def first_chunk_text(self, document_id: int, db: AsyncSession) -> str:
+        return await db.scalar(select(DocumentChunk.text)
+                               .where(DocumentChunk.document_id == document_id)
+                               .order_by(DocumentChunk.chunk_index)
+                               .limit(1)) or ""
+
+
+    #Dropping references of purged sessions and tombstoning documents left without any (caller commits)
+    async def release_sessions(self, session_ids: list, db: AsyncSession) -> int:
+        result = await db.execute(select(SessionDocument.document_id)
+                                  .where(SessionDocument.session_id.in_(session_ids)))
+        document_ids = {row[0] for row in result.all()}
+
+        await db.execute(delete(SessionDocument).where(SessionDocument.session_id.in_(session_ids)))
+        if not document_ids:
+            return 0
+
+        referenced = exists().where(SessionDocument.document_id == Document.id)
+        result = await db.execute(update(Document)
+                                  .where(Document.id.in_(document_ids))
+                                  .where(Document.deleted_at.is_(None))
+                                  .where(~referenced)
+                                  .values(deleted_at=datetime.now(timezone.utc)))
+        if result.rowcount:
+            metrics.incr("library_documents_orphaned", result.rowcount)
+            logger.info(f"{result.rowcount} library documents lost their last reference")
+        return result.rowcount
+
+
+document_library = DocumentLibrary()
@@ -0,0 +1,45 @@
+import io
+import logging
+from docx import Document as DocxDocument
+from PyPDF2 import PdfReader
+
+#Text extraction only; imported by bulk import pool processes, so nothing here may open the databases
+
+logger = logging.getLogger(__name__)
+
+
+def iter_pages(content: bytes, filename: str):
+    """
+    Extract text from .pdf, .txt, .docx, .md files as (page number, cleaned text),
+    one PDF page at a time; other formats are a single page numbered None.
+    """
+
+    filename = filename.lower()
+
+    #Txt and Markdown  file formats
+    if filename.endswith(".txt") or filename.endswith(".md"):
+        logger.info("Detected TXT/MD file")
+        yield None, clean_text(content.decode("utf-8", errors="ignore"))
+        return
+
+    #DOCX file format
+    if filename.endswith(".docx"):
+        logger.info("Detected DOCX file")
+        doc = DocxDocument(io.BytesIO(content))
+        yield None, clean_text("\n".join(par.text for par in doc.paragraphs))
+        return
+
+    #PDF file format
+    if filename.endswith(".pdf"):
+        logger.info("Detected PDF file")
+        reader = PdfReader(io.BytesIO(content))
+        for number, page in enumerate(reader.pages, start=1):
+            yield number, clean_text(page.extract_text() or "")
+        return
+
+    #Unsupported file format
+    logger.warning("Unsupported file type")
+
+
+def clean_text(text):
+    return text.replace("\r", "").strip()
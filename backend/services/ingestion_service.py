@@ -1,14 +1,21 @@
-import io
+import asyncio
 import logging
-from docx import Document as DocxDocument
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from PyPDF2 import PdfReader
+import os
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from tqdm import tqdm
 
 from db.db_models import Document, DocumentChunk, Session
+from db.vector_base import document_partition
 from db.vectordb import vectordb
+from services.chunker import token_chunker
+from services.document_library import document_library
+from services.extraction import iter_pages
 from services.llm_service import llm_service
+from services.title_service import provisional_title, session_title
+from utils.metrics import metrics
+
+#Chunks written to SQLite and embedded per batch while the document is still being chunked
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
 
 logger = logging.getLogger(__name__)
 
@@ -20,117 +27,114 @@ class IngestionService:
 
         logger.info(f"Starting ingestion for file: {file.filename}")
 
-        #1. Extract raw text
-        raw_text = await self._extract_text(file)
-        logger.info(f"Extracted {len(raw_text)} characters from uploaded file")
+        #1. Reading the upload and identifying it by content
+        content = await file.read()
+        content_hash = document_library.content_hash(content)
+
+        #2. Referencing the library document with this content, ingesting it first if it's new
+        preview_text = ""
+        async with document_library.lock(content_hash):
+            while True:
+                try:
+                    doc = await document_library.find(content_hash, db)
+                    if doc is None:
+                        doc_id, preview_text = await self._ingest_document(content, file, content_hash, session_id, db)
+                    else:
+                        doc_id = doc.id
+                        metrics.incr("library_dedup_hits")
+                        logger.info(f"Document already in library as {doc_id}, skipping chunking and embedding")
+
+                    if await document_library.add_reference(session_id, doc_id, file.filename, db):
+                        await db.commit()
+                        break
+                    #Tombstoned between lookup and reference (its last session was just purged)
+                    await db.rollback()
+                except IntegrityError:
+                    #Same content ingested concurrently by another process, using theirs
+                    await db.rollback()
+
+        logger.info(f"[{session_id}] Session references library document: {doc_id}")
+
+        #Naming the session/chat right away with a provisional title; the LLM title follows in the background
+        preview_text = preview_text or await document_library.first_chunk_text(doc_id, db)
+        session_row = await db.get(Session, session_id)
+        session_row.session_name = provisional_title(file.filename, preview_text)
+        session_row.title_pending = True
+        await db.commit()
+        session_title.enqueue(session_id)
+        logger.info(f"[{session_id}] Provisional session name: {session_row.session_name}")
+
+        logger.info(f"Finished ingestion for document: {doc_id}")
+
+        return doc_id
 
-        #2. Clean text
-        cleaned = self._clean_text(raw_text)
-        logger.info(f"Cleaned text length: {len(cleaned)}")
 
-        #3. Chunk text
-        chunks = self._chunk_text(cleaned)
-        logger.info(f"Generated {len(chunks)} chunks")
+    #Chunking and embedding a new library document (caller commits), returns (id, first chunk text)
+    async def _ingest_document(self, content: bytes, file, content_hash: str, session_id: str, db: AsyncSession):
+        pages = iter_pages(content, file.filename)
 
-        #4. Adding Document to SQLite DB
+        #Adding Document to SQLite DB
         doc = Document(filename=file.filename, 
                        content_type=file.content_type,
+                       content_hash=content_hash,
                        session_id = session_id)
         db.add(doc)
         await db.flush() #added to fetch auto-incremented ID in next step
         doc_id = doc.id
+        partition = document_partition(doc_id)
         logger.info(f"Added document to Document table: {doc_id}")
 
-        
-        #5. Save chunks + embeddings into ChromaDB
-        logger.info(f"Adding all DocumentChunk objects (text) to SQLite DB")
-        logger.info(f"Creating chunk embeddings and adding them to ChromaDB")
-        for idx, chunk_text in enumerate(tqdm(chunks, desc="Embedding chunks", unit="chunk")):
-            
-            #Adding DocumentChunk (text) to SQLite DB
-            chunk = DocumentChunk(document_id=doc_id, session_id=session_id, 
-                                  chunk_index=idx, text=chunk_text)
-            db.add(chunk)
-            await db.flush() #added to fetch auto-incremented ID in next step
-            chunk_id = chunk.id
-
-            emb = await llm_service.embed(chunk_text)
-
-            metadata = {"session_id": session_id,
-                        "doc_id": doc_id,
-                        "chunk_id": chunk_id,
-                        "chunk_index": idx,
-                        "text": chunk_text}
-
-            vector_id = f"{session_id}_{doc_id}_{chunk_id}"
-
-            vectordb.add_vector(embedding=emb, collection_name='chunks', metadata=metadata, vector_id=vector_id)
-
-        logger.info(f"Completed ChromaDB ingestion: {len(chunks)} vectors added")
-
-        #Generate a name for the session/chat
-        try:
-            preview_text = chunks[0][:500]
-            session_name = await llm_service.generate_session_title(preview_text)
-            # Update session row with name
-            session_row = await db.get(Session, session_id)
-            session_row.session_name = session_name
-            await db.commit()
-            logger.info(f"[{session_id}] Generated session name: {session_name}")
-        except Exception as e:
-            logger.error(f"Failed to generate session name: {e}")
-
-        await db.commit()
-        logger.info(f"Inserted {len(chunks)} chunks into 'document_chunks' table for document: {doc_id}")
-        logger.info(f"Finished ingestion for document: {doc_id}")
-
-        return doc_id
-
-
-    async def _extract_text(self, file):
-        """
-        Extract text from .pdf, .txt, .docx, .md files.
-        """
-
-        content = await file.read()
-        filename = file.filename.lower()
-
-        #Txt and Markdown  file formats
-        if filename.endswith(".txt") or filename.endswith(".md"):
-            logger.info("Detected TXT/MD file")
-            return content.decode("utf-8", errors="ignore")
-
-        #DOCX file format
-        if filename.endswith(".docx"):
-            logger.info("Detected DOCX file")
-            doc = DocxDocument(io.BytesIO(content))
-            return "\n".join(par.text for par in doc.paragraphs)
-
-        #PDF file format
-        if filename.endswith(".pdf"):
-            logger.info("Detected PDF file")
-            reader = PdfReader(io.BytesIO(content))
-            extracted = []
-            for page in reader.pages:
-                text = page.extract_text() or ""
-                extracted.append(text)
-            return "\n".join(extracted)
-
-        #Unsupported file format
-        logger.warning("Unsupported file type")
-        return ""
-
-
-
-    def _clean_text(self, text):
-        return text.replace("\r", "").strip()
-
-
-    def _chunk_text(self, text):
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1000,
-                                                  chunk_overlap=150,
-                                                  length_function=len)
-        return splitter.split_text(text)
+        #Vectors left behind by an interrupted ingestion that got the same (uncommitted) id
+        await asyncio.to_thread(vectordb.delete_session_embeddings, "chunks", partition)
+
+        #Chunking (token-aware, streaming) and saving chunks + embeddings batch by batch
+        logger.info(f"Chunking, adding DocumentChunk objects to SQLite DB and chunk embeddings to the vector store")
+        batches = token_chunker.iter_batches(pages, INGEST_BATCH_SIZE)
+        chunk_count, preview_text = 0, ""
+        while True:
+            #Extraction and tokenization run off the event loop
+            batch = await asyncio.to_thread(next, batches, None)
+            if batch is None:
+                break
+
+            await self._store_chunks(batch, doc_id, partition, chunk_count, db)
+            chunk_count += len(batch)
+            preview_text = preview_text or batch[0]["text"]
+            logger.info(f"Stored and embedded {chunk_count} chunks so far for document: {doc_id}")
+
+        metrics.incr("library_documents_ingested")
+        logger.info(f"Completed vector store ingestion: {chunk_count} vectors added for document: {doc_id}")
+        return doc_id, preview_text
+
+
+    #Adding a batch of DocumentChunk rows to SQLite, then embedding them in one call
+    async def _store_chunks(self, batch: list, doc_id: int, partition: str, first_index: int, db: AsyncSession):
+        rows = self._chunk_rows(batch, doc_id, first_index)
+        db.add_all(rows)
+        await db.flush() #added to fetch auto-incremented IDs in next step
+
+        embeddings = await llm_service.embed_batch([chunk["text"] for chunk in batch])
+        metadatas, vector_ids = self._vector_entries(rows, doc_id, partition)
+        await asyncio.to_thread(vectordb.add_vectors, collection_name='chunks', embeddings=embeddings,
+                                metadatas=metadatas, vector_ids=vector_ids)
+
+
+    def _chunk_rows(self, batch: list, doc_id: int, first_index: int) -> list:
+        return [DocumentChunk(document_id=doc_id, chunk_index=first_index + i,
+                              text=chunk["text"], page=chunk["page"], char_start=chunk["char_start"],
+                              char_end=chunk["char_end"], token_count=chunk["token_count"])
+                for i, chunk in enumerate(batch)]
+
+
+    #Vector metadata and ids of flushed chunk rows
+    def _vector_entries(self, rows: list, doc_id: int, partition: str):
+        #Text is served from SQLite by chunk_id, not duplicated into the vector store
+        metadatas = [{"session_id": partition,
+                      "doc_id": doc_id,
+                      "chunk_id": row.id,
+                      "chunk_index": row.chunk_index} for row in rows]
+        vector_ids = [f"{partition}_{row.id}" for row in rows]
+        return metadatas, vector_ids
 
 
 ingestion_service = IngestionService()
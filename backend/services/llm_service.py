@@ -1,21 +1,47 @@
+import asyncio
 import httpx
 import json
-from sentence_transformers import SentenceTransformer
 
+from services.retrieval_client import retrieval_client
 from utils.prompt_utils import load_prompt
 
 
 
 class LLMService:
 
+    EMBEDDING_MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
+
     def __init__(self):
-        self.embedding_model = SentenceTransformer("sentence-transformers/all-mpnet-base-v2")
+        self._embedding_model = None
         self.llm_model = 'llama3.1:8b'
         self.http_client = httpx.AsyncClient(timeout=120.0)
+
+
+    #Loaded on first use, so processes that embed through the retrieval worker never load it
+    @property
+    def embedding_model(self):
+        if self._embedding_model is None:
+            from sentence_transformers import SentenceTransformer
+            self._embedding_model = SentenceTransformer(self.EMBEDDING_MODEL_NAME)
+        return self._embedding_model
+
     
     async def embed(self, text: str):
+        if retrieval_client is not None:
+            vectors = await asyncio.to_thread(retrieval_client.embed, [text])
+            return vectors[0]
+
         vector = self.embedding_model.encode(text, show_progress_bar=False)
         return vector.astype("float32")
+
+
+    #Embed many texts in one model call (or one worker round-trip)
+    async def embed_batch(self, texts: list, batch_size: int = 64):
+        if retrieval_client is not None:
+            return await asyncio.to_thread(retrieval_client.embed, texts)
+
+        vectors = self.embedding_model.encode(texts, batch_size=batch_size, show_progress_bar=False)
+        return vectors.astype("float32")
     
 
     async def generate_session_title(self, text: str) -> str:
@@ -1,96 +1,220 @@
+import asyncio
 import json
 import logging
+import os
+import time
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete
 
-from db.db_models import SessionLongTermMemory, SessionShortTermMemory, SessionChatHistory
+from db.db_models import SessionLongTermMemory, SessionShortTermMemory
 from db.redis_client import redis_client
 from services.llm_service import llm_service
+from services.persistence_service import chat_persistence
 from utils.prompt_utils import load_prompt
 from utils.tokenizer import estimate_tokens
 from db.vectordb import vectordb
+from utils.metrics import metrics
 
 
 SHORT_TERM_LIMIT = 2000
+
+#Idle TTL of a session's STM in Redis (refreshed on every access, 0 disables expiry)
+STM_IDLE_TTL_SECONDS = int(os.getenv("STM_IDLE_TTL_SECONDS", "3600"))
+#Overall cap on STM bytes held in Redis; least recently used sessions are evicted above it
+STM_MAX_BYTES = int(os.getenv("STM_MAX_BYTES", str(64 * 1024 * 1024)))
+
 logger = logging.getLogger(__name__)
 
 
 class MemoryService:
 
     SHORT_KEY_TEMPLATE = "session:{session_id}:short_memory"
+    ACCESS_KEY = "stm:last_access"  #sorted set: session id -> last access timestamp
+    SIZE_KEY = "stm:sizes"          #hash: session id -> approx STM bytes
+    TOTAL_KEY = "stm:total_bytes"   #running total of all STM bytes
+
+    #Refresh idle TTL and LRU position of a session's STM (queued on a pipeline)
+    def _touch(self, pipe, session_id: str):
+        key = self.SHORT_KEY_TEMPLATE.format(session_id=session_id)
+        if STM_IDLE_TTL_SECONDS > 0:
+            pipe.expire(key, STM_IDLE_TTL_SECONDS)
+        pipe.zadd(self.ACCESS_KEY, {session_id: time.time()})
+
 
     #Add message to Redis
     def add_short_term_to_redis(self, session_id: str, role: str, content: str):
         
         key = self.SHORT_KEY_TEMPLATE.format(session_id=session_id)
-        msg = {"role": role, "content": content}
-        redis_client.rpush(key, json.dumps(msg))
+        payload = json.dumps({"role": role, "content": content})
 
+        pipe = redis_client.pipeline()
+        pipe.rpush(key, payload)
+        pipe.hincrby(self.SIZE_KEY, session_id, len(payload))
+        pipe.incrby(self.TOTAL_KEY, len(payload))
+        self._touch(pipe, session_id)
+        pipe.execute()
 
-    #Add message to Redis and SQLite
+        self._enforce_memory_cap(keep=session_id)
+
+
+    #Add message to Redis, and queue it for batched write-behind to SQLite (STM + SessionChatHistory)
     async def add_short_term(self, session_id: str, role: str, content: str, db: AsyncSession):
 
         self.add_short_term_to_redis(session_id, role, content)
         logger.info(f"[{session_id}] Added short-term memory message ({role}) to redis")
 
-        db.add(SessionShortTermMemory(session_id=session_id, role=role, content=content))
-        logger.info(f"[{session_id}] Added short-term memory message ({role}) to STM")
-
-        db.add(SessionChatHistory(session_id=session_id, role=role, content=content))
-        logger.info(f"[{session_id}] Added short-term memory message ({role}) to SessionChatHistory")
-        await db.commit()
+        chat_persistence.enqueue(session_id, role, content)
+        logger.info(f"[{session_id}] Queued short-term memory message ({role}) for SQLite persistence")
 
 
-    #Load short term memory from SQLite to Redis (useful when user switches session, restarts app)
+    #Load short term memory from SQLite to Redis (useful when user switches session, restarts app or STM was evicted)
     async def restore_short_term(self, session_id: str, db: AsyncSession):
         key = self.SHORT_KEY_TEMPLATE.format(session_id=session_id)
 
         logger.info(f"Restoring short-term memory into Redis for session id: {session_id}")
 
-        #Clearing Redis first
-        redis_client.delete(key)
+        with metrics.timer("stm_rehydrate"):
+            #Making sure queued messages of this session have reached SQLite
+            if chat_persistence.has_pending(session_id):
+                await chat_persistence.flush()
 
-        #Fetching ShortTermMemory rows from SQLite
-        result = await db.execute(select(SessionShortTermMemory).where(SessionShortTermMemory.session_id == session_id))
-        rows = result.scalars().all()
+            #Clearing Redis first
+            self.clear_redis_short_term(session_id)
 
-        for row in rows:
-            redis_client.rpush(key, json.dumps({"role": row.role, "content": row.content}))
+            #Fetching ShortTermMemory rows from SQLite
+            result = await db.execute(select(SessionShortTermMemory).where(SessionShortTermMemory.session_id == session_id))
+            rows = result.scalars().all()
+            if not rows:
+                return
+
+            payloads = [json.dumps({"role": row.role, "content": row.content}) for row in rows]
+            size = sum(len(p) for p in payloads)
+
+            pipe = redis_client.pipeline()
+            pipe.rpush(key, *payloads)
+            pipe.hset(self.SIZE_KEY, session_id, size)
+            pipe.incrby(self.TOTAL_KEY, size)
+            self._touch(pipe, session_id)
+            pipe.execute()
+
+        self._enforce_memory_cap(keep=session_id)
         logger.info(f"Restored {len(rows)} messages into Redis for session id: {session_id}")
 
 
+    #Make sure a session's STM is in Redis ahead of its next message (session warm-up)
+    async def warm_short_term(self, session_id: str, db: AsyncSession) -> bool:
+        key = self.SHORT_KEY_TEMPLATE.format(session_id=session_id)
+        if redis_client.exists(key):
+            pipe = redis_client.pipeline()
+            self._touch(pipe, session_id)
+            pipe.execute()
+            return False
+
+        await self.restore_short_term(session_id, db)
+        return True
+
+
     #Retrieve short term memory from Redis
     async def get_short_term(self, session_id: str, db: AsyncSession):
         key = self.SHORT_KEY_TEMPLATE.format(session_id=session_id)
         items = redis_client.lrange(key, 0, -1)
 
-        #If Redis is empty (eg- after restart, session switch), restore from SQLite
+        #If Redis is empty (eg- after restart, session switch, idle expiry or eviction), restore from SQLite
         if not items:
+            metrics.incr("stm_cache_miss")
             logger.info(f"Session id: [{session_id}] Redis is empty, restoring from SQLite")
             await self.restore_short_term(session_id, db)
             items = redis_client.lrange(key, 0, -1)
+        else:
+            metrics.incr("stm_cache_hit")
+            pipe = redis_client.pipeline()
+            self._touch(pipe, session_id)
+            pipe.execute()
 
         #Parse JSON entries
         msgs = [json.loads(x) for x in items]
         return msgs
 
 
+    #Drop STM of least recently used sessions until Redis usage is under STM_MAX_BYTES
+    def _enforce_memory_cap(self, keep: str):
+
+        #Forgetting bookkeeping of sessions whose keys already expired through the idle TTL
+        if STM_IDLE_TTL_SECONDS > 0:
+            expired = redis_client.zrangebyscore(self.ACCESS_KEY, "-inf", time.time() - STM_IDLE_TTL_SECONDS)
+            if expired:
+                self._forget(expired)
+
+        total = int(redis_client.get(self.TOTAL_KEY) or 0)
+        metrics.set_gauge("stm_redis_bytes", total)
+
+        while total > STM_MAX_BYTES:
+            oldest = [sid for sid in redis_client.zrange(self.ACCESS_KEY, 0, 9) if sid != keep]
+            if not oldest:
+                break
+
+            #Evicting just enough of the oldest sessions to get back under the cap
+            candidates, freed = [], 0
+            for sid, size in zip(oldest, redis_client.hmget(self.SIZE_KEY, oldest)):
+                candidates.append(sid)
+                freed += int(size or 0)
+                if total - freed <= STM_MAX_BYTES:
+                    break
+
+            self._forget(candidates)
+            metrics.incr("stm_evicted_sessions", len(candidates))
+            logger.info(f"Evicted short-term memory of {len(candidates)} idle sessions from Redis")
+            total = int(redis_client.get(self.TOTAL_KEY) or 0)
+
+        metrics.set_gauge("stm_redis_bytes", total)
+
+
+    #Remove STM keys and bookkeeping for the given sessions
+    def _forget(self, session_ids: list):
+        sizes = redis_client.hmget(self.SIZE_KEY, session_ids)
+        freed = sum(int(s) for s in sizes if s)
+
+        pipe = redis_client.pipeline()
+        pipe.delete(*[self.SHORT_KEY_TEMPLATE.format(session_id=sid) for sid in session_ids])
+        pipe.zrem(self.ACCESS_KEY, *session_ids)
+        pipe.hdel(self.SIZE_KEY, *session_ids)
+        pipe.decrby(self.TOTAL_KEY, freed)
+        pipe.execute()
+
+        #Guarding the running total against drift (eg- keys removed outside this service)
+        if int(redis_client.get(self.TOTAL_KEY) or 0) < 0:
+            redis_client.set(self.TOTAL_KEY, 0)
+
+
     #Keep last n messages in redis
     def keep_last_n_short_term(self, session_id: str, n: int = 4):
         key = self.SHORT_KEY_TEMPLATE.format(session_id=session_id)
-        redis_client.ltrim(key, -n, -1)
+        pipe = redis_client.pipeline()
+        pipe.ltrim(key, -n, -1)
+        pipe.lrange(key, 0, -1)
+        _, items = pipe.execute()
+
+        #Re-syncing size bookkeeping with what's left in Redis
+        size = sum(len(x) for x in items)
+        old_size = int(redis_client.hget(self.SIZE_KEY, session_id) or 0)
+        pipe = redis_client.pipeline()
+        pipe.hset(self.SIZE_KEY, session_id, size)
+        pipe.incrby(self.TOTAL_KEY, size - old_size)
+        pipe.execute()
 
 
     #Clear Redis memory for session (when switching sessions or deleting session)
     def clear_redis_short_term(self, session_id: str):
-        key = self.SHORT_KEY_TEMPLATE.format(session_id=session_id)
-        redis_client.delete(key)
+        self._forget([session_id])
         logger.info(f"Cleared Redis short-term memory for session id:{session_id}")
 
 
     #Delete rows from SessionShortTermMemory after they've been summarized and stored in SessionLongTermMemory
     async def trim_short_term_sqlite(self, session_id: str, db: AsyncSession, n: int = 3):
-        
+
+        #Queued messages must be in SQLite before deciding which rows to keep
+        if chat_persistence.has_pending(session_id):
+            await chat_persistence.flush()
         result = await db.execute(select(SessionShortTermMemory.id)
                                   .where(SessionShortTermMemory.session_id == session_id)
                                   .order_by(SessionShortTermMemory.id.desc()).limit(n))
@@ -106,16 +230,15 @@ class MemoryService:
         await db.commit()
 
 
-    #Freeing SessionLongTermMemory and SessionShortTermMemory when deleting a session
-    async def delete_all_session_memory(self, session_id: str, db: AsyncSession):
-        logger.info(f"Deleting all SessionLongTermMemory and SessionShortTermMemory for session id:{session_id}")
+    #Freeing SessionLongTermMemory and SessionShortTermMemory when deleting sessions (caller commits)
+    async def delete_all_session_memory(self, session_ids: list, db: AsyncSession):
+        logger.info(f"Deleting all SessionLongTermMemory and SessionShortTermMemory for {len(session_ids)} sessions")
 
-        #Delete session from SessionShortTermMemory in SQLite
-        await db.execute(delete(SessionShortTermMemory).where(SessionShortTermMemory.session_id == session_id))
+        #Delete sessions from SessionShortTermMemory in SQLite
+        await db.execute(delete(SessionShortTermMemory).where(SessionShortTermMemory.session_id.in_(session_ids)))
 
-        #Delete session from SessionLongTermMemory in SQLite
-        await db.execute(delete(SessionLongTermMemory).where(SessionLongTermMemory.session_id == session_id))
-        await db.commit()
+        #Delete sessions from SessionLongTermMemory in SQLite
+        await db.execute(delete(SessionLongTermMemory).where(SessionLongTermMemory.session_id.in_(session_ids)))
 
 
     #Add SessionLongTermMemory object to SQLite DB
@@ -127,9 +250,9 @@ class MemoryService:
 
         #Creating embedding for LTM summary
         emb = await llm_service.embed(summary)
-        #Adding to LTM ChromaDB collection
-        vectordb.add_vector(collection_name="ltm", embedding=emb, 
-                            metadata={"session_id": session_id, "summary": summary}, vector_id=None)
+        #Adding to LTM ChromaDB collection (only the row id, the summary itself stays in SQLite)
+        await asyncio.to_thread(vectordb.add_vector, collection_name="ltm", embedding=emb,
+                                metadata={"session_id": session_id, "ltm_id": mem.id}, vector_id=None)
 
 
     async def get_long_term(self, session_id: str, db: AsyncSession):
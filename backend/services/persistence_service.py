@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from sqlalchemy import update, bindparam
+
+from db.database import AsyncSessionLocal
+from db.db_models import Session, SessionShortTermMemory, SessionChatHistory
+from utils.metrics import metrics
+
+
+#Flush as soon as this many messages are pending
+PERSIST_MAX_BATCH = int(os.getenv("PERSIST_MAX_BATCH", "200"))
+#Flush at least this often while messages are pending
+PERSIST_FLUSH_INTERVAL_SECONDS = float(os.getenv("PERSIST_FLUSH_INTERVAL_SECONDS", "0.5"))
+
+logger = logging.getLogger(__name__)
+
+
+class ChatPersistenceService:
+    """
+    Write-behind persistence of chat messages to SQLite.
+
+    Redis holds the hot STM, so messages are only queued here and a background
+    flusher writes the STM and chat history rows of many sessions in a single
+    transaction, on a size/time policy.
+    """
+
+    def __init__(self, max_batch: int = PERSIST_MAX_BATCH, flush_interval: float = PERSIST_FLUSH_INTERVAL_SECONDS):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._pending = []  #(session_id, role, content, created_at, enqueued_at)
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._stopping = False
+
+
+    #Queue a message for persistence (does not touch SQLite)
+    def enqueue(self, session_id: str, role: str, content: str):
+        self._pending.append((session_id, role, content, datetime.now(timezone.utc), time.monotonic()))
+        metrics.set_gauge("persist_pending", len(self._pending))
+
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+
+
+    #Drop queued messages of a session (eg- session is being deleted)
+    def discard(self, session_id: str):
+        self._pending = [p for p in self._pending if p[0] != session_id]
+        metrics.set_gauge("persist_pending", len(self._pending))
+
+
+    def has_pending(self, session_id: str = None) -> bool:
+        if session_id is None:
+            return bool(self._pending)
+        return any(p[0] == session_id for p in self._pending)
+
+
+    #Write all queued messages in one transaction
+    async def flush(self):
+        async with self._lock:
+            if not self._pending:
+                return
+
+            batch, self._pending = self._pending, []
+            try:
+                with metrics.timer("persist_flush"):
+                    async with AsyncSessionLocal() as db:
+                        last_activity = {}
+                        for session_id, role, content, created_at, _ in batch:
+                            db.add(SessionShortTermMemory(session_id=session_id, role=role,
+                                                          content=content, timestamp=created_at))
+                            db.add(SessionChatHistory(session_id=session_id, role=role,
+                                                      content=content, created_at=created_at))
+                            last_activity[session_id] = created_at
+
+                        #Bumping Session.updated_at once per session in the batch
+                        sessions = Session.__table__
+                        await db.execute(update(sessions).where(sessions.c.id == bindparam("sid"))
+                                                         .values(updated_at=bindparam("ts")),
+                                         [{"sid": sid, "ts": ts} for sid, ts in last_activity.items()])
+                        await db.commit()
+            except Exception as e:
+                #Putting the batch back in front so nothing is lost and ordering is preserved
+                self._pending = batch + self._pending
+                metrics.incr("persist_flush_errors")
+                logger.error(f"Failed to flush {len(batch)} chat messages to SQLite: {e}")
+                raise
+            finally:
+                metrics.set_gauge("persist_pending", len(self._pending))
+
+            lag = time.monotonic() - batch[0][4]
+            metrics.observe("persist_flush_lag", lag * 1000)
+            metrics.incr("persist_flushed_messages", len(batch))
+            logger.info(f"Flushed {len(batch)} chat messages to SQLite (lag={lag:.3f}s)")
+
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.flush()
+            except Exception:
+                #Already logged, retry on next tick
+                await asyncio.sleep(self.flush_interval)
+
+
+    def start(self):
+        if self._task is None:
+            logger.info("Starting chat persistence flusher")
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+
+    #Stop the flusher and durably write whatever is still queued
+    async def stop(self):
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+        await self.flush()
+        logger.info("Chat persistence flusher stopped")
+
+
+chat_persistence = ChatPersistenceService()
@@ -0,0 +1,53 @@
+import asyncio
+import logging
+import os
+from typing import List
+
+import numpy as np
+
+
+#Small cross-encoder scoring (query, chunk) pairs; fast enough on CPU for a few dozen candidates
+RERANK_MODEL_NAME = os.getenv("RERANK_MODEL_NAME", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "1") not in ("0", "false", "False")
+RERANK_BATCH_SIZE = 32
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkReranker:
+    """
+    Cross-encoder relevance scores for retrieved chunks. Unlike the bi-encoder's
+    cosine distance, the query and chunk are read together, so scores are comparable
+    across queries and can be cut off at a fixed threshold (ms-marco models output a
+    logit, > 0 roughly meaning relevant).
+    """
+
+    def __init__(self, model_name: str = RERANK_MODEL_NAME, enabled: bool = RERANK_ENABLED):
+        self.model_name = model_name
+        self.enabled = enabled
+        self._model = None
+
+
+    #Loaded on first use, so disabling reranking never loads it
+    @property
+    def model(self):
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+            self._model = CrossEncoder(self.model_name)
+        return self._model
+
+
+    def _predict(self, query: str, texts: List[str]) -> np.ndarray:
+        scores = self.model.predict([(query, text) for text in texts], batch_size=RERANK_BATCH_SIZE,
+                                    show_progress_bar=False)
+        return np.asarray(scores, dtype="float32").reshape(len(texts))
+
+
+    #All candidates scored in one batched call, off the event loop
+    async def score(self, query: str, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros(0, dtype="float32")
+        return await asyncio.to_thread(self._predict, query, texts)
+
+
+chunk_reranker = ChunkReranker()
@@ -0,0 +1,75 @@
+import itertools
+import os
+import socket
+import threading
+
+import numpy as np
+
+from workers.protocol import HEADER, encode_frame, decode_payload
+
+
+#Unix socket of the shared embedding/retrieval worker; unset = embed and search in-process
+RETRIEVAL_WORKER_SOCKET = os.getenv("RETRIEVAL_WORKER_SOCKET")
+RETRIEVAL_WORKER_TIMEOUT_SECONDS = float(os.getenv("RETRIEVAL_WORKER_TIMEOUT_SECONDS", "60"))
+
+
+class RetrievalWorkerError(RuntimeError):
+    pass
+
+
+class RetrievalClient:
+    """
+    Blocking client of the retrieval worker (workers/retrieval_worker.py), with one
+    connection per thread. Async callers run it through asyncio.to_thread so concurrent
+    requests reach the worker together and get batched there.
+    """
+
+    def __init__(self, path: str = RETRIEVAL_WORKER_SOCKET, timeout: float = RETRIEVAL_WORKER_TIMEOUT_SECONDS):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._ids = itertools.count()
+
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        return sock
+
+
+    def _recv_exactly(self, sock, size: int) -> bytes:
+        buf = bytearray()
+        while len(buf) < size:
+            chunk = sock.recv(size - len(buf))
+            if not chunk:
+                raise ConnectionError("Retrieval worker closed the connection")
+            buf.extend(chunk)
+        return bytes(buf)
+
+
+    def call(self, op: str, **params):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = self._local.sock = self._connect()
+
+        try:
+            sock.sendall(encode_frame({"id": next(self._ids), "op": op, **params}))
+            (size,) = HEADER.unpack(self._recv_exactly(sock, HEADER.size))
+            response = decode_payload(self._recv_exactly(sock, size))
+        except (OSError, ConnectionError):
+            #Dropping the broken connection, the next call reconnects
+            self._local.sock = None
+            sock.close()
+            raise
+
+        if "error" in response:
+            raise RetrievalWorkerError(response["error"])
+        return response["result"]
+
+
+    def embed(self, texts: list) -> np.ndarray:
+        return np.asarray(self.call("embed", texts=list(texts)), dtype="float32")
+
+
+retrieval_client = RetrievalClient() if RETRIEVAL_WORKER_SOCKET else None
@@ -1,13 +1,14 @@
-import asyncio
+import base64
 import logging
 import uuid
-from sqlalchemy import select, delete
+from datetime import datetime
+from sqlalchemy import select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from db.database import AsyncSessionLocal
-from db.db_models import Document, DocumentChunk, Session, SessionChatHistory
-from db.vectordb import vectordb
+from db.db_models import Session, SessionChatHistory
+from services.deletion_service import session_deletion
 from services.memory_service import memory_service
+from services.persistence_service import chat_persistence
 
 
 
@@ -25,79 +26,78 @@ class SessionService:
 
         return session_id
 
-    async def list_sessions(self, db: AsyncSession):
-        logger.info("Fetching all sessions")
+    async def list_sessions(self, db: AsyncSession, limit: int = 50, cursor: str = None, search: str = None):
+        """
+        Return one page of sessions ordered by last activity (most recent first), as
+        (id, session_name, updated_at, title_pending) rows, plus the cursor of the next page.
+        """
+        logger.info("Fetching sessions page")
 
-        result = await db.execute(select(Session))
-        sessions = result.scalars().all()
-        return sessions
-    
-    async def get_chat_history(self, session_id: str, db: AsyncSession):
-        """Return ordered chat history for a session."""
-        result = await db.execute(select(SessionChatHistory)
-                                  .where(SessionChatHistory.session_id == session_id)
-                                  .order_by(SessionChatHistory.created_at.asc()))
-        rows = result.scalars().all()
-        return [{"role": r.role, "content": r.content, "timestamp": r.created_at.isoformat()} for r in rows]
+        query = (select(Session.id, Session.session_name, Session.updated_at, Session.title_pending)
+                 .where(Session.deleted_at.is_(None)))
+        if search:
+            query = query.where(Session.session_name.icontains(search, autoescape=True))
+        if cursor:
+            updated_at, session_id = self._decode_cursor(cursor)
+            query = query.where(tuple_(Session.updated_at, Session.id) < (updated_at, session_id))
 
+        #Fetching one extra row to know whether another page exists
+        result = await db.execute(query.order_by(Session.updated_at.desc(), Session.id.desc()).limit(limit + 1))
+        rows = result.all()
 
-    async def delete_session(self, session_id: str, db: AsyncSession):
-        
-        logger.info(f"User triggered session delete for session id:{session_id}")
+        next_cursor = self._encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        return rows[:limit], next_cursor
 
-        #Instant Redis memory deletion
-        memory_service.clear_redis_short_term(session_id)
 
-        #Performs remaining deletions as a background task
-        asyncio.create_task(self._background_cleanup(session_id))
+    #Opaque keyset cursor: last row's (updated_at, id)
+    def _encode_cursor(self, row) -> str:
+        raw = f"{row.updated_at.isoformat()}|{row.id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def _decode_cursor(self, cursor: str):
+        updated_at, session_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(updated_at), session_id
 
-    async def _background_cleanup(self, session_id: str):
+
+    async def get_chat_history(self, session_id: str, db: AsyncSession, limit: int = 200, before: int = None):
         """
-        Performs the following deletions in background
-        - SQLite SessionLongTermMemory and SessionShortTermMemory
-        - ChromaDB embeddings
-        - SQLite DocumentChunks
-        - SQLite Documents
-        - SQLite Session row
+        Return one page of ordered chat history for a session, newest page first.
+
+        Keyset pagination on the autoincrement id (insertion order): pass the returned
+        `next_cursor` as `before` to fetch the previous (older) page.
         """
-        logger.info(f"Background cleanup started for session id:{session_id}")
+        if chat_persistence.has_pending(session_id):
+            await chat_persistence.flush()
 
-        #Opening a new DB session to finish deleting as a background task
-        async with AsyncSessionLocal() as db:
-            try:
-                #Deleting SessionLongTermMemory and SessionShortTermMemory when deleting a session
-                await memory_service.delete_all_session_memory(session_id, db)
-                logger.info(f"Deleted all SessionLongTermMemory and SessionShortTermMemory for session id:{session_id}")
+        query = (select(SessionChatHistory.id, SessionChatHistory.role, SessionChatHistory.content, SessionChatHistory.created_at)
+                 .where(SessionChatHistory.session_id == session_id))
+        if before is not None:
+            query = query.where(SessionChatHistory.id < before)
 
-                #Deleting ChromaDB chunk collection embeddings
-                vectordb.delete_session_embeddings("chunks", session_id)
-                logger.info(f"[{session_id}] Deleted ChromaDB vectors from chunk collection")
+        #Fetching one extra row to know whether an older page exists
+        result = await db.execute(query.order_by(SessionChatHistory.id.desc()).limit(limit + 1))
+        rows = result.all()
 
-                #Deleting ChromaDB ltm collection embeddings
-                vectordb.delete_session_embeddings("ltm", session_id)
-                logger.info(f"[{session_id}] Deleted ChromaDB vectors from LTM collection")
+        has_more = len(rows) > limit
+        rows = list(reversed(rows[:limit]))
+        next_cursor = rows[0].id if has_more else None
 
-                #Deleting SessionChatHistory for this session
-                await db.execute(delete(SessionChatHistory).where(SessionChatHistory.session_id == session_id))
-                logger.info(f"Deleted SessionChatHistory rows for session id:{session_id}")
+        history = [{"id": r.id, "role": r.role, "content": r.content, "timestamp": r.created_at.isoformat()} for r in rows]
+        return history, next_cursor
 
-                #Deleting Document chunks
-                await db.execute(delete(DocumentChunk).where(DocumentChunk.session_id == session_id))
-                logger.info(f"Deleted all DocumentChunk rows for session id:{session_id}")
 
-                #Deleting Documents
-                await db.execute(delete(Document).where(Document.session_id == session_id))
-                logger.info(f"Deleted all Document rows for session id:{session_id}")
+    async def delete_session(self, session_id: str, db: AsyncSession):
+        
+        logger.info(f"User triggered session delete for session id:{session_id}")
 
-                #Deleting Session row
-                await db.execute(delete(Session).where(Session.id == session_id))
-                logger.info(f"Deleted all Session rows for session id:{session_id}")
+        #Instant Redis memory deletion
+        memory_service.clear_redis_short_term(session_id)
 
-                await db.commit()
-                logger.info(f"Background cleanup complete for session id:{session_id}")
+        #Dropping messages still waiting for write-behind so they don't resurrect the session
+        chat_persistence.discard(session_id)
 
-            except Exception as e:
-                logger.error(f"Cleanup failed for session id:{session_id}: {e}")
+        #Hiding the session and queueing the purge of its rows and vectors (durable, batched)
+        await session_deletion.enqueue(session_id, db)
 
 
 session_service = SessionService()
@@ -0,0 +1,319 @@
+import asyncio
+import logging
+import os
+import uuid
+import zipfile
+from datetime import datetime
+
+import numpy as np
+import orjson
+from sqlalchemy import select, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.db_models import (Document, DocumentChunk, Session, SessionChatHistory, SessionDocument,
+                          SessionLongTermMemory, SessionShortTermMemory)
+from db.vectordb import vectordb
+from services.document_library import document_library
+from services.llm_service import llm_service
+from services.persistence_service import chat_persistence
+from utils.metrics import metrics
+
+
+SNAPSHOT_FORMAT = "session-snapshot"
+SNAPSHOT_VERSION = 1
+#Largest snapshot accepted for import, both as uploaded and uncompressed
+SNAPSHOT_MAX_BYTES = int(float(os.getenv("SNAPSHOT_MAX_MB", "1024")) * 1024 * 1024)
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def _rows(result) -> list:
+    return [dict(row._mapping) for row in result.all()]
+
+
+def _datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+class SnapshotService:
+    """
+    Export and import of a whole session as one zip file: session row, referenced
+    documents with their chunks, STM, LTM and chat history as JSON, and the raw
+    vectors of both collections as contiguous float32 .npy arrays, so an import
+    bulk-loads everything without recomputing a single embedding.
+
+    Layout:
+        manifest.json                       format, version, embedding model and dim, session, documents
+        rows/{chunks,stm,ltm,history}.json  table rows
+        vectors/chunks/<document id>.npy    (n, dim) chunk vectors of one document
+        vectors/chunks/<document id>.json   chunk id of each row
+        vectors/ltm.npy, vectors/ltm.json   LTM vectors and their LTM ids
+    """
+
+    async def export_session(self, session_id: str, db: AsyncSession, out) -> int:
+        """
+        Write a snapshot of the session to the binary file object `out` and return the
+        number of vectors in it. Reading the vectors and deflating the zip run in a thread.
+        """
+        session_row = await db.get(Session, session_id)
+        if session_row is None or session_row.deleted_at is not None:
+            raise LookupError(f"Session {session_id} not found")
+
+        #Queued messages must be in SQLite before reading STM and history
+        if chat_persistence.has_pending(session_id):
+            await chat_persistence.flush()
+
+        with metrics.timer("snapshot_export"):
+            documents = _rows(await db.execute(
+                select(Document.id, Document.filename, Document.content_type, Document.content_hash,
+                       Document.session_id, Document.created_at, SessionDocument.filename.label("session_filename"))
+                .join(SessionDocument, SessionDocument.document_id == Document.id)
+                .where(SessionDocument.session_id == session_id)
+                .where(Document.deleted_at.is_(None))
+                .order_by(Document.id)))
+            document_ids = [doc["id"] for doc in documents]
+
+            rows = {}
+            rows["chunks"] = _rows(await db.execute(
+                select(DocumentChunk.id, DocumentChunk.document_id, DocumentChunk.chunk_index, DocumentChunk.text,
+                       DocumentChunk.page, DocumentChunk.char_start, DocumentChunk.char_end, DocumentChunk.token_count)
+                .where(DocumentChunk.document_id.in_(document_ids))
+                .order_by(DocumentChunk.id)))
+            rows["stm"] = _rows(await db.execute(
+                select(SessionShortTermMemory.role, SessionShortTermMemory.content, SessionShortTermMemory.timestamp)
+                .where(SessionShortTermMemory.session_id == session_id).order_by(SessionShortTermMemory.id)))
+            rows["ltm"] = _rows(await db.execute(
+                select(SessionLongTermMemory.id, SessionLongTermMemory.order_index, SessionLongTermMemory.summary)
+                .where(SessionLongTermMemory.session_id == session_id).order_by(SessionLongTermMemory.id)))
+            rows["history"] = _rows(await db.execute(
+                select(SessionChatHistory.role, SessionChatHistory.content, SessionChatHistory.created_at)
+                .where(SessionChatHistory.session_id == session_id).order_by(SessionChatHistory.id)))
+
+            manifest = {"format": SNAPSHOT_FORMAT,
+                        "version": SNAPSHOT_VERSION,
+                        "embedding_model": llm_service.EMBEDDING_MODEL_NAME,
+                        "dim": None, #set from the vectors written
+                        "session": {"id": session_row.id,
+                                    "session_name": session_row.session_name,
+                                    "created_at": session_row.created_at,
+                                    "updated_at": session_row.updated_at},
+                        "documents": documents}
+
+            vector_count = await asyncio.to_thread(self._write_zip, out, session_id, manifest, rows)
+
+        metrics.incr("snapshot_exports")
+        logger.info(f"[{session_id}] Exported snapshot: {len(documents)} documents, {len(rows['chunks'])} chunks, "
+                    f"{vector_count} vectors, {len(rows['history'])} messages")
+        return vector_count
+
+
+    #Blocking part of an export: vector store reads and deflating, run off the event loop
+    def _write_zip(self, out, session_id: str, manifest: dict, rows: dict) -> int:
+        with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for name, table in rows.items():
+                zf.writestr(f"rows/{name}.json", orjson.dumps(table))
+
+            shapes = []
+            for doc in manifest["documents"]:
+                partition = document_library.partition_of(doc["id"], doc["content_hash"], doc["session_id"])
+                doc_id = str(doc["id"])
+                shapes.append(self._write_vectors(zf, f"vectors/chunks/{doc['id']}", "chunks", partition,
+                                                  "chunk_id", lambda md: str(md.get("doc_id")) == doc_id))
+            shapes.append(self._write_vectors(zf, "vectors/ltm", "ltm", session_id, "ltm_id", lambda md: True))
+
+            #Written last, once the vectors' dimension is known
+            manifest["dim"] = next((dim for n, dim in shapes if n), None)
+            zf.writestr("manifest.json", orjson.dumps(manifest))
+        return sum(n for n, _ in shapes)
+
+
+    #Vectors of one partition as a contiguous .npy array plus the row ids they belong to
+    def _write_vectors(self, zf: zipfile.ZipFile, prefix: str, collection_name: str, partition: str,
+                       id_key: str, keep) -> tuple:
+        _, embeddings, metadatas = vectordb.get_partition(collection_name, partition)
+        rows = [i for i, md in enumerate(metadatas) if id_key in md and keep(md)]
+        if not rows:
+            return 0, None
+
+        with zf.open(f"{prefix}.npy", "w", force_zip64=True) as f:
+            np.lib.format.write_array(f, np.ascontiguousarray(embeddings[rows], dtype="float32"), allow_pickle=False)
+        zf.writestr(f"{prefix}.json", orjson.dumps([metadatas[i][id_key] for i in rows]))
+        return len(rows), embeddings.shape[1]
+
+
+    def _read_vectors(self, zf: zipfile.ZipFile, prefix: str):
+        if f"{prefix}.npy" not in zf.namelist():
+            return [], None
+        with zf.open(f"{prefix}.npy") as f:
+            embeddings = np.lib.format.read_array(f, allow_pickle=False)
+        return orjson.loads(zf.read(f"{prefix}.json")), embeddings
+
+
+    #Opening and validating a snapshot (blocking, run off the event loop)
+    def _open(self, source):
+        try:
+            zf = zipfile.ZipFile(source)
+        except zipfile.BadZipFile as e:
+            raise SnapshotError(f"Not a session snapshot: {e}")
+        try:
+            #Declared sizes bound what reading it can inflate to (zipfile checks them while reading)
+            if sum(info.file_size for info in zf.infolist()) > SNAPSHOT_MAX_BYTES:
+                raise SnapshotError(f"Snapshot larger than {SNAPSHOT_MAX_BYTES // (1024 * 1024)} MB uncompressed")
+            try:
+                manifest = orjson.loads(zf.read("manifest.json"))
+            except (KeyError, orjson.JSONDecodeError) as e:
+                raise SnapshotError(f"Not a session snapshot: {e}")
+            if manifest.get("format") != SNAPSHOT_FORMAT or manifest.get("version") != SNAPSHOT_VERSION:
+                raise SnapshotError(f"Unsupported snapshot format: {manifest.get('format')} v{manifest.get('version')}")
+            try:
+                rows = {name: orjson.loads(zf.read(f"rows/{name}.json")) for name in ("chunks", "stm", "ltm", "history")}
+            except (KeyError, orjson.JSONDecodeError) as e:
+                raise SnapshotError(f"Incomplete session snapshot: {e}")
+            self._check_vectors(zf, manifest)
+        except BaseException:
+            zf.close()
+            raise
+        return zf, manifest, rows
+
+
+    #Every vector array checked from its .npy header before anything is written
+    def _check_vectors(self, zf: zipfile.ZipFile, manifest: dict):
+        prefixes = [name[:-len(".npy")] for name in zf.namelist() if name.startswith("vectors/") and name.endswith(".npy")]
+        if not prefixes:
+            return
+        if manifest.get("embedding_model") != llm_service.EMBEDDING_MODEL_NAME:
+            raise SnapshotError(f"Snapshot vectors are from embedding model {manifest.get('embedding_model')}, "
+                                f"this server uses {llm_service.EMBEDDING_MODEL_NAME}")
+
+        read_header = {(1, 0): np.lib.format.read_array_header_1_0, (2, 0): np.lib.format.read_array_header_2_0}
+        for prefix in prefixes:
+            try:
+                with zf.open(f"{prefix}.npy") as f:
+                    version = np.lib.format.read_magic(f)
+                    if version not in read_header:
+                        raise ValueError(f"unsupported .npy version {version}")
+                    shape, fortran_order, dtype = read_header[version](f)
+                ids = orjson.loads(zf.read(f"{prefix}.json"))
+            except (KeyError, ValueError) as e:
+                raise SnapshotError(f"Invalid vectors {prefix}: {e}")
+            if dtype != np.float32 or len(shape) != 2 or shape[0] != len(ids) or shape[1] != manifest.get("dim"):
+                raise SnapshotError(f"Invalid vectors {prefix}: {dtype} {shape} for {len(ids)} ids, "
+                                    f"expected float32 (n, {manifest.get('dim')})")
+
+
+    async def import_session(self, source, db: AsyncSession, keep_id: bool = False) -> str:
+        """
+        Load a snapshot (path or seekable binary file object) as a new session, or under
+        its original id with keep_id, and return the session id. Documents already in the
+        library (same content hash) are referenced instead of loaded again.
+        """
+        zf, manifest, rows = await asyncio.to_thread(self._open, source)
+        try:
+            return await self._import(zf, manifest, rows, db, keep_id)
+        finally:
+            zf.close()
+
+
+    async def _import(self, zf: zipfile.ZipFile, manifest: dict, rows: dict, db: AsyncSession, keep_id: bool) -> str:
+        session = manifest["session"]
+        session_id = session["id"] if keep_id else str(uuid.uuid4())
+        if await db.get(Session, session_id) is not None:
+            raise SnapshotError(f"Session {session_id} already exists")
+
+        chunks_by_document = {}
+        for chunk in rows["chunks"]:
+            chunks_by_document.setdefault(str(chunk["document_id"]), []).append(chunk)
+
+        with metrics.timer("snapshot_import"):
+            db.add(Session(id=session_id, session_name=session["session_name"], title_pending=False,
+                           created_at=_datetime(session["created_at"]), updated_at=_datetime(session["updated_at"])))
+
+            #Documents: referenced when the library has them, loaded with their vectors otherwise
+            pending_vectors, loaded, reused = [], 0, 0
+            for doc in manifest["documents"]:
+                filename = doc["session_filename"] or doc["filename"]
+                existing = await document_library.find(doc["content_hash"], db) if doc["content_hash"] else None
+                #add_reference refuses a document tombstoned since find(), which is then loaded from the snapshot
+                if existing is not None and await document_library.add_reference(session_id, existing.id, filename, db):
+                    reused += 1
+                    continue
+
+                document_id = await self._load_document(zf, doc, chunks_by_document.get(str(doc["id"]), []),
+                                                        session_id, pending_vectors, db)
+                if not await document_library.add_reference(session_id, document_id, filename, db):
+                    raise RuntimeError(f"Document {document_id} loaded from the snapshot is not live")
+                loaded += 1
+
+            #Memories and history in bulk
+            if rows["stm"]:
+                await db.execute(insert(SessionShortTermMemory),
+                                 [{"session_id": session_id, "role": r["role"], "content": r["content"],
+                                   "timestamp": _datetime(r["timestamp"])} for r in rows["stm"]])
+            if rows["history"]:
+                await db.execute(insert(SessionChatHistory),
+                                 [{"session_id": session_id, "role": r["role"], "content": r["content"],
+                                   "created_at": _datetime(r["created_at"])} for r in rows["history"]])
+
+            ltm_rows = [SessionLongTermMemory(session_id=session_id, order_index=r["order_index"], summary=r["summary"])
+                        for r in rows["ltm"]]
+            db.add_all(ltm_rows)
+            await db.flush()
+            ltm_ids = {r["id"]: row.id for r, row in zip(rows["ltm"], ltm_rows)}
+
+            old_ids, embeddings = await asyncio.to_thread(self._read_vectors, zf, "vectors/ltm")
+            keep = [i for i, old in enumerate(old_ids) if old in ltm_ids]
+            if keep:
+                pending_vectors.append(("ltm", embeddings[keep],
+                                        [{"session_id": session_id, "ltm_id": ltm_ids[old_ids[i]]} for i in keep],
+                                        [None] * len(keep)))
+
+            #Vectors are written before the commit; an import that fails later leaves unreachable
+            #vectors in partitions nothing references, which are overwritten or purged with their ids
+            for collection_name, vectors, metadatas, vector_ids in pending_vectors:
+                await asyncio.to_thread(vectordb.add_vectors, collection_name, vectors, metadatas, vector_ids)
+            await db.commit()
+
+        metrics.incr("snapshot_imports")
+        logger.info(f"[{session_id}] Imported snapshot of session {session['id']}: {loaded} documents loaded, "
+                    f"{reused} already in library, {len(rows['history'])} messages")
+        return session_id
+
+
+    #New library document with its chunks; its vectors are queued on `pending_vectors` (caller commits)
+    async def _load_document(self, zf: zipfile.ZipFile, doc: dict, chunks: list, session_id: str,
+                             pending_vectors: list, db: AsyncSession) -> int:
+        document = Document(filename=doc["filename"], content_type=doc["content_type"],
+                            content_hash=doc["content_hash"], session_id=session_id,
+                            created_at=_datetime(doc["created_at"]))
+        db.add(document)
+        await db.flush()
+        partition = document_library.partition_of(document.id, document.content_hash, session_id)
+        if document.content_hash:
+            #Vectors left behind by an interrupted ingestion or import that got the same (uncommitted) id
+            await asyncio.to_thread(vectordb.delete_session_embeddings, "chunks", partition)
+
+        chunk_rows = [DocumentChunk(document_id=document.id, chunk_index=c["chunk_index"], text=c["text"],
+                                    page=c["page"], char_start=c["char_start"], char_end=c["char_end"],
+                                    token_count=c["token_count"],
+                                    session_id=None if document.content_hash else session_id)
+                      for c in chunks]
+        db.add_all(chunk_rows)
+        await db.flush()
+        chunk_ids = {c["id"]: row for c, row in zip(chunks, chunk_rows)}
+
+        old_ids, embeddings = await asyncio.to_thread(self._read_vectors, zf, f"vectors/chunks/{doc['id']}")
+        keep = [i for i, old in enumerate(old_ids) if old in chunk_ids]
+        if keep:
+            rows = [chunk_ids[old_ids[i]] for i in keep]
+            pending_vectors.append(("chunks", embeddings[keep],
+                                    [{"session_id": partition, "doc_id": document.id,
+                                      "chunk_id": row.id, "chunk_index": row.chunk_index} for row in rows],
+                                    [f"{partition}_{row.id}" for row in rows]))
+        return document.id
+
+
+snapshot_service = SnapshotService()
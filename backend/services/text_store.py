@@ -0,0 +1,93 @@
+import logging
+import os
+from collections import OrderedDict
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.db_models import DocumentChunk, SessionLongTermMemory
+from utils.metrics import metrics
+
+
+#Max chunk texts / LTM summaries kept in the in-process LRU
+TEXT_CACHE_SIZE = int(os.getenv("TEXT_CACHE_SIZE", "5000"))
+
+logger = logging.getLogger(__name__)
+
+
+class TextStore:
+    """
+    Resolves texts of vector hits from SQLite. Vectors only carry row ids, so the
+    top-k hits are fetched with one bulk lookup, with hot rows served from an LRU.
+
+    Chunks belong to library documents shared by sessions, so chunk texts are keyed
+    by chunk id alone and cached once however many sessions reference the document.
+    Their rows go only when the document is purged, which evicts them (forget_chunks)
+    before SQLite can reuse the rowids. LTM summaries are keyed with their session id:
+    they are deleted with their session, and a reused rowid belongs to another one.
+    """
+
+    def __init__(self, max_items: int = TEXT_CACHE_SIZE):
+        self.max_items = max_items
+        self._cache = OrderedDict()
+
+
+    #session_id only keeps the signature of the other resolvers, chunk texts are shared by sessions
+    async def get_chunk_texts(self, session_id: str, chunk_ids: list, db: AsyncSession) -> list:
+        return await self._resolve(("chunk",), DocumentChunk.id, DocumentChunk.text, chunk_ids, db)
+
+
+    async def get_ltm_summaries(self, session_id: str, ltm_ids: list, db: AsyncSession) -> list:
+        return await self._resolve(("ltm", session_id), SessionLongTermMemory.id, SessionLongTermMemory.summary, ltm_ids, db)
+
+
+    #Loading all LTM summaries of a session into the cache (session warm-up)
+    async def prefetch_ltm_summaries(self, session_id: str, db: AsyncSession) -> int:
+        result = await db.execute(select(SessionLongTermMemory.id, SessionLongTermMemory.summary)
+                                  .where(SessionLongTermMemory.session_id == session_id))
+        rows = result.all()
+        for row_id, summary in rows:
+            self._put(("ltm", session_id, row_id), summary)
+        return len(rows)
+
+
+    #Evicting chunks whose rows were purged (their rowids may be reused)
+    def forget_chunks(self, chunk_ids: list):
+        for row_id in chunk_ids:
+            self._cache.pop(("chunk", row_id), None)
+
+
+    def clear(self):
+        self._cache.clear()
+
+
+    #Texts aligned with `ids` ("" for rows that no longer exist); cache keys are `prefix` + (row id,)
+    async def _resolve(self, prefix: tuple, id_column, text_column, ids: list, db: AsyncSession) -> list:
+        found, missing = {}, []
+        for row_id in ids:
+            key = prefix + (row_id,)
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                found[row_id] = self._cache[key]
+            else:
+                missing.append(row_id)
+
+        metrics.incr("text_cache_hit", len(ids) - len(missing))
+        metrics.incr("text_cache_miss", len(missing))
+
+        if missing:
+            result = await db.execute(select(id_column, text_column).where(id_column.in_(missing)))
+            for row_id, text in result.all():
+                found[row_id] = text
+                self._put(prefix + (row_id,), text)
+
+        return [found.get(row_id, "") for row_id in ids]
+
+
+    def _put(self, key, text: str):
+        self._cache[key] = text
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_items:
+            self._cache.popitem(last=False)
+
+
+text_store = TextStore()
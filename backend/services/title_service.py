@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from pathlib import PurePath
+from sqlalchemy import select, update
+
+from db.database import AsyncSessionLocal
+from db.db_models import Session, SessionDocument
+from services.admission_service import chat_admission
+from services.document_library import document_library
+from services.llm_service import llm_service
+from utils.metrics import metrics
+
+
+#How long a queued title waits for chat traffic to go idle before it's generated anyway
+TITLE_MAX_DEFER_SECONDS = float(os.getenv("TITLE_MAX_DEFER_SECONDS", "120"))
+#How often the worker checks whether chat traffic went idle
+TITLE_IDLE_POLL_SECONDS = 1.0
+#Provisional titles longer than this are cut at a word boundary
+PROVISIONAL_TITLE_MAX_CHARS = 60
+
+_HEADING = re.compile(r"^\s{0,3}#{1,6}\s+(.+?)\s*#*\s*$")
+
+logger = logging.getLogger(__name__)
+
+
+def _shorten(title: str) -> str:
+    title = " ".join(title.split())
+    if len(title) <= PROVISIONAL_TITLE_MAX_CHARS:
+        return title
+    return title[:PROVISIONAL_TITLE_MAX_CHARS].rsplit(" ", 1)[0] + "..."
+
+
+def provisional_title(filename: str, first_text: str = "") -> str:
+    """
+    Instant, extractive session title: the document's first heading (a markdown
+    heading, or a short title-like first line), else the cleaned-up filename.
+    """
+    lines = [line.strip() for line in (first_text or "").splitlines() if line.strip()]
+
+    for line in lines[:20]:
+        match = _HEADING.match(line)
+        if match:
+            return _shorten(match.group(1))
+
+    if lines:
+        first = lines[0]
+        if len(first) <= PROVISIONAL_TITLE_MAX_CHARS and len(first.split()) <= 10 and first[-1] not in ".,;:":
+            return _shorten(first)
+
+    stem = re.sub(r"[_\-.]+", " ", PurePath(filename or "").stem).strip()
+    if not stem:
+        return "Untitled Document"
+    return _shorten(stem.title() if stem.islower() else stem)
+
+
+class SessionTitleService:
+    """
+    Generates LLM session titles in the background, off the upload path.
+
+    Uploads name the session with a provisional title and set Session.title_pending;
+    this worker replaces it with an LLM title once chat traffic is idle (or after
+    TITLE_MAX_DEFER_SECONDS), so titles never compete with users' answers for the model.
+    Pending titles are picked up again from SQLite after a restart.
+    """
+
+    def __init__(self):
+        self._queue = asyncio.Queue()
+        self._task = None
+        self._stopping = False
+
+
+    def enqueue(self, session_id: str):
+        self._queue.put_nowait((time.monotonic(), session_id))
+        metrics.set_gauge("title_backlog", self._queue.qsize())
+
+
+    #Sessions whose title is still provisional (eg- queued before a restart)
+    async def _requeue_pending(self):
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(Session.id)
+                                      .where(Session.title_pending.is_(True))
+                                      .where(Session.deleted_at.is_(None)))
+            session_ids = result.scalars().all()
+        for session_id in session_ids:
+            self.enqueue(session_id)
+        if session_ids:
+            logger.info(f"Re-queued {len(session_ids)} pending session titles")
+
+
+    #Low priority: waiting while users are being answered, up to the deferral limit
+    async def _wait_for_idle(self, queued_at: float):
+        while not chat_admission.idle():
+            if time.monotonic() - queued_at >= TITLE_MAX_DEFER_SECONDS:
+                metrics.incr("title_deferral_expired")
+                return
+            await asyncio.sleep(TITLE_IDLE_POLL_SECONDS)
+
+
+    async def generate(self, session_id: str):
+        async with AsyncSessionLocal() as db:
+            document_id = await db.scalar(select(SessionDocument.document_id)
+                                          .where(SessionDocument.session_id == session_id)
+                                          .order_by(SessionDocument.created_at)
+                                          .limit(1))
+            preview_text = (await document_library.first_chunk_text(document_id, db))[:500] if document_id else ""
+
+        with metrics.timer("title_generation"):
+            session_name = await llm_service.generate_session_title(preview_text) if preview_text else None
+
+        async with AsyncSessionLocal() as db:
+            values = {"title_pending": False}
+            if session_name:
+                values["session_name"] = session_name
+            #Not touching updated_at: a new title isn't user activity
+            await db.execute(update(Session)
+                             .where(Session.id == session_id)
+                             .where(Session.deleted_at.is_(None))
+                             .values(**values, updated_at=Session.updated_at))
+            await db.commit()
+        logger.info(f"[{session_id}] Generated session name: {session_name}")
+
+
+    async def _run(self):
+        try:
+            await self._requeue_pending()
+        except Exception as e:
+            logger.error(f"Failed to re-queue pending session titles: {e}")
+
+        while not self._stopping:
+            queued_at, session_id = await self._queue.get()
+            metrics.set_gauge("title_backlog", self._queue.qsize())
+
+            await self._wait_for_idle(queued_at)
+            try:
+                await self.generate(session_id)
+            except Exception as e:
+                #Title stays provisional (and pending, so the next start retries it)
+                metrics.incr("title_generation_failed")
+                logger.error(f"[{session_id}] Failed to generate session name: {e}")
+
+
+    def start(self):
+        if self._task is None:
+            logger.info("Starting session title worker")
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+
+    async def stop(self):
+        if self._task is not None:
+            self._stopping = True
+            #An in-flight LLM call is abandoned, its title stays pending for the next start
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        logger.info("Session title worker stopped")
+
+
+session_title = SessionTitleService()
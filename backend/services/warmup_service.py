@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import os
+import time
+
+from db.database import AsyncSessionLocal
+from db.vectordb import vectordb
+from services.chat_orchestrator import RETRIEVAL_MODE
+from services.document_library import document_library
+from services.llm_service import llm_service
+from services.memory_service import memory_service
+from services.reranker import chunk_reranker
+from services.retrieval_client import retrieval_client
+from services.text_store import text_store
+from utils.metrics import metrics
+from utils.prompt_utils import load_prompt
+
+
+#A session warmed up this recently is not warmed up again (eg- while paging through its history)
+WARMUP_MIN_INTERVAL_SECONDS = float(os.getenv("WARMUP_MIN_INTERVAL_SECONDS", "60"))
+#Prompt templates used when answering a message
+WARMUP_PROMPTS = ("rag_prompt.txt", "summarize_prompt.txt")
+
+logger = logging.getLogger(__name__)
+
+
+class SessionWarmup:
+    """
+    Preloads what the first message of a resumed session would otherwise load lazily:
+    STM into Redis, the session's vector partitions, its LTM summaries and the prompt
+    templates. Runs when a session is opened, so the first answer is as fast as later ones.
+    """
+
+    def __init__(self):
+        self._inflight = {}     #session id -> running warm-up task
+        self._warmed_at = {}    #session id -> monotonic time of last completed warm-up
+
+
+    #Start a warm-up in the background, unless one is running or ran recently
+    def schedule(self, session_id: str):
+        if session_id in self._inflight or self._recently_warmed(session_id):
+            return
+        self._start(session_id)
+
+
+    #Warm up a session and wait for it (joins a warm-up already running)
+    async def warm_up(self, session_id: str) -> dict:
+        task = self._inflight.get(session_id) or self._start(session_id)
+        return await asyncio.shield(task)
+
+
+    def _start(self, session_id: str) -> asyncio.Task:
+        task = asyncio.create_task(self._run(session_id))
+        self._inflight[session_id] = task
+
+        def _done(t: asyncio.Task):
+            self._inflight.pop(session_id, None)
+            if not t.cancelled():
+                t.exception() #already logged in _run, marking it retrieved
+
+        task.add_done_callback(_done)
+        return task
+
+
+    def _recently_warmed(self, session_id: str) -> bool:
+        warmed_at = self._warmed_at.get(session_id)
+        return warmed_at is not None and time.monotonic() - warmed_at < WARMUP_MIN_INTERVAL_SECONDS
+
+
+    async def _run(self, session_id: str) -> dict:
+        timings = {}
+        start = time.monotonic()
+
+        try:
+            #Prompt templates, the reranker and (without a retrieval worker) the embedding model
+            step = time.monotonic()
+            for name in WARMUP_PROMPTS:
+                load_prompt(name)
+            if retrieval_client is None:
+                await asyncio.to_thread(lambda: llm_service.embedding_model)
+            if RETRIEVAL_MODE == "adaptive" and chunk_reranker.enabled:
+                await asyncio.to_thread(lambda: chunk_reranker.model)
+            timings["models_ms"] = (time.monotonic() - step) * 1000
+
+            async with AsyncSessionLocal() as db:
+                #Vector partitions (LTM of the session, chunks of its documents), off the event loop
+                step = time.monotonic()
+                await asyncio.to_thread(vectordb.prefetch, "ltm", session_id)
+                for partition in await document_library.session_partitions(session_id, db):
+                    await asyncio.to_thread(vectordb.prefetch, "chunks", partition)
+                timings["vectors_ms"] = (time.monotonic() - step) * 1000
+
+                #STM into Redis with one pipelined push
+                step = time.monotonic()
+                restored = await memory_service.warm_short_term(session_id, db)
+                timings["stm_ms"] = (time.monotonic() - step) * 1000
+
+                #LTM summaries into the text cache
+                step = time.monotonic()
+                ltm_count = await text_store.prefetch_ltm_summaries(session_id, db)
+                timings["ltm_ms"] = (time.monotonic() - step) * 1000
+
+        except Exception as e:
+            metrics.incr("session_warmup_failed")
+            logger.error(f"[{session_id}] Session warm-up failed: {e}")
+            raise
+
+        total_ms = (time.monotonic() - start) * 1000
+        self._mark_warmed(session_id)
+        metrics.incr("session_warmup")
+        metrics.observe("session_warmup", total_ms)
+        logger.info(f"[{session_id}] Session warmed up in {total_ms:.1f} ms (STM restored: {restored}, LTM summaries: {ltm_count})")
+
+        return {"stm_restored": restored, "ltm_summaries": ltm_count,
+                "total_ms": round(total_ms, 2), **{k: round(v, 2) for k, v in timings.items()}}
+
+
+    def _mark_warmed(self, session_id: str):
+        now = time.monotonic()
+        self._warmed_at[session_id] = now
+
+        #Dropping stale entries so the map stays bounded by recently opened sessions
+        if len(self._warmed_at) > 1000:
+            self._warmed_at = {sid: t for sid, t in self._warmed_at.items()
+                               if now - t < WARMUP_MIN_INTERVAL_SECONDS}
+
+
+session_warmup = SessionWarmup()
@@ -0,0 +1,113 @@
+"""
+Session deletion queue against an in-memory SQLite database.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+
+@pytest.fixture
+def deletion(monkeypatch, tmp_path):
+    #The vector store is created on import, kept out of the working tree
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("VECTOR_BACKEND", "local")
+    from db.db_models import Base
+    from services import deletion_service
+
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    asyncio.run(_create_all(engine, Base))
+    monkeypatch.setattr(deletion_service, "AsyncSessionLocal",
+                        sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False))
+    monkeypatch.setattr(deletion_service.vectordb, "delete_session_embeddings", lambda collection, partition: None)
+    yield deletion_service
+    asyncio.run(engine.dispose())
+
+
+async def _create_all(engine, base):
+    async with engine.begin() as conn:
+        await conn.run_sync(base.metadata.create_all)
+
+
+def test_failed_batch_schedules_retries(deletion, monkeypatch):
+    from db.db_models import Session, SessionDeletionJob
+    service = deletion.SessionDeletionService()
+
+    async def no_memory(session_ids, db):
+        pass
+
+    #A real SQL error, so the batch transaction is rolled back
+    async def broken_write(session_ids, db):
+        await db.execute(text("DELETE FROM missing_table"))
+
+    monkeypatch.setattr(deletion.memory_service, "delete_all_session_memory", no_memory)
+    monkeypatch.setattr(deletion.document_library, "release_sessions", broken_write)
+
+    async def jobs():
+        async with deletion.AsyncSessionLocal() as db:
+            return {job.session_id: (job.attempts, job.last_error, job.next_attempt_at)
+                    for job in (await db.scalars(select(SessionDeletionJob))).all()}
+
+    async def run():
+        async with deletion.AsyncSessionLocal() as db:
+            for session_id in ("s1", "s2"):
+                db.add(Session(id=session_id, session_name=session_id))
+                await service.enqueue(session_id, db)
+        queued = await jobs()
+
+        assert await service.process_batch() == 2
+        first = await jobs()
+        #Not due again until the backoff has passed
+        assert await service.process_batch() == 0
+
+        async with deletion.AsyncSessionLocal() as db:
+            await db.execute(update(SessionDeletionJob)
+                             .values(next_attempt_at=datetime.now(timezone.utc) - timedelta(seconds=1)))
+            await db.commit()
+        assert await service.process_batch() == 2
+        return queued, first, await jobs()
+
+    queued, first, second = asyncio.run(run())
+
+    assert set(first) == set(second) == {"s1", "s2"}
+    for session_id in ("s1", "s2"):
+        attempts, last_error, next_attempt_at = first[session_id]
+        assert attempts == 1
+        assert "missing_table" in last_error
+        assert next_attempt_at > queued[session_id][2]
+        assert second[session_id][0] == 2
+
+
+def test_purged_documents_leave_text_cache(deletion):
+    from db.db_models import Document, DocumentChunk
+    from services.text_store import text_store
+    service = deletion.SessionDeletionService()
+
+    async def run():
+        async with deletion.AsyncSessionLocal() as db:
+            shared, purged = Document(filename="shared.txt"), Document(filename="purged.txt")
+            db.add_all([shared, purged])
+            await db.flush()
+            chunks = [DocumentChunk(document_id=shared.id, chunk_index=0, text="kept"),
+                      DocumentChunk(document_id=purged.id, chunk_index=0, text="gone")]
+            db.add_all(chunks)
+            await db.commit()
+            ids = [chunk.id for chunk in chunks]
+
+            #Cached once by chunk id, whichever session asks
+            assert await text_store.get_chunk_texts("s1", ids, db) == ["kept", "gone"]
+            assert ("chunk", ids[0]) in text_store._cache and ("chunk", ids[1]) in text_store._cache
+
+            purged.deleted_at = datetime.now(timezone.utc)
+            await db.commit()
+
+        assert await service.purge_documents() == 1
+        return ids
+
+    ids = asyncio.run(run())
+    assert ("chunk", ids[0]) in text_store._cache
+    assert ("chunk", ids[1]) not in text_store._cache
@@ -0,0 +1,200 @@
+"""
+Behaviour every VectorDB backend must share, run against each of them.
+
+Run from backend/:
+    python -m pytest tests
+"""
+import numpy as np
+import pytest
+
+
+DIM = 8
+
+
+@pytest.fixture(params=["chroma", "local", "local-int8"])
+def vectordb(request, tmp_path):
+    if request.param == "chroma":
+        pytest.importorskip("chromadb")
+        from db.chroma_vectordb import ChromaVectorDB
+        return ChromaVectorDB(path=str(tmp_path / "chroma"))
+
+    from db.local_vectordb import LocalVectorDB
+    precision = "int8" if request.param == "local-int8" else "float32"
+    return LocalVectorDB(path=str(tmp_path / "local"), precision=precision)
+
+
+def _vectors(n: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((n, DIM)).astype("float32")
+
+
+def _add(db, partition: str, vectors: np.ndarray, prefix: str = "v", collection: str = "chunks"):
+    ids = [f"{prefix}{i}" for i in range(len(vectors))]
+    metadatas = [{"session_id": partition, "chunk_id": i} for i in range(len(vectors))]
+    db.add_vectors(collection, vectors, metadatas, ids)
+    return ids
+
+
+def test_search_returns_nearest_first(vectordb):
+    vectors = _vectors(20)
+    ids = _add(vectordb, "doc-1", vectors)
+
+    res = vectordb.search("chunks", vectors[7], "doc-1", n=5)
+
+    assert res["ids"][0][0] == ids[7]
+    assert res["metadatas"][0][0] == {"session_id": "doc-1", "chunk_id": 7}
+    assert res["distances"][0][0] == pytest.approx(0.0, abs=1e-2)
+    assert len(res["ids"][0]) == 5
+    assert res["distances"][0] == sorted(res["distances"][0])
+
+
+def test_search_caps_results_at_partition_size(vectordb):
+    vectors = _vectors(3)
+    _add(vectordb, "doc-1", vectors)
+
+    res = vectordb.search("chunks", vectors[0], "doc-1", n=10)
+
+    assert len(res["ids"][0]) == 3
+
+
+def test_partitions_are_isolated(vectordb):
+    _add(vectordb, "doc-1", _vectors(5, seed=1), prefix="a")
+    _add(vectordb, "doc-2", _vectors(5, seed=2), prefix="b")
+
+    res = vectordb.search("chunks", _vectors(1, seed=3)[0], "doc-1", n=10)
+
+    assert all(vid.startswith("a") for vid in res["ids"][0])
+    assert {md["session_id"] for md in res["metadatas"][0]} == {"doc-1"}
+
+
+def test_collections_are_isolated(vectordb):
+    _add(vectordb, "s1", _vectors(4), collection="ltm")
+
+    res = vectordb.search("chunks", _vectors(1)[0], "s1", n=3)
+
+    assert res["ids"][0] == []
+
+
+def test_search_partitions_merges_by_distance(vectordb):
+    vectors = _vectors(10)
+    _add(vectordb, "doc-1", vectors[:5], prefix="a")
+    _add(vectordb, "doc-2", vectors[5:], prefix="b")
+
+    res = vectordb.search_partitions("chunks", vectors[6], ["doc-1", "doc-2", "doc-missing"], n=4)
+
+    assert res["ids"][0][0] == "b1"
+    assert len(res["ids"][0]) == 4
+    assert res["distances"][0] == sorted(res["distances"][0])
+
+
+def test_missing_partition(vectordb):
+    res = vectordb.search("chunks", _vectors(1)[0], "doc-missing", n=3)
+    assert res == {"ids": [[]], "metadatas": [[]], "distances": [[]]}
+
+    ids, matrix, metadatas = vectordb.get_partition("chunks", "doc-missing")
+    assert ids == [] and metadatas == [] and matrix.shape[0] == 0
+
+    vectordb.delete_session_embeddings("chunks", "doc-missing")
+    vectordb.prefetch("chunks", "doc-missing")
+
+
+def test_delete_partition(vectordb):
+    vectors = _vectors(6)
+    _add(vectordb, "doc-1", vectors, prefix="a")
+    _add(vectordb, "doc-2", vectors, prefix="b")
+
+    vectordb.delete_session_embeddings("chunks", "doc-1")
+
+    assert vectordb.search("chunks", vectors[0], "doc-1", n=3)["ids"] == [[]]
+    assert len(vectordb.search("chunks", vectors[0], "doc-2", n=10)["ids"][0]) == 6
+
+    #A deleted partition can be written again (eg- a reused document id)
+    _add(vectordb, "doc-1", vectors[:2], prefix="c")
+    assert sorted(vectordb.search("chunks", vectors[0], "doc-1", n=10)["ids"][0]) == ["c0", "c1"]
+
+
+def test_duplicate_id_replaces_vector(vectordb):
+    vectors = _vectors(10)
+    _add(vectordb, "doc-1", vectors)
+    replacement = _vectors(1, seed=9)
+
+    vectordb.add_vectors("chunks", replacement, [{"session_id": "doc-1", "chunk_id": 99}], ["v3"])
+
+    res = vectordb.search("chunks", replacement[0], "doc-1", n=20)
+    assert len(res["ids"][0]) == 10
+    assert res["ids"][0].count("v3") == 1
+    assert res["ids"][0][0] == "v3"
+    assert res["metadatas"][0][0]["chunk_id"] == 99
+
+    #The replaced vector is gone: searching for it no longer finds v3 at distance ~0
+    res = vectordb.search("chunks", vectors[3], "doc-1", n=1)
+    assert res["ids"][0] != ["v3"] or res["distances"][0][0] > 1e-2
+
+
+def test_readding_same_batch_is_idempotent(vectordb):
+    vectors = _vectors(5)
+    _add(vectordb, "doc-1", vectors)
+    _add(vectordb, "doc-1", vectors)
+
+    ids, matrix, metadatas = vectordb.get_partition("chunks", "doc-1")
+    assert sorted(ids) == [f"v{i}" for i in range(5)]
+    assert matrix.shape == (5, DIM)
+
+
+def test_get_partition_round_trip(vectordb):
+    vectors = _vectors(4)
+    _add(vectordb, "doc-1", vectors)
+
+    ids, matrix, metadatas = vectordb.get_partition("chunks", "doc-1")
+    by_id = dict(zip(ids, range(len(ids))))
+
+    assert sorted(ids) == ["v0", "v1", "v2", "v3"]
+    assert [metadatas[by_id[f"v{i}"]]["chunk_id"] for i in range(4)] == [0, 1, 2, 3]
+    #Backends may store vectors normalised, directions must survive
+    for i in range(4):
+        row = matrix[by_id[f"v{i}"]]
+        cosine = float(row @ vectors[i] / (np.linalg.norm(row) * np.linalg.norm(vectors[i])))
+        assert cosine == pytest.approx(1.0, abs=1e-5)
+
+
+def test_generated_ids_when_none_given(vectordb):
+    vectordb.add_vectors("ltm", _vectors(2), [{"session_id": "s1", "ltm_id": 1}, {"session_id": "s1", "ltm_id": 2}],
+                         [None, None])
+
+    ids, _, _ = vectordb.get_partition("ltm", "s1")
+    assert len(set(ids)) == 2
+
+
+#Chroma keeps small partitions in memory for exact search; the cache must stay fresh and bounded
+def test_chroma_exact_cache_sees_other_writers(tmp_path):
+    pytest.importorskip("chromadb")
+    from db.chroma_vectordb import ChromaVectorDB
+    reader = ChromaVectorDB(path=str(tmp_path / "chroma"))
+    writer = ChromaVectorDB(path=str(tmp_path / "chroma")) #stands in for another process
+
+    vectors = _vectors(6)
+    _add(writer, "doc-1", vectors[:3], prefix="a")
+    assert len(reader.search("chunks", vectors[0], "doc-1", n=10)["ids"][0]) == 3
+
+    _add(writer, "doc-1", vectors[3:], prefix="b")
+    res = reader.search("chunks", vectors[4], "doc-1", n=10)
+    assert len(res["ids"][0]) == 6
+    assert res["ids"][0][0] == "b1"
+
+    writer.delete_session_embeddings("chunks", "doc-1")
+    assert reader.search("chunks", vectors[0], "doc-1", n=10)["ids"] == [[]]
+
+
+def test_chroma_exact_cache_is_bounded_by_bytes(tmp_path):
+    pytest.importorskip("chromadb")
+    from db.chroma_vectordb import ChromaVectorDB
+    db = ChromaVectorDB(path=str(tmp_path / "chroma"))
+    db._exact_max_bytes = 2 * 10 * DIM * 4 #room for two 10-vector partitions
+
+    for i in range(5):
+        _add(db, f"doc-{i}", _vectors(10, seed=i))
+        db.search("chunks", _vectors(1)[0], f"doc-{i}", n=3)
+
+    assert db._exact_bytes <= db._exact_max_bytes
+    assert list(db._exact) == ["chunks_doc-3", "chunks_doc-4"]
+    #Evicted partitions are still searchable, just reloaded
+    assert len(db.search("chunks", _vectors(1)[0], "doc-0", n=3)["ids"][0]) == 3
@@ -0,0 +1,57 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Metrics:
+    """
+    Minimal in-process metrics registry (counters, gauges and timings).
+    Exposed through GET /metrics for sizing and tuning.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._timings = {}
+
+
+    def incr(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            t = self._timings.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0, "last": 0.0})
+            t["count"] += 1
+            t["sum"] += value
+            t["max"] = max(t["max"], value)
+            t["last"] = value
+
+
+    @contextmanager
+    def timer(self, name: str):
+        """Observe elapsed wall time (ms) of the wrapped block under `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000)
+
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            timings = {name: {**t, "avg": t["sum"] / t["count"] if t["count"] else 0.0}
+                       for name, t in self._timings.items()}
+            return {"counters": dict(self._counters),
+                    "gauges": dict(self._gauges),
+                    "timings_ms": timings}
+
+
+metrics = Metrics()
@@ -0,0 +1,16 @@
+import struct
+
+import orjson
+
+
+#Frames on the retrieval worker socket: 4-byte big-endian length + orjson payload
+HEADER = struct.Struct(">I")
+
+
+def encode_frame(message: dict) -> bytes:
+    payload = orjson.dumps(message, option=orjson.OPT_SERIALIZE_NUMPY)
+    return HEADER.pack(len(payload)) + payload
+
+
+def decode_payload(payload: bytes) -> dict:
+    return orjson.loads(payload)
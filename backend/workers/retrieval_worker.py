@@ -0,0 +1,177 @@
+"""
+Shared embedding/retrieval worker.
+
+Owns the SentenceTransformer model and the vector store for every API worker on the
+host, so `uvicorn --workers N` loads the model once and the store has a single writer.
+API processes reach it over a Unix socket (RETRIEVAL_WORKER_SOCKET); embedding
+requests that arrive close together are encoded in one batch.
+
+Run from backend/:
+    RETRIEVAL_WORKER_SOCKET=/tmp/retrieval.sock python -m workers.retrieval_worker
+"""
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from db.vectordb import VECTOR_BACKEND, create_vectordb
+from services.llm_service import llm_service
+from services.retrieval_client import RETRIEVAL_WORKER_SOCKET
+from utils.logger import setup_logging
+from workers.protocol import HEADER, encode_frame, decode_payload
+
+
+#Max texts encoded per model call, and how long to wait for more before encoding
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "64"))
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))
+
+logger = logging.getLogger(__name__)
+
+
+class RetrievalWorker:
+
+    def __init__(self):
+        self.vectordb = create_vectordb(VECTOR_BACKEND)
+        self.model = llm_service.embedding_model
+
+        #Model and store each get one thread: encoding doesn't block vector ops, and
+        #the store only ever sees one writer
+        self._embed_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+        self._store_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="store")
+        self._embed_queue = asyncio.Queue()
+
+
+    async def embed(self, texts: list):
+        future = asyncio.get_running_loop().create_future()
+        await self._embed_queue.put((texts, future))
+        return await future
+
+
+    #Collect embedding requests for up to EMBED_BATCH_WINDOW_MS and encode them together
+    async def _embed_batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._embed_queue.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + EMBED_BATCH_WINDOW_MS / 1000
+
+            while size < EMBED_MAX_BATCH:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._embed_queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                vectors = await loop.run_in_executor(self._embed_executor, self._encode, texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for item_texts, future in batch:
+                future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+            logger.info(f"Embedded {len(texts)} texts from {len(batch)} requests")
+
+
+    def _encode(self, texts: list) -> np.ndarray:
+        vectors = self.model.encode(texts, batch_size=EMBED_MAX_BATCH, show_progress_bar=False)
+        return np.asarray(vectors, dtype="float32")
+
+
+    async def handle_request(self, request: dict):
+        op = request["op"]
+        loop = asyncio.get_running_loop()
+
+        if op == "embed":
+            return await self.embed(request["texts"])
+
+        if op == "search":
+            res = await loop.run_in_executor(self._store_executor, lambda: self.vectordb.search(
+                request["collection_name"], np.asarray(request["embedding"], dtype="float32"),
+                request["session_id"], n=request["n"]))
+            return {"ids": res["ids"], "metadatas": res["metadatas"], "distances": res["distances"]}
+
+        if op == "search_partitions":
+            res = await loop.run_in_executor(self._store_executor, lambda: self.vectordb.search_partitions(
+                request["collection_name"], np.asarray(request["embedding"], dtype="float32"),
+                request["partition_ids"], n=request["n"]))
+            return {"ids": res["ids"], "metadatas": res["metadatas"], "distances": res["distances"]}
+
+        if op == "add_vectors":
+            return await loop.run_in_executor(self._store_executor, lambda: self.vectordb.add_vectors(
+                request["collection_name"], np.asarray(request["embeddings"], dtype="float32"),
+                request["metadatas"], request["vector_ids"]))
+
+        if op == "get_partition":
+            ids, embeddings, metadatas = await loop.run_in_executor(self._store_executor, lambda: self.vectordb.get_partition(
+                request["collection_name"], request["session_id"]))
+            return {"ids": ids, "embeddings": embeddings, "metadatas": metadatas}
+
+        if op == "prefetch":
+            return await loop.run_in_executor(self._store_executor, lambda: self.vectordb.prefetch(
+                request["collection_name"], request["session_id"]))
+
+        if op == "delete_session_embeddings":
+            return await loop.run_in_executor(self._store_executor, lambda: self.vectordb.delete_session_embeddings(
+                request["collection_name"], request["session_id"]))
+
+        raise ValueError(f"Unknown op: {op}")
+
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                (size,) = HEADER.unpack(header)
+                request = decode_payload(await reader.readexactly(size))
+
+                try:
+                    response = {"id": request.get("id"), "result": await self.handle_request(request)}
+                except Exception as e:
+                    logger.error(f"Retrieval worker request {request.get('op')} failed: {e}")
+                    response = {"id": request.get("id"), "error": str(e)}
+
+                writer.write(encode_frame(response))
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+    async def serve(self, path: str):
+        if os.path.exists(path):
+            os.unlink(path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        batcher = asyncio.create_task(self._embed_batcher())
+        server = await asyncio.start_unix_server(self.handle_connection, path=path)
+        logger.info(f"Retrieval worker listening on {path} (vector backend: {VECTOR_BACKEND})")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+def main():
+    setup_logging()
+    if not RETRIEVAL_WORKER_SOCKET:
+        raise SystemExit("RETRIEVAL_WORKER_SOCKET must be set")
+    asyncio.run(RetrievalWorker().serve(RETRIEVAL_WORKER_SOCKET))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,11 @@
+import time
 import streamlit as st
-import asyncio
-from utils.api_client import upload_file, list_sessions, delete_session, get_history
-from utils.websocket_client import stream_chat
+from utils.api_client import upload_file, list_sessions, delete_session, get_history, BackendBusy
+from utils.websocket_client import ChatConnection
+
+
+#Max rate at which a streamed answer is re-rendered
+RENDER_INTERVAL_SECONDS = 0.05
 
 
 
@@ -19,9 +23,17 @@ if "reset_uploader" not in st.session_state:
     st.session_state.reset_uploader = False
 
 
-#Cached sessions
+#Cached sessions (first page from the backend, then kept up to date locally)
 if "sessions_cache" not in st.session_state:
-    st.session_state.sessions_cache = {"sessions": []}
+    st.session_state.sessions_cache = {"sessions": [], "next_cursor": None}
+
+#Cursor of older chat history not loaded yet
+if "history_cursor" not in st.session_state:
+    st.session_state.history_cursor = None
+
+#Persistent WebSocket of the active session
+if "chat_connection" not in st.session_state:
+    st.session_state.chat_connection = None
 
 
 #Hide uploader after upload is completed
@@ -30,15 +42,61 @@ if st.session_state.reset_uploader:
     st.session_state.reset_uploader = False
 
 
-#Cached backend call
-@st.cache_data
-def cached_list_sessions():
-    return list_sessions()
+#Incremental updates of the local session list, instead of reloading it after every action
+def upsert_session(session_id: str, name: str = None, title_pending: bool = None):
+    sessions = st.session_state.sessions_cache["sessions"]
+    existing = next((s for s in sessions if s["id"] == session_id), None)
+    if existing is not None:
+        sessions.remove(existing)
+    entry = existing or {"id": session_id, "name": name or session_id[:8]}
+    if name:
+        entry["name"] = name
+    if title_pending is not None:
+        entry["title_pending"] = title_pending
+    sessions.insert(0, entry) #most recently active first
+
+
+#Picking up titles generated in the background (the request is a cheap 304 while nothing changed)
+def refresh_pending_titles():
+    sessions = st.session_state.sessions_cache["sessions"]
+    if not any(s.get("title_pending") for s in sessions):
+        return
+    latest = {s["id"]: s for s in list_sessions()["sessions"]}
+    for s in sessions:
+        if s["id"] in latest:
+            s["name"] = latest[s["id"]]["name"]
+            s["title_pending"] = latest[s["id"]].get("title_pending", False)
+
+
+def remove_session(session_id: str):
+    sessions = st.session_state.sessions_cache["sessions"]
+    st.session_state.sessions_cache["sessions"] = [s for s in sessions if s["id"] != session_id]
+
 
+def open_session(session_id: str):
+    page = get_history(session_id)
+    st.session_state.session_id = session_id
+    st.session_state.chat_history = page["history"]
+    st.session_state.history_cursor = page.get("next_cursor")
 
+
+#WebSocket of the active session, reconnecting only when the session changes
+def chat_connection(session_id: str) -> ChatConnection:
+    conn = st.session_state.chat_connection
+    if conn is None or conn.session_id != session_id:
+        if conn is not None:
+            conn.close()
+        conn = ChatConnection(session_id)
+        st.session_state.chat_connection = conn
+    return conn
+
+
+#Only on first load; later changes are applied locally (the backend revalidates with ETags when reloading)
 if st.session_state.refresh_sessions:
-    st.session_state.sessions_cache = cached_list_sessions()
+    st.session_state.sessions_cache = list_sessions()
     st.session_state.refresh_sessions = False
+else:
+    refresh_pending_titles()
 
 session_items = st.session_state.sessions_cache["sessions"]
 
@@ -69,11 +127,15 @@ if allow_upload:
     uploaded = st.file_uploader("📤 Upload your document", key="chat_uploader")
 
 if uploaded and allow_upload:
-    result = upload_file(uploaded)
+    try:
+        result = upload_file(uploaded)
+    except BackendBusy as e:
+        st.warning(f"The server is busy right now, please try again in {e.retry_after} seconds.")
+        st.stop()
     st.session_state.session_id = result["session_id"]
     st.session_state.chat_history = []
-    cached_list_sessions.clear()
-    st.session_state.refresh_sessions = True
+    st.session_state.history_cursor = None
+    upsert_session(result["session_id"], result.get("session_name"), result.get("title_pending"))
     st.session_state.reset_uploader = True
     st.success("Document ingested! Start chatting.")
     st.rerun()
@@ -94,11 +156,14 @@ with st.sidebar:
         delete_session(st.session_state.session_id)
 
         #Reset UI
+        remove_session(st.session_state.session_id)
         st.session_state.session_id = None
         st.session_state.chat_history = []
+        st.session_state.history_cursor = None
+        if st.session_state.chat_connection is not None:
+            st.session_state.chat_connection.close()
+            st.session_state.chat_connection = None
 
-        cached_list_sessions.clear()
-        st.session_state.refresh_sessions = True
         st.session_state.reset_uploader = True
 
         st.rerun()
@@ -111,13 +176,29 @@ with st.sidebar:
         name = item["name"]
 
         if st.button(name, key=f"session_{sid}", width='stretch'):
-            st.session_state.session_id = sid
-            st.session_state.chat_history = get_history(sid)["history"]
+            open_session(sid)
             st.session_state.reset_uploader = True
             st.rerun()
 
+    #Next page of older sessions
+    next_cursor = st.session_state.sessions_cache.get("next_cursor")
+    if next_cursor and st.button("Load more", width='stretch'):
+        page = list_sessions(cursor=next_cursor)
+        known = {s["id"] for s in session_items}
+        session_items.extend(s for s in page["sessions"] if s["id"] not in known)
+        st.session_state.sessions_cache["next_cursor"] = page["next_cursor"]
+        st.rerun()
+
 
 ### DISPLAY CHAT HISTORY
+#Older messages are fetched page by page on demand
+if st.session_state.session_id and st.session_state.history_cursor:
+    if st.button("Load older messages"):
+        page = get_history(st.session_state.session_id, before=st.session_state.history_cursor)
+        st.session_state.chat_history = page["history"] + st.session_state.chat_history
+        st.session_state.history_cursor = page.get("next_cursor")
+        st.rerun()
+
 for msg in st.session_state.chat_history:
     with st.chat_message(msg["role"]):
         st.write(msg["content"])
@@ -139,14 +220,22 @@ if user_msg:
     #Stream Response
     with st.chat_message("assistant"):
         placeholder = st.empty()
-        buffer = [""]
+        tokens = []
+        last_render = 0.0
+
+        conn = chat_connection(st.session_state.session_id)
+        for token in conn.stream(user_msg, on_status=placeholder.caption):
+            tokens.append(token)
 
-        async def _stream():
-            async for token in stream_chat(st.session_state.session_id, user_msg):
-                buffer[0] += token
-                placeholder.write(buffer[0])
+            #Re-rendering at most once per frame instead of on every token
+            now = time.monotonic()
+            if now - last_render >= RENDER_INTERVAL_SECONDS:
+                placeholder.markdown("".join(tokens) + "▌")
+                last_render = now
 
-        asyncio.run(_stream())
-        st.session_state.chat_history.append({"role": "assistant", "content": buffer[0]})
+        answer = "".join(tokens)
+        placeholder.markdown(answer)
+        st.session_state.chat_history.append({"role": "assistant", "content": answer})
 
+    upsert_session(st.session_state.session_id)
     st.rerun()
\ No newline at end of file
@@ -1,22 +1,70 @@
+import json
+import threading
+from collections import OrderedDict
+
 import requests
+from requests.adapters import HTTPAdapter
 
 # BACKEND_URL = "http://localhost:8000"
 BACKEND_URL = "http://backend:8000"
 
 
+class BackendBusy(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Backend busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+#One pooled HTTP session for the whole app (module state survives Streamlit reruns)
+http = requests.Session()
+http.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+#url -> (etag, raw body) of recent GETs, revalidated with If-None-Match. Shared by all browser
+#sessions of this Streamlit process, so it's an LRU capped at ETAG_CACHE_MAX_ENTRIES pages.
+#Bodies are kept as bytes and parsed on every hit: callers get their own objects and may mutate them
+ETAG_CACHE_MAX_ENTRIES = 256
+_etag_cache = OrderedDict()
+_etag_lock = threading.Lock() #Streamlit runs each browser session's script in its own thread
+
+
+#GET with conditional revalidation: an unchanged resource comes back as 304 and is served from the local copy
+def _get_json(url: str, params: dict = None):
+    req = requests.Request("GET", url, params={k: v for k, v in (params or {}).items() if v is not None}).prepare()
+    with _etag_lock:
+        cached = _etag_cache.get(req.url)
+        if cached:
+            _etag_cache.move_to_end(req.url)
+
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    r = http.get(req.url, headers=headers)
+    if r.status_code == 304 and cached:
+        return json.loads(cached[1])
+
+    r.raise_for_status()
+    body = r.json()
+    if "ETag" in r.headers:
+        with _etag_lock:
+            _etag_cache[req.url] = (r.headers["ETag"], r.content)
+            _etag_cache.move_to_end(req.url)
+            while len(_etag_cache) > ETAG_CACHE_MAX_ENTRIES:
+                _etag_cache.popitem(last=False)
+    return body
+
+
 def upload_file(file):
     files = {"file": (file.name, file, file.type)}
-    r = requests.post(f"{BACKEND_URL}/upload", files=files)
+    r = http.post(f"{BACKEND_URL}/upload", files=files)
+    if r.status_code == 429:
+        raise BackendBusy(int(r.headers.get("Retry-After", "5")))
+    r.raise_for_status()
     return r.json()
 
-def list_sessions():
-    r = requests.get(f"{BACKEND_URL}/sessions/")
-    return r.json()
+def list_sessions(limit: int = 50, cursor: str = None):
+    return _get_json(f"{BACKEND_URL}/sessions/", {"limit": limit, "cursor": cursor})
 
 def delete_session(session_id: str):
-    r = requests.delete(f"{BACKEND_URL}/sessions/{session_id}")
+    r = http.delete(f"{BACKEND_URL}/sessions/{session_id}")
     return r.json()
 
-def get_history(session_id: str):
-    r = requests.get(f"{BACKEND_URL}/sessions/{session_id}/history")
-    return r.json()
\ No newline at end of file
+def get_history(session_id: str, limit: int = 200, before: int = None):
+    return _get_json(f"{BACKEND_URL}/sessions/{session_id}/history", {"limit": limit, "before": before})
@@ -1,14 +1,96 @@
-import asyncio
-import websockets
-
-async def stream_chat(session_id: str, message: str):
-    # uri = f"ws://localhost:8000/chat/ws/{session_id}"
-    uri = f"ws://backend:8000/chat/ws/{session_id}"
-    
-    async with websockets.connect(uri) as ws:
-        await ws.send(message)
-        
-        async for msg in ws:
-            if msg == "[DONE]":
-                break
-            yield msg
\ No newline at end of file
+import time
+from websockets.exceptions import ConnectionClosed
+from websockets.sync.client import connect
+
+# WS_URL = "ws://localhost:8000"
+WS_URL = "ws://backend:8000"
+
+#How long to wait for the rest of an abandoned answer before reconnecting instead
+DRAIN_TIMEOUT_SECONDS = 10
+
+
+class ChatConnection:
+    """
+    One WebSocket per chat session, kept open across messages (and Streamlit reruns,
+    when stored in st.session_state) instead of reconnecting for every message.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self._ws = None
+        self._unfinished = False #an answer was abandoned mid-stream, its tail is still on the socket
+
+
+    def _connect(self):
+        if self._ws is None:
+            self._ws = connect(f"{WS_URL}/chat/ws/{self.session_id}", max_size=None)
+        return self._ws
+
+
+    #Reading off the rest of an abandoned answer so it doesn't leak into the next one
+    def _drain(self):
+        deadline = time.monotonic() + DRAIN_TIMEOUT_SECONDS
+        try:
+            while True:
+                msg = self._ws.recv(timeout=max(deadline - time.monotonic(), 0))
+                if msg == "[DONE]" or msg.startswith("[BUSY]"):
+                    break
+        except (TimeoutError, ConnectionClosed):
+            self.close()
+        self._unfinished = False
+
+
+    def stream(self, message: str, on_status=None):
+        """
+        Send a message and yield the answer token by token. `on_status(text)` is called
+        while the message waits in the server's queue.
+        """
+        if self._ws is not None and self._unfinished:
+            self._drain()
+
+        try:
+            ws = self._connect()
+            ws.send(message)
+        except ConnectionClosed:
+            #Server closed the idle socket (eg- restart), reconnecting once
+            self.close()
+            ws = self._connect()
+            ws.send(message)
+
+        self._unfinished = True
+        try:
+            for msg in ws:
+                if msg == "[DONE]":
+                    self._unfinished = False
+                    break
+                #Waiting for a free generation slot
+                if msg.startswith("[QUEUED]"):
+                    if on_status is not None:
+                        on_status(f"Waiting for a free slot (position {msg.split(maxsplit=1)[1]})...")
+                    continue
+                #Rejected under overload
+                if msg.startswith("[BUSY]"):
+                    self._unfinished = False
+                    retry_after = msg.split(maxsplit=1)[1] if " " in msg else "a few"
+                    yield f"The server is busy right now, please try again in {retry_after} seconds."
+                    break
+                yield msg
+        finally:
+            if self._unfinished:
+                #Abandoned (eg- Streamlit rerun mid-answer): asking the server to stop generating
+                self.stop()
+
+
+    def stop(self):
+        if self._ws is not None:
+            try:
+                self._ws.send("[STOP]")
+            except ConnectionClosed:
+                self.close()
+
+
+    def close(self):
+        if self._ws is not None:
+            self._ws.close()
+            self._ws = None
+        self._unfinished = False